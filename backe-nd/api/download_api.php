@@ -226,7 +226,12 @@ class UnifiedDownloadAPI {
                     $this->verifyIP();
                     break;
                 case 'stats':
-                    $this->getStats();
+                    // 下载器只需要设置开关，scope=settings时不执行统计查询
+                    if (($_GET['scope'] ?? '') === 'settings') {
+                        $this->getSettings();
+                    } else {
+                        $this->getStats();
+                    }
                     break;
                 default:
                     sendJsonError('无效的操作', 400);
@@ -240,6 +245,11 @@ class UnifiedDownloadAPI {
         // 先获取参数
         $fileUrl = $_POST['file_url'] ?? '';
         $softwareName = $_POST['software_name'] ?? '';
+        // 可选：文件的SHA-256，下载器下载完成后据此校验完整性
+        $fileSha256 = strtolower(trim($_POST['sha256'] ?? ''));
+        if ($fileSha256 !== '' && !preg_match('/^[0-9a-f]{64}$/', $fileSha256)) {
+            throw new Exception('无效的SHA-256');
+        }
 
         // 直接使用前端传递的用户IP
         $clientIP = $_POST['user_ip'] ?? $this->getClientIP();
@@ -290,7 +300,8 @@ class UnifiedDownloadAPI {
             'expires_at' => $expiresAt,
             'metadata' => json_encode([
                 'site_name' => $this->currentSite['name'],
-                'created_via' => 'api'
+                'created_via' => 'api',
+                'sha256' => $fileSha256
             ])
         ];
         
@@ -307,7 +318,7 @@ class UnifiedDownloadAPI {
         ]);
         
         // 创建配置文件
-        $configContent = $this->generateConfigFile($token, $softwareName, $fileUrl);
+        $configContent = $this->generateConfigFile($token, $softwareName, $fileUrl, $fileSha256);
         
         // 创建zip文件
         $zipPath = $this->createDownloadPackage($token, $configContent);
@@ -401,7 +412,8 @@ class UnifiedDownloadAPI {
                 'message' => 'IP验证已禁用，直接通过',
                 'file_url' => $record['file_url'],
                 'software_name' => $record['software_name'],
-                'site' => $record['site_name']
+                'site' => $record['site_name'],
+                'sha256' => $this->getFileSha256($record)
             ]);
             return;
         }
@@ -439,7 +451,8 @@ class UnifiedDownloadAPI {
                 'message' => 'IP地址验证通过',
                 'file_url' => $record['file_url'],
                 'software_name' => $record['software_name'],
-                'site' => $record['site_name']
+                'site' => $record['site_name'],
+                'sha256' => $this->getFileSha256($record)
             ]);
             return;
         }
@@ -469,7 +482,8 @@ class UnifiedDownloadAPI {
                 'message' => 'IP地址不匹配，但允许下载',
                 'file_url' => $record['file_url'],
                 'software_name' => $record['software_name'],
-                'site' => $record['site_name']
+                'site' => $record['site_name'],
+                'sha256' => $this->getFileSha256($record)
             ]);
         } else {
             // 严格模式 - 拒绝IP不匹配的下载
@@ -495,6 +509,11 @@ class UnifiedDownloadAPI {
         }
     }
     
+    private function getFileSha256($record) {
+        $metadata = json_decode($record['metadata'] ?? '', true);
+        return is_array($metadata) ? ($metadata['sha256'] ?? '') : '';
+    }
+
     private function executeSuccessActions($downloadId, $token, $currentIP, $result) {
         try {
             // 记录验证结果
@@ -610,6 +629,58 @@ class UnifiedDownloadAPI {
         }
     }
     
+    /**
+     * 下载器设置 - action=stats&scope=settings
+     * 只读取配置文件，不执行COUNT统计；支持If-None-Match/If-Modified-Since，设置未变化时返回304
+     */
+    public function getSettings() {
+        $configFile = __DIR__ . '/../admin/config_master.php';
+        $configExists = file_exists($configFile);
+        $configModified = $configExists ? filemtime($configFile) : 0;
+
+        $settings = [
+            'site' => $this->currentSite['name'],
+            'ip_verification_enabled' => $this->config['ip_verification']['enabled'] ?? true,
+            'strict_mode' => $this->config['ip_verification']['strict_mode'] ?? false,
+            'downloader_show_log' => $this->config['downloader']['show_log'] ?? true,
+        ];
+        $etag = '"' . sha1(json_encode($settings) . $configModified) . '"';
+
+        header('ETag: ' . $etag);
+        header('Last-Modified: ' . gmdate('D, d M Y H:i:s', $configModified) . ' GMT');
+        header('Cache-Control: private, no-cache');
+
+        // If-None-Match优先，没有时才比较If-Modified-Since
+        $ifNoneMatch = trim($_SERVER['HTTP_IF_NONE_MATCH'] ?? '');
+        $ifModifiedSince = $_SERVER['HTTP_IF_MODIFIED_SINCE'] ?? '';
+        if ($ifNoneMatch !== '') {
+            $notModified = $ifNoneMatch === '*' || in_array($etag, array_map('trim', explode(',', $ifNoneMatch)), true);
+        } else {
+            $since = $ifModifiedSince !== '' ? strtotime($ifModifiedSince) : false;
+            $notModified = $since !== false && $configModified > 0 && $since >= $configModified;
+        }
+        if ($notModified) {
+            http_response_code(304);
+            exit;
+        }
+
+        writeLog('access', '查询设置', [
+            'site' => $this->currentSite['name'],
+            'client_ip' => $_SERVER['REMOTE_ADDR'] ?? 'unknown'
+        ]);
+
+        $this->sendSuccess(array_merge($settings, [
+            // 调试字段 - 下载器日志窗口中显示
+            'debug_config_file' => $configFile,
+            'debug_config_exists' => $configExists,
+            'debug_config_size' => $configExists ? filesize($configFile) : 0,
+            'debug_config_modified' => date('Y-m-d H:i:s', $configModified),
+            'debug_show_log_raw' => $this->config['downloader']['show_log'] ?? 'NOT_SET',
+            'debug_ip_enabled_raw' => $this->config['ip_verification']['enabled'] ?? 'NOT_SET',
+            'debug_strict_mode_raw' => $this->config['ip_verification']['strict_mode'] ?? 'NOT_SET'
+        ]));
+    }
+
     private function isValidFileUrl($url) {
         $parsedUrl = parse_url($url);
         $domain = $parsedUrl['host'] ?? '';
@@ -628,7 +699,7 @@ class UnifiedDownloadAPI {
         return $sitePrefix . '_' . $timestamp . '_' . $random;
     }
     
-    private function generateConfigFile($token, $softwareName, $fileUrl) {
+    private function generateConfigFile($token, $softwareName, $fileUrl, $fileSha256 = '') {
         $verifyUrl = $this->config['storage_server']['domain'] . '/api/download_api.php?action=verify';
 
         // 不再生成[ui]配置，完全依赖后台动态控制
@@ -636,6 +707,7 @@ class UnifiedDownloadAPI {
 token = $token
 software_name = $softwareName
 file_url = $fileUrl
+sha256 = $fileSha256
 
 [server]
 verify_url = $verifyUrl
@@ -742,7 +814,16 @@ site_key = {$this->currentSite['site_key']}";
     }
     
     private function sendResponse($data) {
-        echo json_encode($data, JSON_UNESCAPED_UNICODE);
+        $body = json_encode($data, JSON_UNESCAPED_UNICODE);
+        // 客户端接受gzip时压缩较大的响应（下载器在 [network] compression = true 时发送Accept-Encoding）
+        header('Vary: Accept-Encoding');
+        if (strlen($body) >= 512 && function_exists('gzencode') && !ini_get('zlib.output_compression')
+            && preg_match('/\bgzip\b/i', $_SERVER['HTTP_ACCEPT_ENCODING'] ?? '')) {
+            $body = gzencode($body, 6);
+            header('Content-Encoding: gzip');
+        }
+        header('Content-Length: ' . strlen($body));
+        echo $body;
         exit;
     }
 }
@@ -0,0 +1,795 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+asyncio下载引擎 - 线程版DownloadManager之外的另一种实现
+
+IP查询、验证、文件探测和分段下载都是同一个事件循环上的任务，HTTP/1.1客户端基于
+asyncio.open_connection 实现（分阶段计时中DNS、TCP连接和TLS握手合并记为"连接"阶段）。
+配置、断点日志、写盘线程、SHA-256校验和返回值都沿用DownloadManager，
+两种引擎的 verify_ip_with_backend / download_file 结果完全一致。
+
+无界面模式使用: python downloader.py --headless --engine async
+"""
+
+import asyncio
+import http.client
+import io
+import time
+import urllib.error
+import urllib.parse
+from email.parser import Parser
+from urllib.parse import urlparse
+
+from downloader import (IP_SERVICES, DEFAULT_CONNECTIONS, DEFAULT_IDLE_TIMEOUT, DEFAULT_MAX_CONNECTIONS_PER_HOST,
+                        MAX_READ_SIZE, MIN_READ_SIZE, STALL_UNWATCH_AFTER, WRITE_FLUSH_INTERVAL,
+                        DownloadCancelled, ProgressReporter, RemoteFileChanged, StreamInterrupted, StreamStalled)
+
+class AsyncResponse:
+    """HTTP响应 - 支持Content-Length、chunked和读到连接关闭三种消息体
+
+    读完后把连接归还客户端。
+    """
+
+    def __init__(self, client, key, reader, writer, status, reason, headers, url, method, will_close, span=None):
+        self._client = client
+        self._key = key
+        self._reader = reader
+        self._writer = writer
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.url = url
+        self._chunked = 'chunked' in (headers.get('Transfer-Encoding') or '').lower()
+        self._chunk_left = 0
+        self._remaining = None
+        self._will_close = will_close
+        self._done = False
+        self._span = span       # 计时信息，消息体结束时记录传输阶段
+        self._received = 0
+
+        if method == 'HEAD' or status in (204, 304) or 100 <= status < 200:
+            self._remaining = 0
+        elif not self._chunked and headers.get('Content-Length'):
+            self._remaining = int(headers.get('Content-Length'))
+        elif not self._chunked:
+            # 没有长度信息，只能读到连接关闭，连接不能复用
+            self._will_close = True
+        if self._remaining == 0:
+            self._finish(True)
+
+    def getcode(self):
+        return self.status
+
+    async def read_chunk(self, amount):
+        """读取最多amount字节，消息体结束时返回 b''"""
+        if self._done:
+            return b''
+        timeout = self._client.read_timeout
+        if self._chunked:
+            if self._chunk_left == 0:
+                line = await self._client.wait(self._reader.readline(), timeout)
+                if not line:
+                    raise StreamInterrupted("Connection closed inside chunked body")
+                size = int(line.split(b';', 1)[0].strip(), 16)
+                if size == 0:
+                    # 跳过trailer
+                    while (await self._client.wait(self._reader.readline(), timeout)) not in (b'\r\n', b'\n', b''):
+                        pass
+                    self._finish(True)
+                    return b''
+                self._chunk_left = size
+            data = await self._client.wait(self._reader.read(min(amount, self._chunk_left)), timeout)
+            if not data:
+                raise StreamInterrupted("Connection closed inside chunked body")
+            self._chunk_left -= len(data)
+            self._received += len(data)
+            if self._chunk_left == 0:
+                await self._client.wait(self._reader.readexactly(2), timeout)
+            return data
+
+        if self._remaining is None:
+            data = await self._client.wait(self._reader.read(amount), timeout)
+            self._received += len(data)
+            if not data:
+                self._finish(False)
+            return data
+
+        data = await self._client.wait(self._reader.read(min(amount, self._remaining)), timeout)
+        if not data:
+            raise StreamInterrupted(f"Connection closed with {self._remaining} bytes remaining")
+        self._remaining -= len(data)
+        self._received += len(data)
+        if self._remaining == 0:
+            self._finish(True)
+        return data
+
+    async def read(self):
+        """读取完整消息体"""
+        chunks = []
+        while True:
+            data = await self.read_chunk(MAX_READ_SIZE)
+            if not data:
+                return b''.join(chunks)
+            chunks.append(data)
+
+    async def aclose(self):
+        """剩余内容很少时读完再归还连接，否则直接断开"""
+        if self._done:
+            return
+        if self._remaining is not None and self._remaining <= AsyncHTTPClient.DRAIN_LIMIT:
+            try:
+                await self.read()
+                return
+            except (OSError, asyncio.IncompleteReadError, ValueError):
+                pass
+        self.close()
+
+    def abort(self):
+        """立即断开连接 - 等待中的读取随即返回EOF，只能在事件循环线程调用"""
+        self._will_close = True
+        self._writer.transport.abort()
+
+    def close(self):
+        """未读完的响应直接断开连接"""
+        if not self._done:
+            self._finish(False)
+
+    def _finish(self, complete):
+        if self._done:
+            return
+        self._done = True
+        if self._span is not None:
+            self._client._trace_response(self._span, self.status, self._received)
+        self._client._release(self._key, self._reader, self._writer, complete and not self._will_close)
+
+class AsyncHTTPClient:
+    """最小的HTTP/1.1客户端 - 按主机复用连接，接口与ConnectionPool.open类似
+
+    4xx/5xx与urllib一样抛出HTTPError，自动跟随重定向；
+    每个主机同时进行的请求数不超过max_per_host。
+    """
+
+    DRAIN_LIMIT = 64 * 1024
+    MAX_REDIRECTS = 5
+    STREAM_LIMIT = 64 * 1024  # StreamReader缓冲区上限；更大的值会让read()后的内部memmove变多
+
+    def __init__(self, ssl_context=None, max_per_host=DEFAULT_MAX_CONNECTIONS_PER_HOST,
+                 idle_timeout=DEFAULT_IDLE_TIMEOUT, profile=None, trace=None):
+        self.ssl_context = ssl_context
+        self.max_per_host = max_per_host
+        self.idle_timeout = idle_timeout
+        self.profile = profile  # 与线程版共用的NetworkProfile
+        self.trace = trace      # 与线程版共用的NetworkTrace
+        self._lanes = {}        # id(writer) -> 计时通道名，每个连接一条
+        self.read_timeout = 60
+        self._idle = {}    # (scheme, host, port) -> [(reader, writer, 归还时间), ...]
+        self._slots = {}   # (scheme, host, port) -> asyncio.Semaphore
+        self._held = {}    # id(writer) -> 占用的Semaphore
+        self.stats = {'opened': 0, 'reused': 0, 'evicted': 0, 'discarded': 0}
+
+    @staticmethod
+    async def wait(awaitable, timeout):
+        try:
+            return await asyncio.wait_for(awaitable, timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"Read timeout after {timeout}s") from None
+
+    async def request(self, method, url, headers=None, body=None, timeout=30, kind='request'):
+        """发送请求并返回AsyncResponse，自动跟随重定向；kind为计时汇总时的请求类别"""
+        headers = dict(headers or {})
+        for _ in range(self.MAX_REDIRECTS + 1):
+            response = await self._request(method, url, headers, body, timeout, kind)
+            location = response.headers.get('Location')
+            if response.status in (301, 302, 303, 307, 308) and location:
+                await response.aclose()
+                url = urllib.parse.urljoin(url, location)
+                if response.status == 303 or (response.status in (301, 302) and method == 'POST'):
+                    method, body = 'GET', None
+                    headers = {k: v for k, v in headers.items() if k.lower() not in ('content-type', 'content-length')}
+                continue
+
+            if response.status >= 400:
+                # 读出错误内容后归还连接，保持与urllib一致的异常
+                try:
+                    data = await response.read()
+                finally:
+                    response.close()
+                raise urllib.error.HTTPError(url, response.status, response.reason,
+                                             response.headers, io.BytesIO(data))
+            return response
+
+        raise urllib.error.HTTPError(url, response.status, "Too many redirects", response.headers, None)
+
+    async def _request(self, method, url, headers, body, timeout, kind='request'):
+        parts = urlparse(url)
+        scheme = parts.scheme.lower()
+        if scheme not in ('http', 'https'):
+            raise ValueError(f"Unsupported URL scheme: {url}")
+        port = parts.port or (443 if scheme == 'https' else 80)
+        key = (scheme, parts.hostname, port)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+
+        lines = [f"{method} {path} HTTP/1.1", f"Host: {parts.netloc}"]
+        names = {name.lower() for name in headers}
+        lines += [f"{name}: {value}" for name, value in headers.items() if name.lower() != 'host']
+        if body is not None and 'content-length' not in names:
+            lines.append(f"Content-Length: {len(body)}")
+        payload = ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + (body or b'')
+
+        # 从这里开始计时，等待连接数限制的时间也算在请求内
+        request_started = time.perf_counter()
+        if key not in self._slots:
+            self._slots[key] = asyncio.Semaphore(self.max_per_host)
+        slot = self._slots[key]
+        await self.wait(slot.acquire(), timeout)
+        try:
+            while True:
+                started = time.perf_counter()
+                reader, writer, reused = await self._connect(key, timeout)
+                connect_time = None if reused else time.perf_counter() - started
+                lane = self._lanes.setdefault(id(writer), f"asyncio {parts.netloc} #{self.stats['opened']}")
+                if connect_time is not None and self.trace is not None:
+                    self.trace.add(kind, 'connect', started, connect_time, lane=lane)
+                try:
+                    started = time.perf_counter()
+                    writer.write(payload)
+                    await self.wait(writer.drain(), timeout)
+                    status_line = await self.wait(reader.readline(), timeout)
+                    if not status_line:
+                        raise ConnectionResetError("Connection closed before response")
+                    version, status, reason = self._parse_status_line(status_line)
+                    headers_at = time.perf_counter()
+                    if self.profile is not None:
+                        self.profile.record(parts.netloc, connect_time, headers_at - started)
+                    header_lines = []
+                    while True:
+                        line = await self.wait(reader.readline(), timeout)
+                        if line in (b'\r\n', b'\n', b''):
+                            break
+                        header_lines.append(line.decode('iso-8859-1'))
+                    response_headers = Parser(_class=http.client.HTTPMessage).parsestr(''.join(header_lines))
+                except (ConnectionResetError, BrokenPipeError, asyncio.IncompleteReadError):
+                    # 复用的空闲连接可能已被服务器关闭，换新连接重试一次
+                    writer.close()
+                    self.stats['discarded'] += 1
+                    if not reused:
+                        raise
+                    continue
+                except BaseException:
+                    writer.close()
+                    self.stats['discarded'] += 1
+                    raise
+
+                will_close = (version == 'HTTP/1.0' or
+                              (response_headers.get('Connection') or '').lower() == 'close')
+                self._held[id(writer)] = slot
+                span = None
+                if self.trace is not None:
+                    self.trace.add(kind, 'ttfb', started, headers_at - started, lane=lane)
+                    span = (kind, f"{method} {parts.netloc}", request_started, headers_at, lane,
+                            {'path': path[:200], 'reused': reused})
+                return AsyncResponse(self, key, reader, writer, status, reason, response_headers,
+                                     url, method, will_close, span)
+        except BaseException:
+            slot.release()
+            raise
+
+    @staticmethod
+    def _parse_status_line(line):
+        parts = line.decode('iso-8859-1').strip().split(' ', 2)
+        if len(parts) < 2 or not parts[0].startswith('HTTP/') or not parts[1].isdigit():
+            raise http.client.BadStatusLine(line)
+        return parts[0], int(parts[1]), parts[2] if len(parts) > 2 else ''
+
+    async def _connect(self, key, timeout):
+        """取出空闲连接或新建连接 - 返回 (reader, writer, 是否复用)"""
+        self._evict_idle()
+        idle = self._idle.get(key)
+        while idle:
+            reader, writer, _ = idle.pop()
+            if not writer.is_closing() and not reader.at_eof():
+                self.stats['reused'] += 1
+                return reader, writer, True
+            writer.close()
+            self._lanes.pop(id(writer), None)
+            self.stats['discarded'] += 1
+
+        scheme, host, port = key
+        ssl_context = self.ssl_context if scheme == 'https' else None
+        if scheme == 'https' and ssl_context is None:
+            ssl_context = True
+        try:
+            reader, writer = await self.wait(
+                asyncio.open_connection(host, port, ssl=ssl_context, limit=self.STREAM_LIMIT), timeout)
+        except ConnectionRefusedError as e:
+            # 与urllib的错误信息保持一致，便于共用错误提示
+            raise ConnectionRefusedError(e.errno, "Connection refused") from None
+        self.stats['opened'] += 1
+        return reader, writer, False
+
+    def _trace_response(self, span, status, received):
+        """消息体结束或关闭时记录传输阶段和整个请求"""
+        kind, name, started, headers_at, lane, args = span
+        now = time.perf_counter()
+        self.trace.add(kind, 'transfer', headers_at, now - headers_at, lane=lane, bytes=received)
+        self.trace.add(kind, name, started, now - started, lane=lane, status=status, bytes=received, **args)
+
+    def _release(self, key, reader, writer, reusable):
+        slot = self._held.pop(id(writer), None)
+        if slot is not None:
+            slot.release()
+        if reusable and not writer.is_closing():
+            self._idle.setdefault(key, []).append((reader, writer, time.time()))
+        else:
+            writer.close()
+            self._lanes.pop(id(writer), None)
+            self.stats['discarded'] += 1
+
+    def _evict_idle(self):
+        """关闭超过空闲时间的连接"""
+        now = time.time()
+        for key, idle in list(self._idle.items()):
+            fresh = []
+            for reader, writer, released_at in idle:
+                if now - released_at > self.idle_timeout:
+                    writer.close()
+                    self._lanes.pop(id(writer), None)
+                    self.stats['evicted'] += 1
+                else:
+                    fresh.append((reader, writer, released_at))
+            if fresh:
+                self._idle[key] = fresh
+            else:
+                del self._idle[key]
+
+    async def close(self):
+        writers = [writer for idle in self._idle.values() for _, writer, _ in idle]
+        self._idle.clear()
+        for writer in writers:
+            writer.close()
+        for writer in writers:
+            try:
+                await writer.wait_closed()
+            except (OSError, ConnectionError):
+                pass
+
+    def describe(self):
+        """连接复用统计"""
+        opened = self.stats['opened']
+        reused = self.stats['reused']
+        total = opened + reused
+        rate = reused / total * 100 if total else 0
+        return (f"新建 {opened}，复用 {reused} (复用率 {rate:.0f}%)，"
+                f"空闲回收 {self.stats['evicted']}，断开 {self.stats['discarded']}")
+
+class AsyncDownloadEngine:
+    """asyncio版下载流程 - 网络部分在事件循环中完成
+
+    其余步骤调用DownloadManager的同名逻辑。
+    """
+
+    def __init__(self, manager):
+        self.manager = manager
+        self.client = AsyncHTTPClient(manager.pool.ssl_context, manager.pool.max_per_host,
+                                      manager.pool.idle_timeout, manager.profile, manager.trace)
+
+    def _headers(self, file_url, byte_range=None, if_range=None):
+        """下载请求头与线程版完全相同"""
+        return dict(self.manager._build_download_request(file_url, byte_range, if_range).header_items())
+
+    async def _retry(self, func, label):
+        """与RetryPolicy.call相同，等待用asyncio.sleep，func为返回协程的函数"""
+        policy = self.manager.retry
+        attempt = 0
+        while True:
+            try:
+                return await func()
+            except Exception as e:
+                delay = policy.next_delay(e, attempt)
+                if delay is None:
+                    raise
+                attempt += 1
+                print(f"🔁 {label}失败 ({e})，{delay:.1f}s 后重试 ({attempt}/{policy.max_attempts})")
+                await asyncio.sleep(delay)
+
+    def _read_timeout(self, file_url):
+        """下载请求的超时 - 同时作为消息体的读取超时"""
+        timeout = self.manager.profile.timeout('download', file_url)
+        self.client.read_timeout = timeout
+        return timeout
+
+    async def _query_ip_service(self, service, parse, timeout):
+        response = await self.client.request('GET', service, {'User-Agent': 'SecureDownloader/2.1.0'},
+                                             timeout=timeout, kind='ip')
+        try:
+            data = (await response.read()).decode('utf-8')
+        finally:
+            response.close()
+        return self.manager.parse_ip_response(parse, data)
+
+    async def _race_ip_services(self, timeout=None):
+        """同时查询所有IP服务，返回最先得到的有效IP，其余查询随即取消"""
+        timeout = timeout or self.manager.profile.timeout('ip')
+        tasks = {asyncio.ensure_future(self._query_ip_service(service, parse, timeout)): service
+                 for service, parse in IP_SERVICES}
+        pending = set(tasks)
+        deadline = time.monotonic() + timeout
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, timeout=max(0, deadline - time.monotonic()),
+                                                   return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    break
+                for task in done:
+                    service = tasks[task]
+                    if task.exception() is None:
+                        current_ip = task.result()
+                        print(f"📍 当前IP地址: {current_ip} ({urlparse(service).netloc})")
+                        return current_ip
+                    print(f"⚠️ IP服务 {service} 失败: {task.exception()}")
+            return None
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def get_current_ip(self):
+        """获取当前IP地址 - 与线程版共用按网络状态的缓存"""
+        network_key = self.manager._network_state_key()
+        current_ip = self.manager.cached_ip(network_key)
+        if current_ip:
+            return current_ip
+        return self.manager.remember_ip(network_key, await self._race_ip_services())
+
+    async def verify_ip_with_backend(self):
+        """通过后端验证IP - 返回值与DownloadManager.verify_ip_with_backend相同"""
+        manager = self.manager
+        try:
+            current_ip = await self.get_current_ip()
+            if not current_ip:
+                return False, "❌ 无法获取当前IP地址"
+
+            verify_url, body, headers = manager.build_verify_request(current_ip)
+
+            async def send():
+                try:
+                    response = await self.client.request('POST', verify_url, headers, body,
+                                                         timeout=manager.profile.timeout('verify', verify_url),
+                                                         kind='verify')
+                except urllib.error.HTTPError as e:
+                    # 429/5xx交给重试策略，其余错误响应照常解析
+                    if manager.retry.classify(e):
+                        raise
+                    return e.code, e.read().decode('utf-8', errors='replace')
+                try:
+                    return response.status, (await response.read()).decode('utf-8', errors='replace')
+                finally:
+                    response.close()
+
+            try:
+                status_code, response_text = await self._retry(send, '验证请求')
+            except urllib.error.HTTPError as e:
+                # 后端出错时也返回JSON，交给统一的解析逻辑处理
+                status_code = e.code
+                response_text = e.read().decode('utf-8', errors='replace')
+
+            return manager.interpret_verify_response(status_code, response_text, current_ip)
+
+        except Exception as e:
+            return manager.describe_verify_error(e)
+
+    async def probe_download(self, file_url):
+        """探测远程文件 - 返回值与DownloadManager.probe_download相同"""
+        async def probe():
+            response = await self.client.request('GET', file_url, self._headers(file_url, (0, 0)),
+                                                 timeout=self.manager.profile.timeout('probe', file_url),
+                                                 kind='probe')
+            try:
+                return self.manager.parse_probe_response(response.status, response.headers)
+            finally:
+                await response.aclose()
+
+        try:
+            return await self._retry(probe, '文件探测')
+        except Exception as e:
+            print(f"⚠️ Range探测失败，使用单连接下载: {e}")
+        return {'total_size': 0, 'accept_ranges': False, 'etag': None, 'last_modified': None}
+
+    async def _receive_stream(self, response, writer, position, end=None, on_received=None):
+        """接收循环 - 与线程版相同：数据拼接到缓冲池的缓冲区，填满后交给写盘线程
+
+        StreamReader没有readinto，每次读取的数据需要复制一次到缓冲区。
+        """
+        manager = self.manager
+        limiter = manager.limiter
+        buffer = manager.buffer_pool.acquire()
+        view = memoryview(buffer)
+        filled = 0
+        chunk_start = position
+        flush_deadline = time.perf_counter() + WRITE_FLUSH_INTERVAL
+        finished = False
+        try:
+            while end is None or position <= end:
+                if manager.cancel_download:
+                    raise DownloadCancelled()
+
+                requested = len(buffer) - filled
+                if manager.read_size:
+                    requested = min(requested, manager.read_size)
+                if limiter is not None:
+                    requested = min(requested, limiter.read_size())
+                if end is not None:
+                    requested = min(requested, end - position + 1)
+                data = await response.read_chunk(requested)
+
+                if not data:
+                    if end is None:
+                        break
+                    raise StreamInterrupted(f"Stream ended early at byte {position}")
+
+                received = len(data)
+                view[filled:filled + received] = data
+                filled += received
+                position += received
+                if on_received:
+                    on_received(received)
+                if limiter is not None:
+                    delay = limiter.reserve(received)
+                    if delay:
+                        await asyncio.sleep(delay)
+
+                now = time.perf_counter()
+                if len(buffer) - filled < (manager.read_size or MIN_READ_SIZE) or now >= flush_deadline:
+                    view.release()
+                    full, buffer = buffer, None
+                    await self._write(writer, chunk_start, full, filled)
+                    filled = 0
+                    buffer = manager.buffer_pool.acquire()
+                    view = memoryview(buffer)
+                    chunk_start = position
+                    flush_deadline = now + WRITE_FLUSH_INTERVAL
+            finished = True
+        finally:
+            if buffer is not None:
+                view.release()
+                if filled:
+                    # 已接收的数据照常写入，取消或出错后续传时不用重新下载；
+                    # 写盘线程已出错时只在正常结束时报告，不覆盖正在处理的异常
+                    try:
+                        await self._write(writer, chunk_start, buffer, filled)
+                    except Exception:
+                        if finished:
+                            raise
+                else:
+                    manager.buffer_pool.release(buffer)
+        return position
+
+    @staticmethod
+    async def _write(writer, offset, buffer, length):
+        """把缓冲区交给写盘线程 - 队列已满时在线程池中等待
+
+        只挂起当前分段，不阻塞事件循环。
+        """
+        if not writer.offer(offset, buffer, length):
+            await asyncio.to_thread(writer.write, offset, buffer, length)
+
+    async def _download_single(self, file_url, temp_path, progress_callback=None, hasher=None):
+        """单连接下载 - 服务器不支持Range时使用"""
+        manager = self.manager
+        timeout = self._read_timeout(file_url)
+        response = await self.client.request('GET', file_url, self._headers(file_url), timeout=timeout,
+                                             kind='download')
+        try:
+            total_size = int(response.headers.get('content-length') or 0)
+            reporter = ProgressReporter(progress_callback, total_size)
+            manager.reporter = reporter
+
+            # 单连接下载总是从头开始
+            open(temp_path, 'wb').close()
+            writer = manager._open_writer(temp_path, hasher=hasher)
+            try:
+                writer.preallocate(total_size)
+                received = await self._receive_stream(response, writer, 0, on_received=reporter.add)
+            finally:
+                await asyncio.to_thread(manager._close_writer, writer)
+        finally:
+            response.close()
+        if total_size and received != total_size:
+            raise IOError(f"Download incomplete: received {received} of {total_size} bytes")
+        reporter.flush()
+
+    async def _fetch_segment(self, file_url, writer, start, end, total_size, validator, reporter, watchdog=None):
+        """下载一个分段
+
+        可重试的错误（包括停滞检测断开的连接）按重试策略等待后从已接收的位置重连。
+        """
+        manager = self.manager
+        loop = asyncio.get_running_loop()
+        position = start
+        failures = 0    # 没有进展的连续失败次数
+        stalls = 0      # 连续停滞次数
+        watching = watchdog is not None
+        while True:
+            received = 0
+            watch = None
+
+            def on_received(length):
+                nonlocal received
+                received += length
+                if watch:
+                    watch.add(length)
+                reporter.add(length)
+
+            try:
+                response = await self.client.request('GET', file_url,
+                                                     self._headers(file_url, (position, end), validator),
+                                                     timeout=self._read_timeout(file_url), kind='download')
+                try:
+                    manager.check_range_response(response.status, response.headers, total_size)
+                    if watching:
+                        # 检测线程不能直接操作传输对象，交给事件循环执行
+                        watch = watchdog.watch(f"{urlparse(file_url).netloc} {position}-{end}",
+                                               lambda: loop.call_soon_threadsafe(response.abort))
+                    await self._receive_stream(response, writer, position, end, on_received)
+                except Exception as error:
+                    if watch is not None and watch.stalled:
+                        raise StreamStalled(f"Stream stalled at byte {position + received}") from error
+                    raise
+                finally:
+                    if watch:
+                        watchdog.unwatch(watch)
+                    response.close()
+                return
+            except Exception as e:
+                position += received
+                if received:
+                    failures = 0
+                stalls = stalls + 1 if isinstance(e, StreamStalled) else 0
+                if stalls and received:
+                    # 慢但仍有进展：立即重连，不消耗重试预算；反复停滞后不再检测，按当前速度下载完
+                    if stalls >= STALL_UNWATCH_AFTER:
+                        watching = False
+                        manager.log(f"🐢 分段 {position}-{end} 连续停滞 {stalls} 次，"
+                                    f"不再做停滞检测，按当前速度继续下载")
+                    continue
+                delay = manager.retry.next_delay(e, failures)
+                if delay is None:
+                    raise
+                failures += 1
+                manager.log(f"🔁 分段中断 ({e})，{delay:.1f}s 后从 {position} 处重连 "
+                            f"({failures}/{manager.retry.max_attempts})")
+                await asyncio.sleep(delay)
+
+    async def _download_ranges(self, file_url, temp_path, journal, connections, progress_callback=None, hasher=None):
+        """按Range下载日志中缺失的部分 - 每个分段是一个任务，共用一个写盘线程"""
+        manager = self.manager
+        total_size = journal.total_size
+        segments = manager.plan_segments(journal.missing_ranges(), connections)
+
+        writer = manager._open_writer(temp_path, journal, hasher)
+        try:
+            writer.preallocate(total_size)
+            if not segments:
+                return
+            if len(segments) > 1:
+                print(f"🔀 分段下载: {len(segments)} 个连接")
+
+            reporter = ProgressReporter(progress_callback, total_size, journal.completed_bytes())
+            manager.reporter = reporter
+            validator = journal.validator()
+            watchdog = manager._open_watchdog()
+            reporter.flush()
+            tasks = [asyncio.ensure_future(self._fetch_segment(file_url, writer, start, end, total_size,
+                                                               validator, reporter, watchdog))
+                     for start, end in segments]
+            try:
+                await asyncio.gather(*tasks)
+            except BaseException:
+                # 任一分段失败时取消其余分段，等它们把已接收的数据交给写盘线程
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                raise
+            finally:
+                if watchdog:
+                    watchdog.close()
+                reporter.flush()
+        finally:
+            # 写盘线程写完后才保存日志，保证日志包含所有已写入的范围
+            try:
+                await asyncio.to_thread(manager._close_writer, writer)
+            finally:
+                journal.save()
+
+    async def download_file(self, progress_callback=None, info=None):
+        """下载文件 - 返回值与DownloadManager.download_file相同，info为已完成的探测结果"""
+        manager = self.manager
+        manager.last_failure = None
+        try:
+            file_url = manager.config.get('download', 'file_url')
+            cached = await asyncio.to_thread(manager.try_download_cache, file_url, progress_callback)
+            if cached:
+                return cached
+            file_url, save_path = manager._prepare_download()
+            print(f"🌐 开始下载: {file_url}")
+
+            if info is None:
+                info = await self.probe_download(file_url)
+            temp_path, journal, hasher = manager._begin_download(file_url, save_path, info)
+
+            connections = manager.config.getint('download', 'connections', fallback=DEFAULT_CONNECTIONS)
+            resume_retries = manager.config.getint('download', 'resume_retries', fallback=3)
+
+            try:
+                attempt = 0
+                while True:
+                    try:
+                        if journal:
+                            await self._download_ranges(file_url, temp_path, journal, connections,
+                                                        progress_callback, hasher)
+                        else:
+                            print("ℹ️ 服务器不支持Range请求，使用单连接下载")
+                            await self._download_single(file_url, temp_path, progress_callback, hasher)
+                        break
+                    except (DownloadCancelled, RemoteFileChanged):
+                        raise
+                    except Exception as e:
+                        # 可续传时按重试策略等待后从断点继续（分段内的重连已用完时）
+                        if journal is None or attempt >= resume_retries:
+                            raise
+                        delay = manager.retry.next_delay(e, attempt)
+                        if delay is None:
+                            raise
+                        attempt += 1
+                        print(f"🔁 下载中断，{delay:.1f}s 后自动续传 ({attempt}/{resume_retries}): {e}")
+                        await asyncio.sleep(delay)
+
+                result = await asyncio.to_thread(manager._complete_download, temp_path, save_path,
+                                                 journal, hasher, info['total_size'])
+                await asyncio.to_thread(manager.store_in_cache, file_url, info)
+                return result
+            except Exception as e:
+                return manager._download_failed(e, temp_path, journal)
+            finally:
+                hasher.abort()
+
+        except Exception as e:
+            manager.last_failure = 'error'
+            return False, manager.describe_download_error(e)
+
+    async def process(self, progress_callback=None, on_verified=None):
+        """完整流程 - IP查询/验证与文件探测同时进行，验证通过后开始下载
+
+        返回 (是否通过验证, 验证信息, download_file的结果或None)
+        """
+        file_url = self.manager.config.get('download', 'file_url')
+        probe = asyncio.ensure_future(self.probe_download(file_url))
+        try:
+            verified, verify_message = await self.verify_ip_with_backend()
+            if on_verified:
+                on_verified(verified, verify_message)
+            if not verified:
+                return verified, verify_message, None
+            info = await probe
+            return verified, verify_message, await self.download_file(progress_callback, info)
+        finally:
+            if not probe.done():
+                probe.cancel()
+
+    async def close(self):
+        await self.client.close()
+
+def run_engine(manager, progress_callback=None, on_verified=None):
+    """在新的事件循环中运行完整流程 - 供无界面模式调用"""
+    manager.retry.reset()
+
+    async def runner():
+        engine = AsyncDownloadEngine(manager)
+        try:
+            return await engine.process(progress_callback, on_verified)
+        finally:
+            print(f"🔌 连接池(asyncio): {engine.client.describe()}")
+            await engine.close()
+
+    return asyncio.run(runner())
@@ -0,0 +1,392 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+download_api.php 的Python替身 - 实现 create / verify / stats 三个接口，用于本地压测和回归测试
+
+数据存放在SQLite（默认内存库），表结构取自 admin/database_manager.php 中用到的列。
+verify 按 verifyIP 的判断顺序返回：INVALID_TOKEN → TOKEN_NOT_FOUND → TOKEN_EXPIRED →
+MAX_DOWNLOADS_EXCEEDED → IP_VERIFICATION_DISABLED → INVALID_IP → IP_MATCH → IP_MISMATCH_ALLOWED / IP_MISMATCH_STRICT。
+每个响应发送前可注入固定延迟加随机抖动，模拟PHP + MySQL的处理时间。
+不写日志文件、不生成下载器压缩包，create返回的download_url只是占位路径。
+用法: python bench/api_standin.py --port 8790 --latency 20 --jitter 10
+"""
+
+import argparse
+import copy
+import gzip
+import hashlib
+import json
+import random
+import re
+import secrets
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# 与 admin/config_master.php 的默认值一致
+DEFAULT_CONFIG = {
+    'ip_verification': {
+        'enabled': True,
+        'strict_mode': False,
+        'allow_ip_mismatch': True,
+        'max_downloads_per_token': 5,
+        'token_expiry_hours': 24,
+    },
+    'downloader': {
+        'show_log': True,
+    },
+}
+DEFAULT_SITE = {'site_key': 'bench', 'name': 'Bench', 'domain': '127.0.0.1', 'api_key': 'bench-api-key'}
+
+SCHEMA = """
+CREATE TABLE sites (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    site_key TEXT UNIQUE NOT NULL,
+    name TEXT NOT NULL,
+    domain TEXT NOT NULL,
+    api_key TEXT UNIQUE NOT NULL
+);
+CREATE TABLE downloads (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    site_id INTEGER NOT NULL REFERENCES sites(id),
+    token TEXT UNIQUE NOT NULL,
+    software_name TEXT NOT NULL,
+    file_url TEXT NOT NULL,
+    original_ip TEXT NOT NULL,
+    user_agent TEXT,
+    created_at REAL NOT NULL,
+    downloaded_at REAL,
+    download_count INTEGER DEFAULT 0,
+    status TEXT DEFAULT 'active',
+    expires_at REAL NOT NULL,
+    metadata TEXT
+);
+CREATE TABLE ip_verifications (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    download_id INTEGER NOT NULL REFERENCES downloads(id),
+    token TEXT NOT NULL,
+    verify_ip TEXT NOT NULL,
+    result TEXT NOT NULL,
+    user_agent TEXT,
+    created_at REAL NOT NULL
+);
+"""
+
+SUCCESS_RESULTS = ('IP_MATCH', 'IP_MISMATCH_ALLOWED', 'IP_VERIFICATION_DISABLED')
+
+class StandinStore:
+    """SQLite存储 - 所有请求线程共用一个连接，用锁串行化（与单个MySQL连接的行为相近）"""
+
+    def __init__(self, path=':memory:'):
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        if not self._db.execute("SELECT name FROM sqlite_master WHERE name = 'sites'").fetchone():
+            self._db.executescript(SCHEMA)
+
+    def add_site(self, site_key, name, domain, api_key):
+        with self._lock:
+            self._db.execute("INSERT OR IGNORE INTO sites (site_key, name, domain, api_key) VALUES (?, ?, ?, ?)",
+                             (site_key, name, domain, api_key))
+
+    def site_by_api_key(self, api_key):
+        with self._lock:
+            return self._db.execute("SELECT * FROM sites WHERE api_key = ?", (api_key,)).fetchone()
+
+    def site_by_token(self, token):
+        with self._lock:
+            return self._db.execute(
+                "SELECT s.* FROM sites s JOIN downloads d ON s.id = d.site_id WHERE d.token = ?", (token,)).fetchone()
+
+    def create_download(self, site_id, token, software_name, file_url, original_ip, user_agent, expires_at, metadata):
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO downloads (site_id, token, software_name, file_url, original_ip, user_agent, "
+                "created_at, expires_at, metadata) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (site_id, token, software_name, file_url, original_ip, user_agent, time.time(), expires_at,
+                 json.dumps(metadata)))
+
+    def download_by_token(self, token):
+        with self._lock:
+            return self._db.execute(
+                "SELECT d.*, s.name AS site_name FROM downloads d JOIN sites s ON d.site_id = s.id WHERE d.token = ?",
+                (token,)).fetchone()
+
+    def record_verification(self, download_id, token, verify_ip, result, user_agent, success):
+        """记录验证结果；验证通过时同时增加下载次数（对应executeSuccessActions）"""
+        with self._lock:
+            self._db.execute("BEGIN")
+            self._db.execute(
+                "INSERT INTO ip_verifications (download_id, token, verify_ip, result, user_agent, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)", (download_id, token, verify_ip, result, user_agent, time.time()))
+            if success:
+                self._db.execute(
+                    "UPDATE downloads SET download_count = download_count + 1, downloaded_at = ?, "
+                    "status = 'completed' WHERE token = ?", (time.time(), token))
+            self._db.execute("COMMIT")
+
+    def stats(self, site_id):
+        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0).timestamp()
+        with self._lock:
+            def count(sql, *params):
+                return self._db.execute(sql, params).fetchone()[0]
+            total = count("SELECT COUNT(*) FROM downloads WHERE site_id = ?", site_id)
+            today_count = count("SELECT COUNT(*) FROM downloads WHERE site_id = ? AND created_at >= ?", site_id, today)
+            verifications = count(
+                "SELECT COUNT(*) FROM ip_verifications v JOIN downloads d ON v.download_id = d.id "
+                "WHERE d.site_id = ?", site_id)
+            successful = count(
+                "SELECT COUNT(*) FROM ip_verifications v JOIN downloads d ON v.download_id = d.id "
+                f"WHERE d.site_id = ? AND v.result IN ({','.join('?' * len(SUCCESS_RESULTS))})",
+                site_id, *SUCCESS_RESULTS)
+        return total, today_count, successful, verifications
+
+class StandinHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'ApiStandin/1.0'
+    # 响应头和响应体分两次发送，开着Nagle时小响应会等对方的延迟ACK（约40ms）
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.handle_api({})
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0))).decode('utf-8', errors='replace')
+        self.handle_api({key: values[-1] for key, values in parse_qs(body).items()})
+
+    def handle_api(self, form):
+        self.query = {key: values[-1] for key, values in parse_qs(urlparse(self.path).query).items()}
+        self.form = form
+        self.server.inject_latency()
+
+        action = self.query.get('action') or form.get('action', '')
+        self.site = self.identify_site(action)
+        if self.site is None:
+            self.send_json({'success': False, 'message': '未识别的站点'}, 401)
+            return
+        handler = {'create': self.create_download, 'verify': self.verify_ip, 'stats': self.get_stats}.get(action)
+        if handler is None:
+            self.send_json({'success': False, 'message': '无效的操作'}, 400)
+            return
+        try:
+            handler()
+        except ValueError as e:
+            self.send_json({'success': False, 'message': str(e)}, 500)
+
+    def param(self, name, default=''):
+        """对应PHP的 $_POST[...] ?? $_GET[...]"""
+        return self.form.get(name, self.query.get(name, default))
+
+    def identify_site(self, action):
+        """按API Key、token识别站点；verify请求只带token时使用临时站点（与identifySite一致）"""
+        store = self.server.store
+        api_key = self.headers.get('X-API-Key') or self.param('api_key')
+        token = self.param('token')
+        site = store.site_by_api_key(api_key) if api_key else None
+        if site is None and token:
+            site = store.site_by_token(token)
+        if site is None and action == 'verify' and token:
+            return {'id': 0, 'name': 'Token验证', 'site_key': 'token_verify'}
+        return dict(site) if site else None
+
+    def create_download(self):
+        config = self.server.config['ip_verification']
+        file_url = self.form.get('file_url', '')
+        software_name = self.form.get('software_name', '')
+        sha256 = self.form.get('sha256', '').strip().lower()
+        if sha256 and not re.fullmatch(r'[0-9a-f]{64}', sha256):
+            raise ValueError('无效的SHA-256')
+        client_ip = self.form.get('user_ip') or self.client_address[0]
+        if not file_url or not software_name:
+            raise ValueError('缺少必要参数')
+        if urlparse(file_url).scheme not in ('http', 'https'):
+            raise ValueError('无效的文件地址')
+
+        token = f"{self.site['site_key'][:3]}_{int(time.time())}_{secrets.token_hex(12)}"
+        expires_at = time.time() + config['token_expiry_hours'] * 3600
+        self.server.store.create_download(
+            self.site['id'], token, software_name, file_url, client_ip, self.headers.get('User-Agent', ''),
+            expires_at, {'site_name': self.site['name'], 'created_via': 'api', 'sha256': sha256})
+        self.send_json({
+            'success': True,
+            'token': token,
+            'download_url': f"../downloads/{token}.zip",
+            'expires_at': datetime.fromtimestamp(expires_at).strftime('%Y-%m-%d %H:%M:%S'),
+            'site': self.site['name'],
+            'message': '下载器生成成功',
+        })
+
+    def verify_ip(self):
+        config = self.server.config['ip_verification']
+        store = self.server.store
+        token = self.form.get('token', '')
+        current_ip = self.form.get('current_ip', '')
+        user_agent = self.headers.get('User-Agent', '')
+
+        if not token:
+            self.send_json({'S': 0, 'result': 'INVALID_TOKEN', 'message': '缺少验证令牌'})
+            return
+        record = store.download_by_token(token)
+        if record is None:
+            self.send_json({'S': 0, 'result': 'TOKEN_NOT_FOUND', 'message': '令牌不存在'})
+            return
+        if record['expires_at'] < time.time():
+            self.send_json({'S': 0, 'result': 'TOKEN_EXPIRED', 'message': '下载令牌已过期'})
+            return
+        if record['download_count'] >= config['max_downloads_per_token']:
+            self.send_json({'S': 0, 'result': 'MAX_DOWNLOADS_EXCEEDED', 'message': '下载次数已达上限'})
+            return
+
+        if not config['enabled']:
+            result, message = 'IP_VERIFICATION_DISABLED', 'IP验证已禁用，直接通过'
+        elif not current_ip:
+            self.send_json({'S': 0, 'result': 'INVALID_IP', 'message': '缺少当前IP地址'})
+            return
+        elif current_ip == record['original_ip']:
+            result, message = 'IP_MATCH', 'IP地址验证通过'
+        elif config.get('allow_ip_mismatch', True):
+            result, message = 'IP_MISMATCH_ALLOWED', 'IP地址不匹配，但允许下载'
+        else:
+            store.record_verification(record['id'], token, current_ip, 'IP_MISMATCH_STRICT', user_agent, False)
+            self.send_json({'S': 0, 'result': 'IP_MISMATCH_STRICT', 'message': 'IP地址不匹配，下载被拒绝'})
+            return
+
+        store.record_verification(record['id'], token, current_ip, result, user_agent, True)
+        metadata = json.loads(record['metadata'] or '{}')
+        self.send_json({
+            'S': 1,
+            'result': result,
+            'message': message,
+            'file_url': record['file_url'],
+            'software_name': record['software_name'],
+            'site': record['site_name'],
+            'sha256': metadata.get('sha256', ''),
+        })
+
+    def get_stats(self):
+        config = self.server.config
+        settings = {
+            'site': self.site['name'],
+            'ip_verification_enabled': config['ip_verification']['enabled'],
+            'strict_mode': config['ip_verification']['strict_mode'],
+            'downloader_show_log': config['downloader']['show_log'],
+        }
+        if self.query.get('scope') == 'settings':
+            self.send_settings(settings)
+            return
+
+        total, today, successful, verifications = self.server.store.stats(self.site['id'])
+        self.send_json({
+            'success': True,
+            'total_downloads': total,
+            'today_downloads': today,
+            'success_rate': round(successful / verifications * 100, 2) if verifications else 0,
+            **settings,
+        })
+
+    def send_settings(self, settings):
+        """对应getSettings - 带ETag/Last-Modified，条件请求命中时返回304"""
+        modified = int(self.server.config_modified)
+        etag = '"' + hashlib.sha1((json.dumps(settings) + str(modified)).encode('utf-8')).hexdigest() + '"'
+        headers = {'ETag': etag, 'Last-Modified': formatdate(modified, usegmt=True),
+                   'Cache-Control': 'private, no-cache'}
+
+        if_none_match = self.headers.get('If-None-Match', '').strip()
+        if_modified_since = self.headers.get('If-Modified-Since', '')
+        if if_none_match:
+            not_modified = if_none_match == '*' or etag in (tag.strip() for tag in if_none_match.split(','))
+        else:
+            try:
+                not_modified = bool(if_modified_since) and parsedate_to_datetime(if_modified_since).timestamp() >= modified
+            except (TypeError, ValueError):
+                not_modified = False
+        if not_modified:
+            self.send_response(304)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_json({'success': True, **settings}, headers=headers)
+
+    def send_json(self, data, status=200, headers=None):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        # 与sendResponse一致：客户端接受gzip时压缩512字节以上的响应
+        self.send_header('Vary', 'Accept-Encoding')
+        if len(body) >= 512 and re.search(r'\bgzip\b', self.headers.get('Accept-Encoding', ''), re.I):
+            body = gzip.compress(body, 6)
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+class StandinServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+    def __init__(self, address, store=None, config=None, latency=0.0, jitter=0.0):
+        super().__init__(address, StandinHandler)
+        self.store = store or StandinStore()
+        self.config = copy.deepcopy(config or DEFAULT_CONFIG)
+        self.config_modified = time.time()
+        self.latency = latency    # 每个响应的固定延迟（秒）
+        self.jitter = jitter      # 在固定延迟上叠加 0~jitter 秒的均匀随机延迟
+        self.store.add_site(**DEFAULT_SITE)
+
+    def inject_latency(self):
+        delay = self.latency + (random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay > 0:
+            time.sleep(delay)
+
+    def update_config(self, section, **values):
+        """修改配置（对应编辑config_master.php），settings的ETag随之变化"""
+        self.config[section].update(values)
+        self.config_modified = time.time()
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/api/download_api.php"
+
+def start_standin(host='127.0.0.1', port=0, **options):
+    """在后台线程启动替身接口，返回server对象（server.base_url为接口地址）"""
+    server = StandinServer((host, port), **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description='download_api.php 的Python替身')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8790)
+    parser.add_argument('--db', default=':memory:', help='SQLite数据库文件（默认内存库）')
+    parser.add_argument('--latency', type=float, default=0.0, help='每个响应的固定延迟（毫秒）')
+    parser.add_argument('--jitter', type=float, default=0.0, help='叠加的随机延迟上限（毫秒）')
+    parser.add_argument('--max-downloads', type=int, default=DEFAULT_CONFIG['ip_verification']['max_downloads_per_token'],
+                        help='每个令牌的最大下载次数（压测时调大）')
+    parser.add_argument('--strict', action='store_true', help='IP不匹配时拒绝（allow_ip_mismatch = false）')
+    parser.add_argument('--disable-ip-verification', action='store_true')
+    args = parser.parse_args()
+
+    server = StandinServer((args.host, args.port), StandinStore(args.db),
+                           latency=args.latency / 1000, jitter=args.jitter / 1000)
+    server.update_config('ip_verification', max_downloads_per_token=args.max_downloads,
+                         allow_ip_mismatch=not args.strict, enabled=not args.disable_ip_verification)
+    print(f"🌐 接口替身已启动: {server.base_url} (API Key: {DEFAULT_SITE['api_key']})", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
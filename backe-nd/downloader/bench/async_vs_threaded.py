@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+下载引擎基准测试 - 对比线程版(urllib连接池)与asyncio版在多连接下载时的表现
+
+源站在独立子进程中运行，这里统计的CPU时间只包含下载端。每轮都是完整的download_file：
+探测、分段下载、写盘线程和SHA-256校验，区别只在网络部分由线程还是事件循环完成。
+用法: python bench/async_vs_threaded.py --size 256M --connections 4 16 64 --rounds 2
+"""
+
+import argparse
+import asyncio
+import configparser
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from downloader import DownloadManager  # noqa: E402
+from async_engine import AsyncDownloadEngine  # noqa: E402
+from origin_server import content_sha256, parse_size  # noqa: E402
+from receive_path import start_origin_process  # noqa: E402
+
+class ThreadSampler:
+    """后台采样进程内的线程数峰值"""
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            # 不计算采样线程本身
+            self.peak = max(self.peak, threading.active_count() - 1)
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+def make_manager(url, connections, sha256, download_dir):
+    manager = DownloadManager()
+    manager.config = configparser.ConfigParser()
+    manager.config.read_dict({'download': {
+        'file_url': url, 'software_name': 'bench.bin', 'token': 'bench',
+        'connections': str(connections), 'sha256': sha256, 'cache_size': '0'}})
+    manager.pool.max_per_host = connections
+    manager.download_dir = download_dir
+    return manager
+
+def run_threaded(manager):
+    return manager.download_file()
+
+def run_async(manager):
+    async def runner():
+        engine = AsyncDownloadEngine(manager)
+        try:
+            return await engine.download_file()
+        finally:
+            await engine.close()
+    return asyncio.run(runner())
+
+def measure(run, manager, size):
+    with ThreadSampler() as sampler:
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        success, message = run(manager)
+        cpu = time.process_time() - cpu_start
+        wall = time.perf_counter() - wall_start
+    if not success:
+        raise RuntimeError(message)
+    os.remove(manager.last_save_path)
+    return {
+        'wall_seconds': round(wall, 3),
+        'cpu_seconds': round(cpu, 3),
+        'mb_per_second': round(size / 1024 ** 2 / wall, 1),
+        'cpu_seconds_per_gb': round(cpu / (size / 1024 ** 3), 3),
+        'peak_threads': sampler.peak,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='线程版与asyncio版下载引擎对比')
+    parser.add_argument('--size', default='256M', help='测试文件大小，如 256M / 1G')
+    parser.add_argument('--connections', type=int, nargs='+', default=[4, 16, 64])
+    parser.add_argument('--rounds', type=int, default=2)
+    parser.add_argument('--port', type=int, default=8798)
+    args = parser.parse_args()
+
+    size = parse_size(args.size)
+    url = f"http://127.0.0.1:{args.port}/{size}.bin"
+    sha256 = content_sha256(size)
+    engines = {'threaded': run_threaded, 'async': run_async}
+    results = {}
+
+    origin = start_origin_process(args.port)
+    try:
+        with tempfile.TemporaryDirectory() as download_dir:
+            for connections in args.connections:
+                runs = {name: [] for name in engines}
+                for _ in range(args.rounds):
+                    # 交替运行，减少系统缓存等因素对某一方的偏向
+                    for name, run in engines.items():
+                        manager = make_manager(url, connections, sha256, download_dir)
+                        runs[name].append(measure(run, manager, size))
+                results[connections] = {
+                    name: min(samples, key=lambda r: r['wall_seconds']) for name, samples in runs.items()}
+    finally:
+        origin.terminate()
+        origin.wait()
+
+    print(json.dumps({'size': args.size, 'rounds': args.rounds, 'best_by_connections': results}, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地测试源站 - 用于在不访问生产file_url的情况下测试下载器性能
+
+请求路径即文件大小，例如 /104857600.bin 或 /100M.bin。
+文件内容由固定的1MB伪随机块重复生成，不占用磁盘和大量内存；扩展名为 .txt 时改用可压缩的日志文本块。
+支持 Range / If-Range / ETag / If-None-Match / HEAD。
+可模拟每个连接的带宽（--rate）和响应延迟（--latency）。
+--gzip 时对接受gzip的 .txt 完整（非Range）请求以chunked发送gzip数据，带宽限制按压缩后的字节计算。
+每个1MB文本块预先压缩为一个gzip成员，响应由这些成员依次拼接（类似nginx gzip_static，源站不占压缩CPU）。
+另外提供无界面模式需要的两个替身接口：GET /ip 返回客户端IP，POST 任意路径返回验证通过。
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PATTERN_SIZE = 1024 * 1024
+PATTERN = random.Random(20250101).randbytes(PATTERN_SIZE)
+
+def make_text_pattern():
+    """可压缩的内容块 - 伪随机生成的访问日志行，截取为PATTERN_SIZE字节"""
+    rng = random.Random(20250102)
+    lines = []
+    size = 0
+    while size < PATTERN_SIZE:
+        line = (f"2025-01-01T{rng.randrange(24):02d}:{rng.randrange(60):02d}:{rng.randrange(60):02d}Z "
+                f"{rng.choice(('INFO', 'INFO', 'INFO', 'WARN', 'DEBUG'))} worker-{rng.randrange(16)} "
+                f"GET /api/v1/items/{rng.randrange(100000)} status={rng.choice((200, 200, 200, 304, 404))} "
+                f"bytes={rng.randrange(100000)} ms={rng.randrange(500)}\n").encode('ascii')
+        lines.append(line)
+        size += len(line)
+    return b''.join(lines)[:PATTERN_SIZE]
+
+TEXT_PATTERN = make_text_pattern()
+
+def parse_size(text):
+    """解析 100M / 1G / 4096 之类的大小"""
+    match = re.fullmatch(r'(\d+)([KMG]?)', text.upper())
+    if not match:
+        raise ValueError(f"Invalid size: {text}")
+    units = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+    return int(match.group(1)) * units[match.group(2)]
+
+def iter_content(start, end, block_size=256 * 1024, pattern=PATTERN):
+    """生成 [start, end] 闭区间的文件内容"""
+    view = memoryview(pattern)
+    position = start
+    while position <= end:
+        offset = position % PATTERN_SIZE
+        length = min(block_size, PATTERN_SIZE - offset, end - position + 1)
+        yield view[offset:offset + length]
+        position += length
+
+def content_sha256(size, pattern=PATTERN):
+    """计算指定大小文件的SHA-256（用于校验下载结果）"""
+    digest = hashlib.sha256()
+    for block in iter_content(0, size - 1, pattern=pattern):
+        digest.update(block)
+    return digest.hexdigest()
+
+GZIP_TEXT_BLOCK = gzip.compress(TEXT_PATTERN, 1)
+
+def gzip_members(size):
+    """size字节文本内容的gzip数据 - 完整的块使用预先压缩的成员，最后不足一块的部分单独压缩"""
+    for _ in range(size // PATTERN_SIZE):
+        yield GZIP_TEXT_BLOCK
+    if size % PATTERN_SIZE:
+        yield gzip.compress(TEXT_PATTERN[:size % PATTERN_SIZE], 1)
+
+class OriginHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'BenchOrigin/1.0'
+    # 响应头和响应体分两次发送，开着Nagle时小响应会等对方的延迟ACK（约40ms）
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        self.send_file(head_only=True)
+
+    def do_GET(self):
+        if self.path == '/ip':
+            self.send_json({'ip': self.client_address[0]})
+            return
+        self.send_file()
+
+    def do_POST(self):
+        """验证接口替身 - 总是返回IP_MATCH，sha256留空时下载器使用配置中的值"""
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.send_json({'S': 1, 'result': 'IP_MATCH', 'message': 'bench', 'sha256': ''})
+
+    def send_json(self, data):
+        body = json.dumps(data).encode('utf-8')
+        self.delay()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def delay(self):
+        """模拟往返延迟 - 每个响应发送前等待"""
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+    def send_file(self, head_only=False):
+        name, _, extension = self.path.lstrip('/').partition('.')
+        try:
+            size = parse_size(name)
+        except ValueError:
+            self.send_error(404)
+            return
+        pattern = TEXT_PATTERN if extension == 'txt' else PATTERN
+
+        self.delay()
+        etag = f'"bench-{size}{"-txt" if pattern is TEXT_PATTERN else ""}"'
+        start, end, status = 0, size - 1, 200
+
+        # 条件请求优先于Range；压缩响应的ETag带 -gzip 后缀，两种都视为同一内容
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match and if_none_match.replace('-gzip"', '"') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+
+        range_header = self.headers.get('Range')
+        if_range = self.headers.get('If-Range')
+        match = re.fullmatch(r'bytes=(\d*)-(\d*)', range_header or '')
+        if match and self.server.accept_ranges and (not if_range or if_range == etag):
+            if match.group(1):
+                start = int(match.group(1))
+                end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+            else:
+                start = max(0, size - int(match.group(2)))
+            if start > end:
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{size}')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            status = 206
+
+        # 与nginx默认的gzip_types一样只压缩文本；只压缩完整内容，Range总是针对未压缩的内容
+        compress = (self.server.gzip and status == 200 and pattern is TEXT_PATTERN
+                    and re.search(r'\bgzip\b', self.headers.get('Accept-Encoding', ''), re.I) is not None)
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/plain' if pattern is TEXT_PATTERN else 'application/octet-stream')
+        if compress:
+            self.send_header('Content-Encoding', 'gzip')
+            self.send_header('Transfer-Encoding', 'chunked')
+            etag = etag[:-1] + '-gzip"'
+        else:
+            self.send_header('Content-Length', str(end - start + 1))
+        if self.server.gzip:
+            self.send_header('Vary', 'Accept-Encoding')
+        self.send_header('ETag', etag)
+        if self.server.accept_ranges:
+            self.send_header('Accept-Ranges', 'bytes')
+        if status == 206:
+            self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        self.end_headers()
+
+        if head_only:
+            return
+        rate = self.server.rate
+        # 限速时小块发送，每块发送后按已发送字节数等到应到的时间
+        block_size = max(16 * 1024, min(256 * 1024, rate // 20)) if rate else 256 * 1024
+        blocks = gzip_members(size) if compress else iter_content(start, end, block_size, pattern)
+        started = time.perf_counter()
+        sent = 0
+        try:
+            for block in blocks:
+                if compress:
+                    self.wfile.write(b'%x\r\n' % len(block))
+                    self.wfile.write(block)
+                    self.wfile.write(b'\r\n')
+                else:
+                    self.wfile.write(block)
+                if rate:
+                    sent += len(block)
+                    wait = started + sent / rate - time.perf_counter()
+                    if wait > 0:
+                        time.sleep(wait)
+            if compress:
+                self.wfile.write(b'0\r\n\r\n')
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+class OriginServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # 默认backlog只有5，几十个连接同时建立时会丢SYN并等待重传，测到的是源站而不是下载端
+    request_queue_size = 256
+
+    def __init__(self, address, accept_ranges=True, rate=0, latency=0.0, gzip=False):
+        super().__init__(address, OriginHandler)
+        self.accept_ranges = accept_ranges
+        self.gzip = gzip          # 是否对接受gzip的完整请求压缩传输
+        self.rate = rate          # 每个连接的速率（字节/秒），0表示不限速
+        self.latency = latency    # 每个响应的附加延迟（秒）
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+def start_origin(host='127.0.0.1', port=0, accept_ranges=True, rate=0, latency=0.0, gzip=False):
+    """在后台线程启动源站，返回server对象（server.base_url为访问地址）"""
+    server = OriginServer((host, port), accept_ranges, rate, latency, gzip)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description='本地测试源站')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--no-ranges', action='store_true', help='不支持Range请求')
+    parser.add_argument('--rate', default='0', help='每个连接的速率，如 10M（字节/秒，0表示不限速）')
+    parser.add_argument('--latency', type=float, default=0.0, help='每个响应的附加延迟（毫秒）')
+    parser.add_argument('--gzip', action='store_true', help='对接受gzip的 .txt 完整请求压缩传输（如 /100M.txt）')
+    args = parser.parse_args()
+
+    server = OriginServer((args.host, args.port), accept_ranges=not args.no_ranges,
+                          rate=parse_size(args.rate), latency=args.latency / 1000, gzip=args.gzip)
+    print(f"🌐 测试源站已启动: {server.base_url}/100M.bin", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
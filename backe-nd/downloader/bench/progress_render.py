@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+进度条绘制基准测试 - 对比旧的 delete("all") + 重建矩形 与保留模式的 ProgressBar
+
+模拟以 --rate 的速度下载 --size 大小的文件：每收到 --chunk 字节调用一次进度更新（最坏情况，
+实际界面按帧合并），每 --frame 毫秒让Tk处理一次重绘。统计Tk主线程的CPU时间，按GB折算。
+需要图形界面环境（Windows/macOS桌面，或Linux上的X服务器/Xvfb）。
+用法: python bench/progress_render.py --size 4G --rate 500M --chunk 256K
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import tkinter as tk  # noqa: E402
+
+from downloader import BandwidthLimiter, ProgressBar, TransferRate  # noqa: E402
+from origin_server import parse_size  # noqa: E402
+
+def legacy_draw(canvas, progress):
+    """旧的update_progress_bar：每次删除全部元素并重建两个矩形"""
+    canvas.delete("all")
+    width = canvas.winfo_width()
+    height = canvas.winfo_height()
+    if width > 1:
+        canvas.create_rectangle(0, 0, width, height, fill='#404040', outline='')
+        if progress > 0:
+            canvas.create_rectangle(0, 0, int((progress / 100) * width), height, fill='#0078d4', outline='')
+
+def make_canvas(root):
+    canvas = tk.Canvas(root, width=700, height=25, bg='#404040', highlightthickness=0)
+    canvas.pack(fill=tk.X)
+    root.update()
+    return canvas
+
+def run(root, draw, size, rate, chunk, frame):
+    """按模拟的下载进度调用draw，返回 (CPU秒数, 更新次数)"""
+    updates = 0
+    next_frame = 0.0
+    started = time.process_time()
+    for downloaded in range(chunk, size + chunk, chunk):
+        downloaded = min(downloaded, size)
+        # 模拟时间：按速率换算，不真正等待
+        now = downloaded / rate
+        draw(downloaded * 100 / size, downloaded, size, now)
+        updates += 1
+        if now >= next_frame:
+            next_frame = now + frame
+            root.update_idletasks()
+    root.update()
+    return time.process_time() - started, updates
+
+def main():
+    parser = argparse.ArgumentParser(description='进度条绘制基准测试')
+    parser.add_argument('--size', default='4G', help='模拟的文件大小')
+    parser.add_argument('--rate', default='500M', help='模拟的下载速度（字节/秒）')
+    parser.add_argument('--chunk', default='256K', help='每次进度更新之间的字节数')
+    parser.add_argument('--frame', type=float, default=33, help='Tk重绘间隔（毫秒）')
+    args = parser.parse_args()
+
+    size = parse_size(args.size)
+    rate = BandwidthLimiter.parse_rate(args.rate)
+    chunk = parse_size(args.chunk)
+    frame = args.frame / 1000
+
+    root = tk.Tk()
+    results = {}
+
+    canvas = make_canvas(root)
+    cpu, updates = run(root, lambda progress, *_: legacy_draw(canvas, progress), size, rate, chunk, frame)
+    results['legacy'] = {'cpu_seconds': round(cpu, 3), 'updates': updates}
+    canvas.destroy()
+
+    canvas = make_canvas(root)
+    bar = ProgressBar(canvas)
+    root.update()
+    speed = TransferRate()
+
+    def retained_draw(progress, downloaded, total, now):
+        bar.set(progress, TransferRate.describe(*speed.update(downloaded, total, now)))
+
+    cpu, updates = run(root, retained_draw, size, rate, chunk, frame)
+    results['retained'] = {'cpu_seconds': round(cpu, 3), 'updates': updates, 'tk_calls': bar.redraws}
+    root.destroy()
+
+    gigabytes = size / 1024 ** 3
+    for result in results.values():
+        result['cpu_seconds_per_gb'] = round(result['cpu_seconds'] / gigabytes, 4)
+        # 以--rate下载时Tk线程占用的CPU比例
+        result['cpu_percent_at_rate'] = round(result['cpu_seconds'] / (size / rate) * 100, 2)
+    print(json.dumps({'size': size, 'rate': rate, 'chunk': chunk, 'frame_ms': args.frame, **results}, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+接收路径基准测试 - 对比旧的 read(16384) 循环与 readinto 缓冲池 + 自适应读取大小
+
+源站在独立子进程中运行，这里统计的CPU时间只包含下载端。
+用法: python bench/receive_path.py --size 1G --rounds 3
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from downloader import DiskWriter, DownloadManager, ProgressReporter  # noqa: E402
+from origin_server import parse_size  # noqa: E402
+
+def start_origin_process(port, *options):
+    """在子进程中启动测试源站，等待其可以访问；options为额外的命令行参数（如 --rate 10M）"""
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(BENCH_DIR, 'origin_server.py'), '--port', str(port), *options],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}/1.bin"
+    for _ in range(100):
+        try:
+            urllib.request.urlopen(url, timeout=1).read()
+            return process
+        except OSError:
+            time.sleep(0.05)
+    process.kill()
+    raise RuntimeError("origin server did not start")
+
+def legacy_receive(manager, url, path):
+    """旧版接收循环：每16KB分配一次bytes并调用一次进度回调"""
+    response = manager.pool.open(manager._build_download_request(url), timeout=60)
+    total_size = int(response.headers.get('content-length', 0))
+    downloaded_size = 0
+    with response, open(path, 'wb') as f:
+        while True:
+            chunk = response.read(16384)
+            if not chunk:
+                break
+            f.write(chunk)
+            downloaded_size += len(chunk)
+            progress = (downloaded_size / total_size) * 100
+            noop_progress(progress, downloaded_size, total_size)
+    return downloaded_size
+
+def pooled_receive(manager, url, path):
+    """新版接收循环：readinto缓冲池 + 自适应读取大小 + 限频进度回调 + 写盘线程"""
+    response = manager.pool.open(manager._build_download_request(url), timeout=60)
+    total_size = int(response.headers.get('content-length', 0))
+    reporter = ProgressReporter(noop_progress, total_size)
+    open(path, 'wb').close()
+    writer = DiskWriter(path, manager.buffer_pool)
+    try:
+        writer.preallocate(total_size)
+        with response:
+            received = manager._receive_stream(response, writer, 0, on_received=reporter.add)
+    finally:
+        writer.close()
+    reporter.flush()
+    return received
+
+def noop_progress(progress, downloaded, total):
+    pass
+
+def measure(receive, manager, url, path):
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    received = receive(manager, url, path)
+    cpu = time.process_time() - cpu_start
+    wall = time.perf_counter() - wall_start
+    gigabytes = received / 1024 ** 3
+    return {
+        'bytes': received,
+        'wall_seconds': round(wall, 3),
+        'cpu_seconds': round(cpu, 3),
+        'mb_per_second': round(received / 1024 ** 2 / wall, 1),
+        'cpu_seconds_per_gb': round(cpu / gigabytes, 3),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='接收路径基准测试')
+    parser.add_argument('--size', default='512M', help='测试文件大小，如 512M / 1G')
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--port', type=int, default=8799)
+    args = parser.parse_args()
+
+    url = f"http://127.0.0.1:{args.port}/{parse_size(args.size)}.bin"
+    origin = start_origin_process(args.port)
+    manager = DownloadManager()
+    results = {'legacy_read_16k': [], 'readinto_pool': []}
+    try:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, 'bench.bin')
+            for _ in range(args.rounds):
+                results['legacy_read_16k'].append(measure(legacy_receive, manager, url, path))
+                results['readinto_pool'].append(measure(pooled_receive, manager, url, path))
+    finally:
+        origin.terminate()
+        origin.wait()
+
+    summary = {}
+    for name, runs in results.items():
+        best = min(runs, key=lambda r: r['cpu_seconds_per_gb'])
+        summary[name] = best
+    summary['cpu_reduction_percent'] = round(
+        100 * (1 - summary['readinto_pool']['cpu_seconds_per_gb'] /
+               summary['legacy_read_16k']['cpu_seconds_per_gb']), 1)
+    print(json.dumps({'size': args.size, 'rounds': args.rounds, 'best': summary, 'runs': results}, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,25 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+以无界面模式运行下载器，公网IP改由本地测试源站的 /ip 返回 - 供suite.py在子进程中调用
+
+验证接口同样指向测试源站（config.ini的verify_url），整个运行过程不访问外网。
+用法: python bench/run_headless.py http://127.0.0.1:8799 --headless --config bench.ini
+"""
+
+import json
+import os
+import sys
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import downloader  # noqa: E402
+
+def main():
+    origin = sys.argv[1]
+    downloader.IP_SERVICES[:] = [(f"{origin}/ip", lambda data: json.loads(data)['ip'])]
+    downloader.main(sys.argv[2:])
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+下载吞吐量基准测试套件 - 以无界面模式运行完整下载流程，遍历 文件大小 × 连接数 × 读取大小 的组合
+
+源站（含IP和验证接口替身）在独立子进程中运行，可模拟每个连接的带宽和响应延迟。
+每个组合启动一个新的下载器进程（run_headless.py），这样CPU时间和内存峰值互不影响：
+- mb_per_second: 从验证通过到下载完成（含SHA-256校验）的吞吐量
+- cpu_seconds_per_gb: 下载器进程的用户态+内核态CPU时间（含启动和验证），按GB折算
+- peak_rss_mb: 下载器进程的内存峰值
+CPU时间和内存峰值通过os.wait4获取，只在Unix上可用，其他平台记为null。
+--compression 时下载可压缩的文本内容，源站开启gzip、下载器开启[network] compression，结果中另有wire_mb（网络传输量）。
+用法: python bench/suite.py --sizes 64M 512M --connections 1 4 16 --read-sizes auto 64K 1M --rate 20M --latency 30
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from origin_server import PATTERN, TEXT_PATTERN, content_sha256, parse_size  # noqa: E402
+from receive_path import start_origin_process  # noqa: E402
+
+def write_config(path, base_url, size, connections, read_size, sha256, compression=False):
+    """生成一次运行使用的config.ini"""
+    read_size = '' if read_size == 'auto' else read_size
+    extension = 'txt' if compression else 'bin'
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(f"""[server]
+verify_url = {base_url}/verify
+api_key = bench
+
+[download]
+file_url = {base_url}/{size}.{extension}
+software_name = bench-{size}.{extension}
+token = bench
+connections = {connections}
+sha256 = {sha256}
+# 每次运行都要真正下载，不使用本地下载缓存
+cache_size = 0
+
+[network]
+max_connections_per_host = {connections}
+read_size = {read_size}
+compression = {str(compression).lower()}
+""")
+
+def run_once(base_url, config_path, output_dir, engine):
+    """启动一个无界面下载器进程，返回 (事件列表, CPU秒数, 内存峰值MB, stderr尾部)"""
+    with tempfile.TemporaryFile() as stderr:
+        process = subprocess.Popen(
+            [sys.executable, os.path.join(BENCH_DIR, 'run_headless.py'), base_url, '--headless',
+             '--config', config_path, '--output-dir', output_dir, '--engine', engine,
+             '--progress-interval', '3600'],
+            stdout=subprocess.PIPE, stderr=stderr)
+        output = process.stdout.read()
+        process.stdout.close()
+        cpu = peak_rss = None
+        if hasattr(os, 'wait4'):
+            # 自己回收子进程才能拿到它单独的资源用量
+            _, status, usage = os.wait4(process.pid, 0)
+            process.returncode = os.waitstatus_to_exitcode(status)
+            cpu = usage.ru_utime + usage.ru_stime
+            # Linux上ru_maxrss单位是KB，macOS上是字节
+            peak_rss = usage.ru_maxrss / (1024 ** 2 if sys.platform == 'darwin' else 1024)
+        else:
+            process.wait()
+        stderr.seek(0)
+        errors = stderr.read().decode('utf-8', errors='replace')[-2000:]
+    events = [json.loads(line) for line in output.decode('utf-8').splitlines() if line.strip()]
+    return events, cpu, peak_rss, errors
+
+def measure(base_url, work_dir, size, connections, read_size, engine, sha256, compression=False):
+    config_path = os.path.join(work_dir, 'bench.ini')
+    write_config(config_path, base_url, size, connections, read_size, sha256, compression)
+    events, cpu, peak_rss, errors = run_once(base_url, config_path, work_dir, engine)
+    by_name = {event['event']: event for event in events}
+    if 'done' not in by_name:
+        error = by_name.get('error', {})
+        raise RuntimeError(f"download failed ({error.get('stage')}): {error.get('message')}\n{errors}")
+    done = by_name['done']
+    os.remove(done['path'])
+
+    wall = done['time'] - by_name['verify']['time']
+    return {
+        'wall_seconds': round(wall, 3),
+        'mb_per_second': round(size / 1024 ** 2 / wall, 1),
+        'cpu_seconds_per_gb': None if cpu is None else round(cpu / (size / 1024 ** 3), 3),
+        'peak_rss_mb': None if peak_rss is None else round(peak_rss, 1),
+        'wire_mb': round(done.get('wire', size) / 1024 ** 2, 1),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='下载吞吐量基准测试套件')
+    parser.add_argument('--sizes', nargs='+', default=['64M', '256M'], help='文件大小，如 64M 1G')
+    parser.add_argument('--connections', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--read-sizes', nargs='+', default=['auto', '64K', '1M'],
+                        help='单次读取大小，auto为自适应（对应[network] read_size）')
+    parser.add_argument('--engine', choices=('threaded', 'async'), default='threaded')
+    parser.add_argument('--rate', default='0', help='源站每个连接的速率，如 20M（0表示不限速）')
+    parser.add_argument('--latency', type=float, default=0.0, help='源站每个响应的附加延迟（毫秒）')
+    parser.add_argument('--compression', action='store_true',
+                        help='下载可压缩的文本内容，源站和下载器都开启gzip（压缩传输只用单连接）')
+    parser.add_argument('--rounds', type=int, default=1, help='每个组合的运行次数，取最快的一次')
+    parser.add_argument('--port', type=int, default=8797)
+    parser.add_argument('--output', help='结果JSON另存到该文件')
+    args = parser.parse_args()
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    sizes = [parse_size(size) for size in args.sizes]
+    results = []
+
+    options = ['--rate', args.rate, '--latency', str(args.latency)] + (['--gzip'] if args.compression else [])
+    origin = start_origin_process(args.port, *options)
+    try:
+        with tempfile.TemporaryDirectory() as work_dir:
+            for size in sizes:
+                sha256 = content_sha256(size, TEXT_PATTERN if args.compression else PATTERN)
+                for connections in args.connections:
+                    for read_size in args.read_sizes:
+                        runs = [measure(base_url, work_dir, size, connections, read_size, args.engine, sha256,
+                                        args.compression) for _ in range(args.rounds)]
+                        best = min(runs, key=lambda r: r['wall_seconds'])
+                        results.append({'size': size, 'connections': connections, 'read_size': read_size, **best})
+                        print(f"📊 {size // 1024 ** 2}MB × {connections}连接 × 读取{read_size}: "
+                              f"{best['mb_per_second']} MB/s", file=sys.stderr, flush=True)
+    finally:
+        origin.terminate()
+        origin.wait()
+
+    report = json.dumps({
+        'engine': args.engine, 'compression': args.compression, 'rate': args.rate, 'latency_ms': args.latency, 'rounds': args.rounds,
+        'platform': sys.platform, 'python': sys.version.split()[0], 'time': round(time.time()),
+        'results': results}, indent=2)
+    print(report)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(report + '\n')
+
+if __name__ == '__main__':
+    main()
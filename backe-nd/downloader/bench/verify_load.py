@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+验证接口压测 - 用下载器自己的网络代码（DownloadManager.verify_ip_with_backend）并发请求verify，统计客户端看到的延迟
+
+默认在子进程中启动 api_standin.py，压测前先在进程内跑一遍verifyIP的判断表，
+确认每种结果下替身返回的result和下载器的判定都符合预期。
+--url 指向真实的 download_api.php 时跳过判断表，只做压测（需要 --api-key 和可创建令牌的文件地址）。
+用法: python bench/verify_load.py --requests 5000 --concurrency 32 --latency 20 --jitter 10
+"""
+
+import argparse
+import configparser
+import contextlib
+import json
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+import urllib.request
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from downloader import DownloadManager  # noqa: E402
+from api_standin import DEFAULT_SITE, start_standin  # noqa: E402
+
+CLIENT_IP = '203.0.113.7'
+OTHER_IP = '198.51.100.9'
+
+def make_manager(verify_url, api_key, token, current_ip, connections=8):
+    manager = DownloadManager()
+    manager.config = configparser.ConfigParser()
+    manager.config.read_dict({
+        'server': {'verify_url': verify_url, 'api_key': api_key},
+        'download': {'token': token}})
+    manager.pool.max_per_host = connections
+    manager.get_current_ip = lambda: current_ip
+    return manager
+
+def create_token(api_url, api_key, user_ip=CLIENT_IP, file_url='http://127.0.0.1/bench.bin'):
+    """调用create接口生成令牌"""
+    body = urllib.parse.urlencode({'action': 'create', 'api_key': api_key, 'file_url': file_url,
+                                   'software_name': 'bench.bin', 'user_ip': user_ip}).encode('utf-8')
+    with urllib.request.urlopen(urllib.request.Request(api_url, data=body), timeout=10) as response:
+        result = json.loads(response.read())
+    if not result.get('success'):
+        raise RuntimeError(f"create failed: {result.get('message')}")
+    return result['token']
+
+def raw_verify(manager):
+    """发送一次verify，返回 (替身返回的result, 下载器的判定)"""
+    verify_url, body, headers = manager.build_verify_request(manager.get_current_ip())
+    request = urllib.request.Request(verify_url, data=body, headers=headers, method='POST')
+    with manager.pool.open(request, timeout=10) as response:
+        status, text = response.getcode(), response.read().decode('utf-8')
+    verified, _ = manager.interpret_verify_response(status, text, manager.get_current_ip())
+    return json.loads(text).get('result'), verified
+
+def check_decision_table():
+    """逐一构造verifyIP的各个分支，返回不符合预期的条目列表"""
+    server = start_standin()
+    api_key = DEFAULT_SITE['api_key']
+    failures = []
+
+    def expect(name, token, current_ip, result, verified):
+        manager = make_manager(server.base_url, api_key, token, current_ip)
+        actual = raw_verify(manager)
+        if actual != (result, verified):
+            failures.append({'case': name, 'expected': [result, verified], 'actual': list(actual)})
+
+    try:
+        with contextlib.redirect_stdout(open(os.devnull, 'w')):
+            token = create_token(server.base_url, api_key)
+            expect('match', token, CLIENT_IP, 'IP_MATCH', True)
+            expect('mismatch_allowed', token, OTHER_IP, 'IP_MISMATCH_ALLOWED', True)
+            server.update_config('ip_verification', allow_ip_mismatch=False)
+            expect('mismatch_strict', token, OTHER_IP, 'IP_MISMATCH_STRICT', False)
+            server.update_config('ip_verification', enabled=False)
+            expect('verification_disabled', token, OTHER_IP, 'IP_VERIFICATION_DISABLED', True)
+            # 前面3次通过已计入下载次数
+            server.update_config('ip_verification', enabled=True, max_downloads_per_token=3)
+            expect('max_downloads', token, CLIENT_IP, 'MAX_DOWNLOADS_EXCEEDED', False)
+            server.update_config('ip_verification', token_expiry_hours=-1)
+            expect('expired', create_token(server.base_url, api_key), CLIENT_IP, 'TOKEN_EXPIRED', False)
+            expect('not_found', 'bench_0_missing', CLIENT_IP, 'TOKEN_NOT_FOUND', False)
+    finally:
+        server.shutdown()
+        server.server_close()
+    return failures
+
+def start_standin_process(port, latency, jitter):
+    """在子进程中启动替身接口（压测时与客户端分开占用CPU），等待其可以访问"""
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(BENCH_DIR, 'api_standin.py'), '--port', str(port),
+         '--latency', str(latency), '--jitter', str(jitter), '--max-downloads', str(2 ** 62)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}/api/download_api.php?action=stats&scope=settings&api_key={DEFAULT_SITE['api_key']}"
+    for _ in range(100):
+        try:
+            urllib.request.urlopen(url, timeout=1).read()
+            return process
+        except OSError:
+            time.sleep(0.05)
+    process.kill()
+    raise RuntimeError("api stand-in did not start")
+
+def run_load(manager, requests, concurrency):
+    """concurrency个线程共用一个DownloadManager，共发送requests次verify"""
+    latencies = []
+    failures = []
+    remaining = [requests]
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+            started = time.perf_counter()
+            verified, message = manager.verify_ip_with_backend()
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                if not verified:
+                    failures.append(message)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(open(os.devnull, 'w')):
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    return latencies, failures, time.perf_counter() - started
+
+def summarize(latencies, failures, wall):
+    cuts = statistics.quantiles(latencies, n=100, method='inclusive')
+    return {
+        'requests': len(latencies),
+        'failed': len(failures),
+        'first_failure': failures[0] if failures else None,
+        'requests_per_second': round(len(latencies) / wall, 1),
+        'latency_ms': {
+            'p50': round(cuts[49] * 1000, 2),
+            'p95': round(cuts[94] * 1000, 2),
+            'p99': round(cuts[98] * 1000, 2),
+            'mean': round(statistics.fmean(latencies) * 1000, 2),
+            'max': round(max(latencies) * 1000, 2),
+        },
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='验证接口压测')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--latency', type=float, default=0.0, help='替身接口的固定延迟（毫秒）')
+    parser.add_argument('--jitter', type=float, default=0.0, help='替身接口的随机延迟上限（毫秒）')
+    parser.add_argument('--mismatch', action='store_true', help='用与创建时不同的IP验证（走IP_MISMATCH_ALLOWED分支）')
+    parser.add_argument('--port', type=int, default=8790)
+    parser.add_argument('--url', help='压测已有的接口地址（不启动替身、不检查判断表）')
+    parser.add_argument('--api-key', default=DEFAULT_SITE['api_key'])
+    parser.add_argument('--file-url', default='http://127.0.0.1/bench.bin', help='create时使用的文件地址')
+    args = parser.parse_args()
+
+    report = {'requests': args.requests, 'concurrency': args.concurrency}
+    process = None
+    if args.url:
+        api_url = args.url
+    else:
+        failures = check_decision_table()
+        report['decision_table'] = 'ok' if not failures else failures
+        report.update(latency_ms=args.latency, jitter_ms=args.jitter)
+        process = start_standin_process(args.port, args.latency, args.jitter)
+        api_url = f"http://127.0.0.1:{args.port}/api/download_api.php"
+
+    try:
+        token = create_token(api_url, args.api_key, file_url=args.file_url)
+        current_ip = OTHER_IP if args.mismatch else CLIENT_IP
+        manager = make_manager(api_url, args.api_key, token, current_ip, args.concurrency)
+        report['result'] = summarize(*run_load(manager, args.requests, args.concurrency))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+if __name__ == '__main__':
+    main()
@@ -8,6 +8,7 @@
 
 import os
 import sys
+import time
 import subprocess
 import shutil
 from pathlib import Path
@@ -29,13 +30,19 @@ def clean_build():
 def build_optimized_downloader():
     """构建优化版下载器"""
     print("🔨 构建优化版下载器...")
-    
+
+    # 每次构建使用不同的解压目录，同一版本号重新构建后不会复用旧构建解压出的文件
+    build_id = time.strftime("%Y%m%d%H%M%S")
+
     cmd = [
         sys.executable, "-m", "nuitka",
         
         # 基本选项
         "--onefile",
         "--standalone", 
+        # 解压到固定的缓存目录，之后的启动直接复用，不必每次解压到新的临时目录
+        # 路径中不再有temp，downloader.py通过__compiled__识别编译环境，按exe所在目录查找config.ini
+        f"--onefile-tempdir-spec={{CACHE_DIR}}/SecureDownloader/2.1.0-{build_id}",
         "--assume-yes-for-downloads",
         
         # 输出配置
@@ -63,6 +70,11 @@ def build_optimized_downloader():
         "--include-module=urllib.request",
         "--include-module=urllib.parse",
         "--include-module=urllib.error",
+        "--include-module=http.client",
+        "--include-module=asyncio",
+        "--include-module=async_engine",
+        "--include-module=startup_profile",
+        "--include-module=concurrent.futures",
         "--include-module=json",
         "--include-module=socket",
         "--include-module=ssl",
@@ -70,7 +82,6 @@ def build_optimized_downloader():
         "--include-module=configparser",
         "--include-module=webbrowser",
         "--include-module=platform",
-        "--include-module=subprocess",
         "--include-module=hashlib",
         "--include-module=ctypes",
         "--include-module=ctypes.wintypes",
@@ -7,28 +7,1961 @@
 
 import os
 import sys
-import json
 import time
+
+# 程序启动时间 - 用于统计首帧和就绪耗时
+APP_START_TIME = time.perf_counter()
+
+# --startup-profile: 必须在导入其余模块之前开始记录导入耗时
+if '--startup-profile' in sys.argv[1:]:
+    from startup_profile import StartupProfiler
+    STARTUP_PROFILER = StartupProfiler.install(APP_START_TIME)
+else:
+    STARTUP_PROFILER = None
+
+import json
+import re
+import math
+import random
 import hashlib
 # 使用urllib替代requests以避免certifi问题
 import urllib.request
 import urllib.parse
 import urllib.error
+import http.client
+import io
+import email.utils
 import configparser
+import argparse
 from urllib.parse import urlparse
-from pathlib import Path
-import tkinter as tk
-from tkinter import ttk, messagebox
 import threading
-import webbrowser
-import ctypes
-from ctypes import wintypes
+import queue
 import socket
-import subprocess
-import platform
+import ipaddress
+import zlib
+from collections import deque
+from datetime import datetime
+# 只在少数路径用到的模块（concurrent.futures、webbrowser、platform、ctypes）在使用处导入，不拖慢启动
+
+# 分段下载参数
+DEFAULT_CONNECTIONS = 4                  # 默认并发连接数
+MIN_SEGMENT_SIZE = 4 * 1024 * 1024       # 每个分段的最小字节数，小文件不拆分
+
+# 接收参数
+MIN_READ_SIZE = 64 * 1024                # 自适应读取大小下限
+MAX_READ_SIZE = 4 * 1024 * 1024          # 自适应读取大小上限（也是缓冲区大小）
+PROGRESS_INTERVAL = 0.1                  # 进度回调的最短间隔（秒）
+
+# 写盘参数
+WRITE_QUEUE_SIZE = 8                     # 等待写盘的缓冲区数量上限，满时网络线程等待磁盘
+WRITE_FLUSH_INTERVAL = 0.25              # 缓冲区未填满时最长多久交给写盘线程（秒）
+FSYNC_POLICIES = ('none', 'interval', 'close')
+FSYNC_INTERVAL = 1.0                     # interval策略下的fsync间隔（秒）
+
+# 限速参数
+BANDWIDTH_BURST_SECONDS = 0.5            # 令牌桶容量（按当前速率折算的秒数）
+BANDWIDTH_SLICE_SECONDS = 0.1            # 限速时单次读取的目标时长，也是等待时检查取消的间隔
+BANDWIDTH_SCHEDULE_CHECK = 30            # 重新匹配时段速率的间隔（秒）
+
+# 重试参数 - 可在[retry]配置
+DEFAULT_RETRY_ATTEMPTS = 4               # 单个请求（或分段在没有进展时）最多重试次数
+DEFAULT_RETRY_BASE_DELAY = 0.5           # 指数退避的基础等待（秒）
+DEFAULT_RETRY_MAX_DELAY = 30             # 单次退避等待上限（秒）
+DEFAULT_RETRY_BUDGET = 20                # 一次运行中所有请求共用的重试总次数
+RETRY_AFTER_LIMIT = 120                  # 服务器要求的Retry-After超过此值（秒）时不再重试
+
+# 停滞检测参数 - 可在[download] stall_speed / stall_seconds配置
+DEFAULT_STALL_SPEED = 8 * 1024           # 单个连接的速度下限（字节/秒），0 表示不检测
+DEFAULT_STALL_SECONDS = 30               # 速度持续低于下限多久算停滞（秒）
+STALL_CHECK_INTERVAL = 1.0               # 检测线程的采样间隔（秒）
+STALL_UNWATCH_AFTER = 3                  # 同一分段连续停滞（但仍有进展）这么多次后不再检测，按当前速度下载完
+
+# 自适应超时参数 - 按实测的连接建立/首字节延迟推算各类请求的超时
+PROFILE_TIMEOUTS = {                     # 请求类别 -> (还没有延迟样本时的超时, 下限, 上限)（秒）
+    'ip': (10, 2, 15),                   # 公网IP查询
+    'settings': (15, 3, 30),             # 后台日志设置
+    'verify': (30, 5, 60),               # IP验证
+    'probe': (30, 3, 60),                # 文件探测、文件大小、镜像探测
+    'download': (60, 10, 120),           # 下载数据流的读取超时
+}
+PROFILE_TIMEOUT_FACTOR = 4               # 超时 = P95延迟 × 倍数，再限制在上下限之间
+PROFILE_MIN_SAMPLES = 3                  # 样本少于此数时不推算
+PROFILE_MAX_SAMPLES = 50                 # 每个主机保留的最近样本数
+
+# 镜像参数
+MIRROR_SAMPLE_SIZE = 256 * 1024          # 探测时读取的样本大小，用于估算各镜像的吞吐量
+MIRROR_STALL_TIMEOUT = 15                # 有备用镜像时，读取停滞超过此时间即切换（秒）
+
+# 压缩传输 - [network] compression = true 时设置接口和下载请求协商gzip/deflate，接收时流式解压
+ACCEPT_COMPRESSED = 'gzip, deflate'
+DECODE_READ_SIZE = 256 * 1024            # 解压时每次从网络读取的字节数
+
+# 公网IP查询服务 - (地址, 响应解析函数)，并发查询取最先返回的结果
+IP_SERVICES = [
+    ('https://api.ipify.org?format=json', lambda data: json.loads(data)['ip']),
+    ('https://httpbin.org/ip', lambda data: json.loads(data)['origin']),
+    ('https://api.ip.sb/ip', lambda data: data),
+]
+DEFAULT_IP_CACHE_TTL = 300               # 公网IP缓存时间（秒），可在[network] ip_cache_ttl配置
+
+# 后台设置缓存时间（秒），可在[server] settings_cache_ttl配置；过期后仍先使用缓存，再在后台重新验证
+DEFAULT_SETTINGS_CACHE_TTL = 3600
+
+# 下载缓存 - 已完成的下载按内容保存在用户缓存目录，重复下载时确认服务器文件未变化后直接交付
+DEFAULT_DOWNLOAD_CACHE_SIZE = 2 * 1024 ** 3   # 缓存大小上限（[download] cache_size，0表示关闭）
+FICLONE = 0x40049409                          # Linux reflink克隆的ioctl（btrfs/XFS等支持写时复制的文件系统）
+
+# 连接池参数
+DEFAULT_MAX_CONNECTIONS_PER_HOST = 8     # 每个主机最多同时保持的连接数
+DEFAULT_IDLE_TIMEOUT = 30                # 空闲连接保留时间（秒）
+
+# 界面刷新间隔（毫秒）- 工作线程的界面更新按此频率合并后在Tk主线程执行
+UI_FRAME_INTERVAL = 33
+
+# 日志窗口参数 - 日志先进入环形缓冲，再按间隔批量写入窗口；可在[debug]段配置行数上限和日志文件
+LOG_MAX_LINES = 5000                     # 日志窗口和缓冲最多保留的行数（[debug] log_max_lines）
+LOG_FLUSH_INTERVAL = 200                 # 批量写入日志窗口的间隔（毫秒）
+LOG_VALUE_LIMIT = 300                    # 单个值（如接口响应）写入日志时的最大字符数
+DEFAULT_LOG_FILE_SIZE = 1024 * 1024      # 日志文件轮转大小（[debug] log_file_size）
+DEFAULT_LOG_FILE_BACKUPS = 3             # 保留的旧日志文件数（[debug] log_file_backups）
+
+# 无界面模式（--headless）退出码
+EXIT_OK = 0
+EXIT_ERROR = 1          # 未预期的错误
+EXIT_USAGE = 2          # 命令行参数错误（argparse）
+EXIT_CONFIG = 3         # 配置文件缺失或无效
+EXIT_VERIFY = 4         # IP验证未通过
+EXIT_DOWNLOAD = 5       # 下载失败
+EXIT_CHECKSUM = 6       # SHA-256校验失败
+EXIT_CANCELLED = 130    # 被中断（Ctrl+C）
+
+def load_gui_modules():
+    """导入界面依赖 - 只在图形界面模式调用，无界面模式不加载tkinter（ctypes在设置标题栏时才导入）"""
+    global tk, ttk, messagebox
+    import tkinter as tk
+    from tkinter import ttk, messagebox
+
+def startup_mark(phase):
+    """--startup-profile 时记录初始化阶段的完成时间"""
+    if STARTUP_PROFILER is not None:
+        STARTUP_PROFILER.mark(phase)
+
+class DownloadCancelled(Exception):
+    """用户取消下载"""
+    pass
+
+class RemoteFileChanged(Exception):
+    """服务器上的文件已变化（ETag/Last-Modified/大小不一致），断点数据不可再用"""
+    pass
+
+class ChecksumMismatch(Exception):
+    """下载内容的SHA-256与服务器发布的不一致"""
+    pass
+
+class StreamInterrupted(IOError):
+    """响应数据没有传完连接就结束了 - 可以从已接收的位置重连"""
+    pass
+
+class StreamStalled(StreamInterrupted):
+    """连接速度持续低于下限，被停滞检测主动断开"""
+    pass
+
+def merge_ranges(ranges, start, end):
+    """把 [start, end) 并入按起点排序的范围列表，重叠或相接的范围合并，返回新列表"""
+    merged = []
+    for s, e in sorted(ranges + [[start, end]]):
+        if merged and s <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], e)
+        else:
+            merged.append([s, e])
+    return merged
+
+class DownloadJournal:
+    """断点续传日志 - 与.tmp文件放在一起，记录已完成的字节范围
+
+    文件格式(JSON):
+        {"url": ..., "etag": ..., "last_modified": ..., "total_size": ...,
+         "completed": [[start, end), ...]}
+    """
+
+    SAVE_INTERVAL = 1.0  # 最短保存间隔（秒）
+
+    def __init__(self, path, url, etag, last_modified, total_size, completed=None):
+        self.path = path
+        self.url = url
+        self.etag = etag
+        self.last_modified = last_modified
+        self.total_size = total_size
+        self.completed = [list(r) for r in (completed or [])]
+        self._lock = threading.Lock()
+        self._last_save = 0.0
+
+    @classmethod
+    def load(cls, path):
+        """读取日志文件，不存在或损坏时返回None"""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return cls(path, data['url'], data.get('etag'), data.get('last_modified'),
+                       int(data['total_size']), data.get('completed', []))
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def matches(self, url, etag, last_modified, total_size):
+        """判断日志是否对应同一个远程文件"""
+        if self.url != url or self.total_size != total_size:
+            return False
+        if self.etag or etag:
+            return self.etag == etag
+        # 没有任何校验值时无法确认文件未变，不跨进程续传
+        return bool(last_modified) and self.last_modified == last_modified
+
+    def validator(self):
+        """If-Range使用的校验值，优先ETag（弱ETag不能用于If-Range）"""
+        return self.make_validator({'etag': self.etag, 'last_modified': self.last_modified})
+
+    @staticmethod
+    def make_validator(info):
+        """由探测结果得到If-Range校验值"""
+        etag = info.get('etag')
+        if etag and not etag.startswith('W/'):
+            return etag
+        return info.get('last_modified')
+
+    def mark(self, start, end):
+        """记录 [start, end) 已写入磁盘，并按间隔保存"""
+        with self._lock:
+            self.completed = merge_ranges(self.completed, start, end)
+            if time.time() - self._last_save >= self.SAVE_INTERVAL:
+                self._save_locked()
+
+    def completed_bytes(self):
+        with self._lock:
+            return sum(e - s for s, e in self.completed)
+
+    def missing_ranges(self):
+        """返回尚未下载的范围 [(start, end), ...] 闭区间"""
+        with self._lock:
+            missing = []
+            position = 0
+            for s, e in self.completed:
+                if s > position:
+                    missing.append((position, s - 1))
+                position = max(position, e)
+            if position < self.total_size:
+                missing.append((position, self.total_size - 1))
+            return missing
+
+    def save(self):
+        with self._lock:
+            self._save_locked()
+
+    def _save_locked(self):
+        data = {
+            'url': self.url,
+            'etag': self.etag,
+            'last_modified': self.last_modified,
+            'total_size': self.total_size,
+            'completed': self.completed,
+        }
+        # 先写临时文件再替换，避免中途退出留下半个日志
+        temp_journal = self.path + '.new'
+        try:
+            with open(temp_journal, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            os.replace(temp_journal, self.path)
+            self._last_save = time.time()
+        except OSError as e:
+            print(f"⚠️ 断点日志保存失败: {e}")
+
+    def discard(self):
+        """删除日志文件"""
+        for path in (self.path, self.path + '.new'):
+            if os.path.exists(path):
+                os.remove(path)
+
+class BufferPool:
+    """可复用的接收缓冲区池 - 避免每次读取都分配新的bytes对象"""
+
+    def __init__(self, buffer_size=MAX_READ_SIZE):
+        self.buffer_size = buffer_size
+        self._free = []
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            if self._free:
+                return self._free.pop()
+        return bytearray(self.buffer_size)
+
+    def release(self, buffer):
+        with self._lock:
+            self._free.append(buffer)
+
+class AdaptiveReadSize:
+    """根据实测吞吐量调整每次readinto的大小 - 使单次读取耗时接近TARGET_SECONDS"""
+
+    TARGET_SECONDS = 0.05
+
+    def __init__(self, minimum=MIN_READ_SIZE, maximum=MAX_READ_SIZE):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.size = minimum
+
+    def update(self, received, requested, elapsed):
+        if received < requested:
+            # 短读（数据末尾或服务器发送缓慢）不代表吞吐量
+            return
+        if elapsed < self.TARGET_SECONDS / 2:
+            self.size = min(self.size * 2, self.maximum)
+        elif elapsed > self.TARGET_SECONDS * 2:
+            self.size = max(self.size // 2, self.minimum)
+
+class ProgressReporter:
+    """线程安全的进度合并器 - 汇总各连接的字节数并限制progress_callback的调用频率
+
+    downloaded是写入文件的（解码后的）字节数，包括续传前已有的部分；wire是本次实际从网络接收的字节数。
+    """
+
+    def __init__(self, callback, total_size, downloaded=0, interval=PROGRESS_INTERVAL):
+        self.callback = callback
+        self.total_size = total_size
+        self.downloaded = downloaded
+        self.wire = 0
+        self.interval = interval
+        self._last_report = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, length, wire=None):
+        """length为解码后的字节数，wire为对应的网络字节数（未压缩时省略）"""
+        with self._lock:
+            self.downloaded += length
+            self.wire += length if wire is None else wire
+            now = time.perf_counter()
+            if now - self._last_report >= self.interval or self.downloaded >= self.total_size:
+                self._report_locked(now)
+
+    def flush(self):
+        with self._lock:
+            self._report_locked(time.perf_counter())
+
+    def _report_locked(self, now):
+        self._last_report = now
+        if self.callback and self.total_size > 0:
+            self.callback((self.downloaded / self.total_size) * 100, self.downloaded, self.total_size)
+
+class DecodingStream:
+    """流式解压 - 把Content-Encoding为gzip/deflate的响应包装成readinto返回解码后数据的流
+
+    每次从网络读取最多DECODE_READ_SIZE字节，解压输出不超过调用方的缓冲区，多出的输入留到下次。
+    wire为已从网络读取的字节数。配置了限速时按网络字节数取令牌（_receive_stream不再对解码后的字节限速）。
+    """
+
+    ENCODINGS = {'gzip': 16 + zlib.MAX_WBITS, 'x-gzip': 16 + zlib.MAX_WBITS, 'deflate': zlib.MAX_WBITS}
+
+    def __init__(self, response, encoding, limiter=None, should_stop=None):
+        self.response = response
+        self.encoding = encoding
+        self.limiter = limiter
+        self.should_stop = should_stop
+        self.wire = 0
+        self._wbits = self.ENCODINGS[encoding]
+        self._decoder = zlib.decompressobj(self._wbits)
+        self._input = bytearray(DECODE_READ_SIZE)
+        self._tail = b''          # 受输出大小限制还没有解压的输入
+        self._finished = False
+        self._decoded = 0
+
+    @classmethod
+    def encoding_of(cls, headers):
+        """响应的Content-Encoding，不是可解压的编码时返回None（identity或没有该头也返回None）"""
+        encoding = (headers.get('Content-Encoding') or '').strip().lower()
+        return encoding if encoding in cls.ENCODINGS else None
+
+    @classmethod
+    def decode(cls, data, encoding):
+        """一次性解压完整的响应体（设置接口等小响应）"""
+        encoding = (encoding or '').strip().lower()
+        if encoding not in cls.ENCODINGS:
+            return data
+        try:
+            return zlib.decompress(data, cls.ENCODINGS[encoding])
+        except zlib.error:
+            if encoding != 'deflate':
+                raise
+            # 不少服务器的deflate实际是不带zlib头的原始deflate数据
+            return zlib.decompress(data, -zlib.MAX_WBITS)
+
+    def _decompress(self, data, limit):
+        try:
+            return self._decoder.decompress(data, limit)
+        except zlib.error:
+            if self._wbits != zlib.MAX_WBITS or self._decoded:
+                raise
+            # 原始deflate数据：在开头的zlib头检查处就会出错，换用不带zlib头的解码器重来
+            self._wbits = -zlib.MAX_WBITS
+            self._decoder = zlib.decompressobj(self._wbits)
+            return self._decoder.decompress(data, limit)
+
+    def readinto(self, buffer):
+        limit = len(buffer)
+        # 压缩数据也按已到达的部分读取，停滞检测能及时看到网络字节数
+        read = getattr(self.response, 'readinto1', self.response.readinto)
+        while True:
+            if self._tail:
+                data, self._tail = self._tail, b''
+            elif self._decoder.eof and self._decoder.unused_data:
+                # gzip可以由多个成员依次拼接
+                data = self._decoder.unused_data
+                self._decoder = zlib.decompressobj(self._wbits)
+            elif self._finished:
+                return 0
+            else:
+                size = DECODE_READ_SIZE
+                if self.limiter is not None:
+                    size = min(size, self.limiter.read_size())
+                received = read(memoryview(self._input)[:size])
+                if not received:
+                    self._finished = True
+                    if not self._decoder.eof:
+                        raise StreamInterrupted(f"{self.encoding} stream ended early after {self.wire} bytes")
+                    return 0
+                self.wire += received
+                if self.limiter is not None:
+                    self.limiter.consume(received, self.should_stop)
+                data = memoryview(self._input)[:received]
+
+            output = self._decompress(data, limit)
+            # 一个gzip成员结束后，剩余输入在unused_data中（unconsumed_tail里也会留一份）
+            self._tail = b'' if self._decoder.eof else self._decoder.unconsumed_tail
+            if output:
+                self._decoded += len(output)
+                buffer[:len(output)] = output
+                return len(output)
+
+class StreamingHasher:
+    """边下载边计算SHA-256 - 在独立线程中运行，不占用网络线程
+
+    网络线程把刚写入的缓冲区交给feed()：数据正好接在已哈希的位置后面时直接用内存计算；
+    哈希线程跟不上或分段乱序到达时不等待，之后从.tmp文件（通常仍在系统缓存中）按顺序补读。
+    """
+
+    QUEUE_SIZE = 8
+    READ_SIZE = 1024 * 1024
+
+    def __init__(self, path, buffer_pool, written=None):
+        self.path = path
+        self.buffer_pool = buffer_pool
+        self.position = 0
+        self._digest = hashlib.sha256()
+        self._written = [list(r) for r in (written or [])]  # 已写入磁盘的 [start, end)
+        self._lock = threading.Lock()
+        self._queue = queue.Queue(self.QUEUE_SIZE)
+        self._stop = threading.Event()
+        self._error = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def feed(self, offset, buffer, length):
+        """记录 [offset, offset+length) 已写入；返回True表示buffer已交给哈希线程（由其归还缓冲池）"""
+        with self._lock:
+            self._written = merge_ranges(self._written, offset, offset + length)
+            # 只有接在连续前缀上的数据才值得交给哈希线程，其余之后从文件补读
+            contiguous = self._written[0][0] == 0 and self._written[0][1] >= offset + length
+        if not contiguous:
+            return False
+        try:
+            self._queue.put_nowait((offset, buffer, length))
+            return True
+        except queue.Full:
+            return False
+
+    def _contiguous_end(self):
+        with self._lock:
+            if self._written and self._written[0][0] == 0:
+                return self._written[0][1]
+            return 0
+
+    def _run(self):
+        try:
+            while True:
+                try:
+                    offset, buffer, length = self._queue.get(timeout=0.05)
+                except queue.Empty:
+                    if self._stop.is_set():
+                        break
+                    self._catch_up()
+                    continue
+                try:
+                    skip = self.position - offset
+                    if 0 <= skip < length:
+                        with memoryview(buffer) as view:
+                            self._digest.update(view[skip:length])
+                        self.position = offset + length
+                finally:
+                    self.buffer_pool.release(buffer)
+                if self._queue.empty():
+                    self._catch_up()
+            self._catch_up()
+        except Exception as e:
+            self._error = e
+
+    def _catch_up(self):
+        """从文件补读已写入但还没有计算哈希的连续部分"""
+        end = self._contiguous_end()
+        if self.position >= end:
+            return
+        with open(self.path, 'rb') as f:
+            f.seek(self.position)
+            while self.position < end:
+                block = f.read(min(self.READ_SIZE, end - self.position))
+                if not block:
+                    raise IOError(f"Unexpected end of file while hashing at byte {self.position}")
+                self._digest.update(block)
+                self.position += len(block)
+
+    def finish(self, total_size=None):
+        """等待哈希线程处理完，返回十六进制SHA-256"""
+        self._stop.set()
+        self._thread.join()
+        if self._error:
+            raise self._error
+        if total_size and self.position != total_size:
+            raise IOError(f"Hashed {self.position} of {total_size} bytes")
+        return self._digest.hexdigest()
+
+    def abort(self):
+        """下载失败时停止哈希线程"""
+        with self._lock:
+            self._written = []
+        self._stop.set()
+        self._thread.join()
+
+class DiskWriter:
+    """写盘线程 - 网络线程只负责接收，.tmp文件的写入在独立线程完成
+
+    网络线程把接收到的缓冲区放入有界队列后立即换新缓冲区继续接收，只有磁盘跟不上、
+    队列已满时才会等待。写入完成后才记录断点日志并交给哈希线程，保证日志中的范围都已写入文件。
+
+    fsync策略：none - 交给操作系统；interval - 定期fsync，断点日志只记录已fsync的范围；
+    close - 关闭文件前fsync一次。
+    """
+
+    def __init__(self, path, buffer_pool, journal=None, hasher=None, fsync_policy='none', trace=None):
+        self.path = path
+        self.buffer_pool = buffer_pool
+        self.journal = journal
+        self.hasher = hasher
+        self.fsync_policy = fsync_policy
+        self.trace = trace  # NetworkTrace，每次写入和fsync记为download类别的写盘阶段
+        # idle_time: 写盘线程等待网络；blocked_time: 网络线程等待磁盘（各连接累加）
+        self.stats = {'bytes': 0, 'writes': 0, 'write_time': 0.0, 'idle_time': 0.0,
+                      'blocked_time': 0.0, 'fsyncs': 0, 'fsync_time': 0.0}
+        self._stats_lock = threading.Lock()
+        self._unsynced = []  # interval策略下已写入但还没有fsync的范围
+        self._last_fsync = time.perf_counter()
+        self._queue = queue.Queue(WRITE_QUEUE_SIZE)
+        self._error = None
+        self._file = open(path, 'r+b' if os.path.exists(path) else 'wb', buffering=0)
+        self._started = time.perf_counter()
+        self.elapsed = 0.0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def preallocate(self, total_size):
+        """预分配完整文件大小 - 避免大文件逐块增长产生碎片，已写入的数据保持不变"""
+        if total_size <= 0 or os.fstat(self._file.fileno()).st_size >= total_size:
+            return
+        try:
+            os.posix_fallocate(self._file.fileno(), 0, total_size)
+        except (AttributeError, OSError):
+            # Windows没有fallocate：直接设置文件长度，由文件系统一次分配空间
+            self._file.truncate(total_size)
+
+    def write(self, offset, buffer, length):
+        """把缓冲区交给写盘线程，之后由写盘线程归还缓冲池；队列满时等待磁盘"""
+        started = time.perf_counter()
+        while True:
+            if self._error is not None:
+                self.buffer_pool.release(buffer)
+                raise IOError(f"Disk write failed: {self._error}")
+            try:
+                self._queue.put((offset, buffer, length), timeout=0.1)
+                break
+            except queue.Full:
+                continue
+        with self._stats_lock:
+            self.stats['blocked_time'] += time.perf_counter() - started
+
+    def offer(self, offset, buffer, length):
+        """不等待的write - 队列已满时返回False，缓冲区仍归调用方（供asyncio引擎在事件循环中先试一次）"""
+        if self._error is not None:
+            self.buffer_pool.release(buffer)
+            raise IOError(f"Disk write failed: {self._error}")
+        try:
+            self._queue.put_nowait((offset, buffer, length))
+        except queue.Full:
+            return False
+        return True
+
+    def _run(self):
+        timeout = FSYNC_INTERVAL if self.fsync_policy == 'interval' else None
+        while True:
+            started = time.perf_counter()
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = False
+            with self._stats_lock:
+                self.stats['idle_time'] += time.perf_counter() - started
+            if item is None:
+                break
+            if self._error is not None:
+                # 已经出错：只归还缓冲区，让网络线程尽快看到错误
+                if item:
+                    self.buffer_pool.release(item[1])
+                continue
+            try:
+                if item:
+                    self._write(*item)
+                if self._unsynced and time.perf_counter() - self._last_fsync >= FSYNC_INTERVAL:
+                    self._fsync()
+            except Exception as e:
+                self._error = e
+
+    def _write(self, offset, buffer, length):
+        started = time.perf_counter()
+        try:
+            with memoryview(buffer) as view:
+                self._file.seek(offset)
+                written = 0
+                # 无缓冲写入可能只写入一部分
+                while written < length:
+                    written += self._file.write(view[written:length])
+        except BaseException:
+            self.buffer_pool.release(buffer)
+            raise
+        elapsed = time.perf_counter() - started
+        with self._stats_lock:
+            self.stats['bytes'] += length
+            self.stats['writes'] += 1
+            self.stats['write_time'] += elapsed
+        if self.trace is not None:
+            self.trace.add('download', 'disk', started, elapsed, bytes=length)
+
+        if self.fsync_policy == 'interval':
+            self._unsynced.append((offset, offset + length))
+        elif self.journal is not None:
+            self.journal.mark(offset, offset + length)
+        if self.hasher is None or not self.hasher.feed(offset, buffer, length):
+            self.buffer_pool.release(buffer)
+
+    def _fsync(self):
+        started = time.perf_counter()
+        os.fsync(self._file.fileno())
+        self._last_fsync = time.perf_counter()
+        with self._stats_lock:
+            self.stats['fsyncs'] += 1
+            self.stats['fsync_time'] += self._last_fsync - started
+        if self.trace is not None:
+            self.trace.add('download', 'disk', started, self._last_fsync - started, fsync=True)
+        if self.journal is not None:
+            for start, end in self._unsynced:
+                self.journal.mark(start, end)
+        self._unsynced = []
+
+    def close(self):
+        """写完队列中剩余的数据后关闭文件；写盘出错时抛出异常"""
+        self._queue.put(None)
+        self._thread.join()
+        try:
+            if self._error is None and self.fsync_policy != 'none':
+                self._fsync()
+        except Exception as e:
+            self._error = e
+        finally:
+            self._file.close()
+            self.elapsed = time.perf_counter() - self._started
+        if self._error is not None:
+            raise IOError(f"Disk write failed: {self._error}")
+
+    def describe(self):
+        """写盘统计 - 网络线程等待磁盘的时间较多说明磁盘是瓶颈，否则是网络"""
+        stats = self.stats
+        megabytes = stats['bytes'] / 1024 ** 2
+        disk_rate = megabytes / stats['write_time'] if stats['write_time'] > 0 else 0
+        average = megabytes / stats['writes'] if stats['writes'] else 0
+        bottleneck = '磁盘' if stats['blocked_time'] > 0.1 * max(self.elapsed, 0.001) else '网络'
+        text = (f"写入 {megabytes:.1f} MB / {stats['writes']} 次 (平均 {average:.2f} MB), "
+                f"磁盘 {disk_rate:.0f} MB/s, 写盘等待网络 {stats['idle_time']:.2f}s, "
+                f"网络等待磁盘 {stats['blocked_time']:.2f}s")
+        if stats['fsyncs']:
+            text += f", fsync {stats['fsyncs']} 次 {stats['fsync_time']:.2f}s"
+        return f"{text} → 瓶颈: {bottleneck}"
+
+class BandwidthLimiter:
+    """令牌桶限速 - 同一次下载的所有连接共用一个桶
+
+    [bandwidth] rate 为全局速率，schedule 可按时段覆盖，例如
+    ``schedule = 09:00-18:00=512K, 18:00-09:00=0``（0表示不限速，时段可跨午夜）。
+    没有配置限速时from_config返回None，接收循环不做任何额外工作。
+    """
+
+    UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+
+    def __init__(self, rate=0, schedule=None):
+        self.default_rate = rate
+        self.schedule = schedule or []  # [(开始分钟, 结束分钟, 速率)]
+        self.rate = 0
+        self._tokens = 0.0
+        self._last = time.perf_counter()
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def parse_rate(cls, text):
+        """解析速率 - 字节/秒，支持 512K、2M、1.5MB/s 等写法"""
+        text = text.strip().upper().replace('/S', '').rstrip('B').strip()
+        unit = text[-1:] if text[-1:] in ('K', 'M', 'G') else ''
+        return int(float(text[:len(text) - len(unit)] or 0) * cls.UNITS[unit])
+
+    @classmethod
+    def parse_schedule(cls, text):
+        """解析时段速率 - 逗号分隔的 HH:MM-HH:MM=速率"""
+        schedule = []
+        for entry in filter(None, (part.strip() for part in text.split(','))):
+            span, rate = entry.split('=', 1)
+            start, end = (datetime.strptime(t.strip(), '%H:%M') for t in span.split('-', 1))
+            schedule.append((start.hour * 60 + start.minute, end.hour * 60 + end.minute, cls.parse_rate(rate)))
+        return schedule
+
+    @classmethod
+    def from_config(cls, config):
+        """根据配置创建限速器，没有任何限速时返回None"""
+        if config is None or not config.has_section('bandwidth'):
+            return None
+        try:
+            rate = cls.parse_rate(config.get('bandwidth', 'rate', fallback='0'))
+            schedule = cls.parse_schedule(config.get('bandwidth', 'schedule', fallback=''))
+        except (ValueError, KeyError) as e:
+            print(f"⚠️ 限速配置无效，已忽略: {e}")
+            return None
+        if rate <= 0 and not any(r > 0 for _, _, r in schedule):
+            return None
+        return cls(rate, schedule)
+
+    def current_rate(self, now=None):
+        """当前时段的速率，没有匹配的时段时使用全局速率"""
+        now = now or datetime.now()
+        minute = now.hour * 60 + now.minute
+        for start, end, rate in self.schedule:
+            if start <= minute < end if start <= end else (minute >= start or minute < end):
+                return rate
+        return self.default_rate
+
+    def read_size(self):
+        """限速时单次读取的上限 - 避免一次读取大块数据后长时间停顿"""
+        if self.rate <= 0:
+            return MAX_READ_SIZE
+        return max(MIN_READ_SIZE, min(MAX_READ_SIZE, int(self.rate * BANDWIDTH_SLICE_SECONDS)))
+
+    def reserve(self, amount):
+        """取出amount字节的令牌，返回需要等待的秒数 - 令牌可以透支，透支部分由调用方等待偿还"""
+        with self._lock:
+            now = time.perf_counter()
+            if now >= self._next_check:
+                self._next_check = now + BANDWIDTH_SCHEDULE_CHECK
+                rate = self.current_rate()
+                if rate != self.rate:
+                    print(f"🚦 限速: {f'{rate / 1024 ** 2:.2f} MB/s' if rate > 0 else '不限速'}")
+                    self.rate = rate
+                    self._tokens = 0.0
+            if self.rate <= 0:
+                return 0.0
+            burst = self.rate * BANDWIDTH_BURST_SECONDS
+            self._tokens = min(burst, self._tokens + (now - self._last) * self.rate) - amount
+            self._last = now
+            # 透支越多等待越久，多个连接因此平分速率
+            return -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+    def consume(self, amount, should_stop=None):
+        """取出amount字节的令牌，不足时等待；should_stop返回True时提前结束等待"""
+        deadline = time.perf_counter() + self.reserve(amount)
+        while True:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0 or (should_stop is not None and should_stop()):
+                return
+            time.sleep(min(remaining, BANDWIDTH_SLICE_SECONDS))
+
+class RetryPolicy:
+    """网络请求重试策略 - 验证、探测和分段下载共用
+
+    只重试可恢复的错误（连接断开、超时、传输中断、429/5xx等），等待时间为指数退避加随机抖动，
+    服务器给出Retry-After时以它为准。所有请求共用一个重试预算，网络彻底中断时不会无休止地重试。
+    """
+
+    RETRYABLE_STATUS = (408, 425, 429, 500, 502, 503, 504)
+
+    def __init__(self, max_attempts=DEFAULT_RETRY_ATTEMPTS, base_delay=DEFAULT_RETRY_BASE_DELAY,
+                 max_delay=DEFAULT_RETRY_MAX_DELAY, budget=DEFAULT_RETRY_BUDGET):
+        self.max_attempts = max(0, max_attempts)
+        self.base_delay = max(0.0, base_delay)
+        self.max_delay = max(self.base_delay, max_delay)
+        self.budget = max(0, budget)
+        self.retries = 0
+        self.backoff_time = 0.0
+        self.kinds = {}             # 各类错误的重试次数
+        self.exhausted = False
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        """读取[retry]段 - max_attempts / base_delay / max_delay / budget，配置无效时使用默认值"""
+        try:
+            return cls(config.getint('retry', 'max_attempts', fallback=DEFAULT_RETRY_ATTEMPTS),
+                       config.getfloat('retry', 'base_delay', fallback=DEFAULT_RETRY_BASE_DELAY),
+                       config.getfloat('retry', 'max_delay', fallback=DEFAULT_RETRY_MAX_DELAY),
+                       config.getint('retry', 'budget', fallback=DEFAULT_RETRY_BUDGET))
+        except ValueError as e:
+            print(f"⚠️ 重试配置无效，使用默认值: {e}")
+            return cls()
+
+    @classmethod
+    def classify(cls, error):
+        """可重试的错误返回类别名称，不可重试时返回None"""
+        if isinstance(error, (DownloadCancelled, RemoteFileChanged, ChecksumMismatch)):
+            return None
+        if isinstance(error, urllib.error.HTTPError):
+            return f"HTTP {error.code}" if error.code in cls.RETRYABLE_STATUS else None
+        if isinstance(error, urllib.error.URLError):
+            # urllib把底层的socket错误包在reason里
+            reason = error.reason
+            return cls.classify(reason) if isinstance(reason, BaseException) else None
+        if isinstance(error, StreamStalled):
+            return '连接停滞'
+        if isinstance(error, StreamInterrupted):
+            return '传输中断'
+        if isinstance(error, TimeoutError):
+            return '超时'
+        if isinstance(error, ConnectionRefusedError):
+            return '连接被拒绝'
+        if isinstance(error, ConnectionError):
+            return '连接断开'
+        if isinstance(error, socket.gaierror):
+            return 'DNS解析'
+        if isinstance(error, http.client.HTTPException):
+            return '协议错误'
+        return None
+
+    @staticmethod
+    def retry_after(error):
+        """429/503响应的Retry-After（秒数或HTTP日期），没有时返回None"""
+        headers = getattr(error, 'headers', None)
+        value = headers.get('Retry-After') if headers is not None else None
+        if not value:
+            return None
+        value = value.strip()
+        if value.isdigit():
+            return float(value)
+        try:
+            when = email.utils.parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        return max(0.0, when.timestamp() - time.time())
+
+    def next_delay(self, error, attempt):
+        """第attempt+1次重试前的等待时间（秒），不应重试时返回None - 返回值已计入统计和预算"""
+        kind = self.classify(error)
+        if kind is None or attempt >= self.max_attempts:
+            return None
+        delay = self.retry_after(error)
+        if delay is None:
+            # 完全抖动：在 [0, 指数退避上限] 中随机取值，多个连接不会同时重连
+            delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        elif delay > RETRY_AFTER_LIMIT:
+            return None
+
+        with self._lock:
+            if self.retries >= self.budget:
+                if not self.exhausted:
+                    self.exhausted = True
+                    print(f"⚠️ 重试预算已用完 ({self.budget} 次)，不再重试")
+                return None
+            self.retries += 1
+            self.backoff_time += delay
+            self.kinds[kind] = self.kinds.get(kind, 0) + 1
+        return delay
+
+    @staticmethod
+    def wait(delay, should_stop=None):
+        """退避等待，should_stop返回True时提前结束并返回False"""
+        deadline = time.perf_counter() + delay
+        while True:
+            if should_stop is not None and should_stop():
+                return False
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                return True
+            time.sleep(min(remaining, BANDWIDTH_SLICE_SECONDS))
+
+    def call(self, func, label, should_stop=None):
+        """执行func，遇到可重试的错误时按策略等待后重新执行"""
+        attempt = 0
+        while True:
+            try:
+                return func()
+            except Exception as e:
+                delay = self.next_delay(e, attempt)
+                if delay is None:
+                    raise
+                attempt += 1
+                print(f"🔁 {label}失败 ({e})，{delay:.1f}s 后重试 ({attempt}/{self.max_attempts})")
+                if not self.wait(delay, should_stop):
+                    raise
+
+    def reset(self):
+        """开始新一轮验证和下载 - 清零统计和预算，上一次下载的重试不影响本次"""
+        with self._lock:
+            self.retries = 0
+            self.backoff_time = 0.0
+            self.kinds = {}
+            self.exhausted = False
+
+    def stats(self):
+        """重试统计 - 供无界面模式的JSON事件使用"""
+        with self._lock:
+            return {'count': self.retries, 'backoff_seconds': round(self.backoff_time, 3),
+                    'by_kind': dict(self.kinds), 'budget_exhausted': self.exhausted}
+
+    def describe(self):
+        """重试统计的文字说明，没有重试时返回None"""
+        with self._lock:
+            if not self.retries and not self.exhausted:
+                return None
+            kinds = ', '.join(f"{kind} {count}" for kind, count in self.kinds.items())
+            text = f"{self.retries} 次 ({kinds})，退避等待 {self.backoff_time:.1f}s"
+            if self.exhausted:
+                text += "，预算已用完"
+            return text
+
+class StreamWatch:
+    """停滞检测中的一个连接 - 接收线程调用add，检测线程定期采样"""
+
+    def __init__(self, label, abort, abortable):
+        self.label = label
+        self.abort = abort          # 中断该连接的函数，可从检测线程调用
+        self.abortable = abortable  # False时只记录日志（不能续传的单连接下载）
+        self.received = 0
+        self.samples = deque()      # (采样时间, 累计字节数)
+        self.stalled = False
+
+    def add(self, length):
+        self.received += length
+
+class StallWatchdog:
+    """停滞检测 - 后台线程按滑动窗口统计每个连接的吞吐量
+
+    连接在stall_seconds内的平均速度低于stall_speed时调用它的abort关闭socket，阻塞中的读取随即出错，
+    分段的重连逻辑从已接收的位置按Range继续。只在有连接被监视时运行，每次下载结束后停止。
+    """
+
+    def __init__(self, min_speed, window, limiter=None, log=print):
+        self.min_speed = min_speed
+        self.window = window
+        self.limiter = limiter
+        self.log = log
+        self.stalls = 0
+        self._watches = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @classmethod
+    def from_config(cls, config, limiter=None, log=print):
+        """读取[download] stall_speed / stall_seconds，stall_speed为0时返回None"""
+        try:
+            min_speed = BandwidthLimiter.parse_rate(
+                config.get('download', 'stall_speed', fallback=str(DEFAULT_STALL_SPEED)))
+            window = config.getfloat('download', 'stall_seconds', fallback=DEFAULT_STALL_SECONDS)
+        except ValueError as e:
+            print(f"⚠️ 停滞检测配置无效，使用默认值: {e}")
+            min_speed, window = DEFAULT_STALL_SPEED, DEFAULT_STALL_SECONDS
+        if min_speed <= 0 or window <= 0:
+            return None
+        return cls(min_speed, max(window, STALL_CHECK_INTERVAL * 2), limiter, log)
+
+    def watch(self, label, abort, abortable=True):
+        """开始监视一个连接，返回StreamWatch（接收到数据时调用其add）"""
+        watch = StreamWatch(label, abort, abortable)
+        watch.samples.append((time.perf_counter(), 0))
+        with self._lock:
+            self._watches.add(watch)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+        return watch
+
+    def unwatch(self, watch):
+        with self._lock:
+            self._watches.discard(watch)
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def floor(self, streams):
+        """当前的速度下限 - 限速时每个连接分到的速率可能本来就低于下限，按比例放宽"""
+        floor = self.min_speed
+        if self.limiter is not None and self.limiter.rate > 0:
+            floor = min(floor, self.limiter.rate / max(streams, 1) / 4)
+        return floor
+
+    def _run(self):
+        while not self._stop.wait(STALL_CHECK_INTERVAL):
+            with self._lock:
+                watches = list(self._watches)
+            now = time.perf_counter()
+            floor = self.floor(len(watches))
+            for watch in watches:
+                if not watch.stalled:
+                    self._check(watch, now, floor)
+
+    def _check(self, watch, now, floor):
+        samples = watch.samples
+        samples.append((now, watch.received))
+        # 保留覆盖整个窗口所需的最早样本
+        while len(samples) > 2 and now - samples[1][0] >= self.window:
+            samples.popleft()
+        started, received = samples[0]
+        elapsed = now - started
+        if elapsed < self.window:
+            return
+        speed = (watch.received - received) / elapsed
+        if speed >= floor:
+            return
+
+        watch.stalled = True
+        self.stalls += 1
+        action = "断开后从断点重连" if watch.abortable else "服务器不支持Range，继续等待"
+        self.log(f"🐢 连接停滞: {watch.label} 最近 {elapsed:.0f}s 平均 {speed / 1024:.1f} KB/s，"
+                 f"低于下限 {floor / 1024:.1f} KB/s，{action}")
+        if watch.abortable:
+            try:
+                watch.abort()
+            except Exception as e:
+                print(f"⚠️ 断开停滞连接失败: {e}")
+
+class NetworkProfile:
+    """网络延迟画像 - 记录每次请求的连接建立和首字节时间，按P95推算各类请求的超时
+
+    优先使用目标主机的样本，不足时用所有主机的样本，还没有样本时使用原先的固定超时。
+    好的网络上失败更快暴露，卫星等高延迟链路上也不会误判超时。
+    """
+
+    def __init__(self, log=print):
+        self.log = log
+        self._hosts = {}    # 主机 -> deque[延迟]
+        self._all = deque(maxlen=PROFILE_MAX_SAMPLES)
+        self._chosen = {}   # (类别, 主机) -> 上次记录到日志的超时
+        self._lock = threading.Lock()
+
+    def record(self, host, connect_time, ttfb):
+        """记录一次请求 - connect_time为新建连接的耗时（复用连接时为None），ttfb为发出请求到收到响应头"""
+        latency = max(connect_time or 0.0, ttfb)
+        with self._lock:
+            self._hosts.setdefault(host, deque(maxlen=PROFILE_MAX_SAMPLES)).append(latency)
+            self._all.append(latency)
+
+    @staticmethod
+    def percentile(values, fraction):
+        ordered = sorted(values)
+        return ordered[min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))]
+
+    def timeout(self, kind, url=None):
+        """kind类请求的超时（秒），url用于选择目标主机的样本"""
+        default, lower, upper = PROFILE_TIMEOUTS[kind]
+        host = urlparse(url).netloc if url else None
+        with self._lock:
+            samples = self._hosts.get(host) if host else None
+            if not samples or len(samples) < PROFILE_MIN_SAMPLES:
+                samples = self._all
+            count = len(samples)
+            p95 = self.percentile(samples, 0.95) if count >= PROFILE_MIN_SAMPLES else None
+        if p95 is None:
+            value = default
+        else:
+            value = round(min(upper, max(lower, p95 * PROFILE_TIMEOUT_FACTOR)), 1)
+        self._report(kind, host, value, p95, count)
+        return value
+
+    def _report(self, kind, host, value, p95, count):
+        """超时变化超过20%时记录到日志"""
+        key = (kind, host)
+        with self._lock:
+            previous = self._chosen.get(key)
+            if previous is not None and abs(value - previous) <= previous * 0.2:
+                return
+            self._chosen[key] = value
+        target = f"{kind} {host}" if host else kind
+        if p95 is None:
+            self.log(f"⏱️ 超时 [{target}]: {value:g}s (延迟样本不足，使用默认值)")
+        else:
+            self.log(f"⏱️ 超时 [{target}]: {value:g}s (P95延迟 {p95 * 1000:.0f} ms，{count} 个样本)")
+
+    def describe(self):
+        """各主机的延迟分布"""
+        with self._lock:
+            hosts = {host: list(samples) for host, samples in self._hosts.items()}
+        return ', '.join(f"{host} P50 {self.percentile(samples, 0.5) * 1000:.0f} ms / "
+                         f"P95 {self.percentile(samples, 0.95) * 1000:.0f} ms ({len(samples)})"
+                         for host, samples in hosts.items())
+
+class NetworkTrace:
+    """请求分阶段计时 - 每个请求的DNS、连接、TLS、首字节和传输耗时，以及下载的写盘耗时
+
+    summary() 按请求类别（ip / settings / verify / probe / download）汇总各阶段的平均耗时，
+    用来判断慢在后台、CDN还是本机；export() 输出Chrome trace格式的JSON，可在 chrome://tracing 或 Perfetto 中查看。
+    """
+
+    PHASES = {'dns': 'DNS', 'connect': '连接', 'tls': 'TLS', 'ttfb': '首字节', 'transfer': '传输', 'disk': '写盘'}
+    MAX_EVENTS = 20000  # 只保留前这么多条记录，避免长时间下载占用过多内存
+
+    def __init__(self):
+        self._events = []   # (类别, 名称, 开始时间, 耗时, 线程/通道, 附加信息)
+        self._lanes = {}    # 线程ident或通道名 -> 显示名称
+        self._lock = threading.Lock()
+
+    def add(self, kind, name, started, duration, lane=None, **args):
+        """记录一个时间段 - started为perf_counter时间；name为阶段名或请求描述，lane指定显示通道（默认当前线程）"""
+        if lane is None:
+            thread = threading.current_thread()
+            lane, label = thread.ident, thread.name
+        else:
+            label = lane
+        with self._lock:
+            self._lanes.setdefault(lane, label)
+            if len(self._events) < self.MAX_EVENTS:
+                self._events.append((kind, name, started, duration, lane, args))
+
+    def summary(self):
+        """按请求类别汇总，返回日志行列表 - 各阶段为平均耗时，发生次数少于请求数时注明次数"""
+        with self._lock:
+            events = list(self._events)
+        totals = {}
+        for kind, name, _, duration, _, _ in events:
+            entry = totals.setdefault(kind, {'requests': 0})
+            if name in self.PHASES:
+                total, count = entry.get(name, (0.0, 0))
+                entry[name] = (total + duration, count + 1)
+            else:
+                entry['requests'] += 1
+
+        lines = []
+        for kind, entry in totals.items():
+            requests = entry['requests']
+            parts = [f"{requests} 个请求"] if requests else []
+            for phase, label in self.PHASES.items():
+                if phase not in entry:
+                    continue
+                total, count = entry[phase]
+                part = f"{label} {total / count * 1000:.0f} ms"
+                if count != requests:
+                    part += f" ({count}次)"
+                parts.append(part)
+            lines.append(f"{kind}: " + ' | '.join(parts))
+        return lines
+
+    def export(self, path):
+        """写出Chrome trace JSON（时间从程序启动算起），返回文件路径"""
+        with self._lock:
+            events = list(self._events)
+            lanes = dict(self._lanes)
+        pid = os.getpid()
+        tids = {lane: index + 1 for index, lane in enumerate(lanes)}
+        trace_events = [{'name': 'process_name', 'ph': 'M', 'pid': pid, 'args': {'name': 'SecureDownloader'}}]
+        trace_events += [{'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tids[lane], 'args': {'name': str(label)}}
+                         for lane, label in lanes.items()]
+        for kind, name, started, duration, lane, args in events:
+            trace_events.append({
+                'name': name, 'cat': kind, 'ph': 'X', 'pid': pid, 'tid': tids[lane],
+                'ts': round((started - APP_START_TIME) * 1e6, 1), 'dur': round(duration * 1e6, 1), 'args': args})
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': trace_events, 'displayTimeUnit': 'ms'}, f, ensure_ascii=False)
+        return path
+
+class PooledResponse:
+    """连接池响应 - 接口与urllib响应一致，读完或关闭时把连接归还连接池"""
+
+    def __init__(self, pool, key, conn, response, url, span=None):
+        self._pool = pool
+        self._key = key
+        self._conn = conn
+        self._response = response
+        self._released = False
+        self._aborted = False
+        self._span = span       # 计时信息，归还连接时记录传输阶段
+        self._received = 0
+        self.url = url
+        self.status = response.status
+        self.reason = response.reason
+        self.headers = response.msg
+
+    def getcode(self):
+        return self.status
+
+    def geturl(self):
+        return self.url
+
+    def info(self):
+        return self.headers
+
+    def read(self, amt=None):
+        data = self._response.read(amt)
+        self._received += len(data)
+        if self._response.isclosed():
+            self._release(True)
+        return data
+
+    def readinto(self, buffer):
+        received = self._response.readinto(buffer)
+        self._received += received
+        if self._response.isclosed():
+            self._release(True)
+        return received
+
+    def readinto1(self, buffer):
+        """读取已到达的数据（至多一次recv），不等待填满buffer - 接收循环和停滞检测都能及时看到每一块数据
+
+        有Content-Length时直接读入buffer（与HTTPResponse.read1的逻辑相同），chunked时经read1复制一次。
+        """
+        response = self._response
+        if response.fp is None:
+            received = 0
+        elif response.chunked or response.length is None:
+            data = response.read1(len(buffer))
+            received = len(data)
+            buffer[:received] = data
+        else:
+            view = memoryview(buffer)[:response.length]
+            received = response.fp.readinto1(view)
+            if not received and len(view):
+                # 连接在消息体结束前关闭，与HTTPResponse.readinto一样报告缺少的字节数
+                missing = response.length
+                response._close_conn()
+                raise http.client.IncompleteRead(b'', missing)
+            response.length -= received
+            if not response.length:
+                response._close_conn()
+        self._received += received
+        if response.isclosed():
+            self._release(True)
+        return received
+
+    def abort(self):
+        """从其他线程中断正在进行的读取 - 关闭socket，阻塞中的readinto随即返回，连接不再复用"""
+        self._aborted = True
+        sock = self._conn.sock
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def close(self):
+        if self._released:
+            return
+        # 剩余内容很少时读完再归还，否则直接断开，避免为复用连接读取大量数据
+        remaining = self._response.length
+        if not self._response.isclosed() and remaining is not None and remaining <= ConnectionPool.DRAIN_LIMIT:
+            try:
+                self._response.read()
+            except (OSError, http.client.HTTPException):
+                pass
+        self._release(self._response.isclosed())
+
+    def _release(self, complete):
+        if self._released:
+            return
+        self._released = True
+        if self._span is not None:
+            self._pool._trace_response(self._span, self.status, self._received)
+        self._pool._release(self._key, self._conn,
+                            complete and not self._aborted and not self._response.will_close)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class ConnectionPool:
+    """按主机复用的HTTP/1.1持久连接池 - 所有后台和文件服务器请求共用
+
+    open() 接受 urllib.request.Request，返回与urllib响应接口一致的PooledResponse，
+    4xx/5xx 与urllib一样抛出 HTTPError，并自动跟随重定向。
+    """
+
+    DRAIN_LIMIT = 64 * 1024          # 关闭响应时最多读完的剩余字节数
+    MAX_REDIRECTS = 5
+    STALE_ERRORS = (http.client.RemoteDisconnected, ConnectionResetError,
+                    ConnectionAbortedError, BrokenPipeError)
+
+    def __init__(self, ssl_context=None, max_per_host=DEFAULT_MAX_CONNECTIONS_PER_HOST,
+                 idle_timeout=DEFAULT_IDLE_TIMEOUT, profile=None, trace=None):
+        self.ssl_context = ssl_context
+        self.max_per_host = max_per_host
+        self.idle_timeout = idle_timeout
+        self.profile = profile  # NetworkProfile，记录每次请求的延迟
+        self.trace = trace      # NetworkTrace，记录每次请求各阶段的耗时
+        self._idle = {}     # (scheme, host, port) -> [(conn, 归还时间), ...]
+        self._active = {}   # (scheme, host, port) -> 使用中的连接数
+        self._cond = threading.Condition()
+        self.stats = {'opened': 0, 'reused': 0, 'evicted': 0, 'discarded': 0}
+
+    def open(self, req, timeout=30, kind='request'):
+        """发送请求并返回响应，自动跟随重定向；kind为计时汇总时的请求类别"""
+        method = req.get_method()
+        url = req.full_url
+        body = req.data
+        headers = dict(req.header_items())
+
+        for _ in range(self.MAX_REDIRECTS + 1):
+            response = self._request(method, url, headers, body, timeout, kind)
+            location = response.headers.get('Location')
+            if response.status in (301, 302, 303, 307, 308) and location:
+                response.close()
+                url = urllib.parse.urljoin(url, location)
+                if response.status == 303 or (response.status in (301, 302) and method == 'POST'):
+                    method, body = 'GET', None
+                    headers = {k: v for k, v in headers.items() if k.lower() not in ('content-type', 'content-length')}
+                continue
+
+            if response.status >= 400:
+                # 读出错误内容后归还连接，保持与urllib一致的异常
+                data = response.read()
+                response.close()
+                raise urllib.error.HTTPError(url, response.status, response.reason,
+                                             response.headers, io.BytesIO(data))
+            return response
+
+        raise urllib.error.HTTPError(url, response.status, "Too many redirects", response.headers, None)
+
+    def _request(self, method, url, headers, body, timeout, kind='request'):
+        parts = urlparse(url)
+        scheme = parts.scheme.lower()
+        if scheme not in ('http', 'https'):
+            raise ValueError(f"Unsupported URL scheme: {url}")
+        port = parts.port or (443 if scheme == 'https' else 80)
+        key = (scheme, parts.hostname, port)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+
+        while True:
+            # 从这里开始计时，等待空闲连接的时间也算在请求内
+            request_started = time.perf_counter()
+            conn, reused = self._acquire(key, timeout)
+            try:
+                connect_time = None
+                if conn.sock is not None:
+                    conn.sock.settimeout(timeout)
+                else:
+                    # 单独建立连接，分开统计连接耗时和首字节时间
+                    connect_time = self._connect(conn, key, timeout, kind)
+                conn.timeout = timeout
+                started = time.perf_counter()
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+                headers_at = time.perf_counter()
+                if self.profile is not None:
+                    self.profile.record(parts.netloc, connect_time, headers_at - started)
+                span = None
+                if self.trace is not None:
+                    self.trace.add(kind, 'ttfb', started, headers_at - started)
+                    span = (kind, f"{method} {parts.netloc}", request_started, headers_at,
+                            {'path': path[:200], 'reused': connect_time is None})
+                return PooledResponse(self, key, conn, response, url, span)
+            except self.STALE_ERRORS:
+                # 复用的空闲连接可能已被服务器关闭，换新连接重试一次
+                self._release(key, conn, False)
+                if not reused:
+                    raise
+            except BaseException:
+                self._release(key, conn, False)
+                raise
+
+    def _connect(self, conn, key, timeout, kind):
+        """分步建立连接 - DNS解析、TCP连接、TLS握手分别计时，返回总耗时"""
+        scheme, host, port = key
+        trace = self.trace
+        started = time.perf_counter()
+        addresses = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+        resolved = time.perf_counter()
+        if trace is not None:
+            trace.add(kind, 'dns', started, resolved - started, host=host)
+
+        # 与socket.create_connection一样依次尝试解析出的地址
+        sock, error = None, None
+        for family, sock_type, proto, _, address in addresses:
+            sock = socket.socket(family, sock_type, proto)
+            try:
+                sock.settimeout(timeout)
+                sock.connect(address)
+                break
+            except OSError as e:
+                sock.close()
+                sock, error = None, e
+        if sock is None:
+            raise error or OSError(f"getaddrinfo returned no addresses for {host}")
+        connected = time.perf_counter()
+        if trace is not None:
+            trace.add(kind, 'connect', resolved, connected - resolved, address=address[0])
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        if scheme == 'https':
+            context = self.ssl_context
+            if context is None:
+                import ssl
+                context = ssl.create_default_context()
+            try:
+                sock = context.wrap_socket(sock, server_hostname=host)
+            except BaseException:
+                sock.close()
+                raise
+            if trace is not None:
+                trace.add(kind, 'tls', connected, time.perf_counter() - connected)
+        conn.sock = sock
+        return time.perf_counter() - started
+
+    def _trace_response(self, span, status, received):
+        """响应读完或关闭时记录传输阶段和整个请求"""
+        kind, name, started, headers_at, args = span
+        now = time.perf_counter()
+        self.trace.add(kind, 'transfer', headers_at, now - headers_at, bytes=received)
+        self.trace.add(kind, name, started, now - started, status=status, bytes=received, **args)
+
+    def _acquire(self, key, timeout):
+        """取出空闲连接或新建连接 - 达到每主机上限时等待归还"""
+        deadline = time.time() + timeout
+        with self._cond:
+            while True:
+                self._evict_idle_locked()
+                idle = self._idle.get(key)
+                if idle:
+                    conn, _ = idle.pop()
+                    self._active[key] = self._active.get(key, 0) + 1
+                    self.stats['reused'] += 1
+                    return conn, True
+
+                if self._active.get(key, 0) + len(self._idle.get(key, [])) < self.max_per_host:
+                    self._active[key] = self._active.get(key, 0) + 1
+                    self.stats['opened'] += 1
+                    break
+
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise TimeoutError(f"No free connection to {key[1]} within {timeout}s")
+                self._cond.wait(remaining)
+
+        scheme, host, port = key
+        if scheme == 'https':
+            conn = http.client.HTTPSConnection(host, port, timeout=timeout, context=self.ssl_context)
+        else:
+            conn = http.client.HTTPConnection(host, port, timeout=timeout)
+        return conn, False
+
+    def _release(self, key, conn, reusable):
+        with self._cond:
+            self._active[key] = max(0, self._active.get(key, 0) - 1)
+            if reusable and conn.sock is not None:
+                self._idle.setdefault(key, []).append((conn, time.time()))
+            else:
+                conn.close()
+                self.stats['discarded'] += 1
+            self._cond.notify()
+
+    def _evict_idle_locked(self):
+        """关闭超过空闲时间的连接"""
+        now = time.time()
+        for key, idle in list(self._idle.items()):
+            fresh = []
+            for conn, released_at in idle:
+                if now - released_at > self.idle_timeout:
+                    conn.close()
+                    self.stats['evicted'] += 1
+                else:
+                    fresh.append((conn, released_at))
+            if fresh:
+                self._idle[key] = fresh
+            else:
+                del self._idle[key]
+
+    def close_all(self):
+        with self._cond:
+            for idle in self._idle.values():
+                for conn, _ in idle:
+                    conn.close()
+            self._idle.clear()
+
+    def describe(self):
+        """连接复用统计"""
+        with self._cond:
+            opened = self.stats['opened']
+            reused = self.stats['reused']
+            total = opened + reused
+            rate = reused / total * 100 if total else 0
+            return (f"新建 {opened}，复用 {reused} (复用率 {rate:.0f}%)，"
+                    f"空闲回收 {self.stats['evicted']}，断开 {self.stats['discarded']}")
+
+class Mirror:
+    """下载镜像 - 探测结果、健康状态和实际提供的字节范围"""
+
+    def __init__(self, url):
+        self.url = url
+        self.host = urllib.parse.urlsplit(url).netloc or url
+        self.info = None            # 探测结果，探测失败时为None
+        self.ttfb = None            # 首字节时间（秒）
+        self.sample_rate = 0.0      # 样本吞吐量（字节/秒）
+        self.error = None
+        self.healthy = False
+        self.served = []            # 实际提供的字节范围 [[start, end), ...]
+
+    @property
+    def score(self):
+        """预计取完样本的时间（首字节 + 样本传输），越小越快"""
+        if self.ttfb is None:
+            return float('inf')
+        return self.ttfb + MIRROR_SAMPLE_SIZE / max(self.sample_rate, 1.0)
+
+    def served_bytes(self):
+        return sum(end - start for start, end in self.served)
+
+    def describe_probe(self):
+        if self.error:
+            return f"{self.host}: 不可用 ({self.error})"
+        return (f"{self.host}: 首字节 {self.ttfb * 1000:.0f} ms，"
+                f"样本 {self.sample_rate / 1024 ** 2:.1f} MB/s")
+
+class MirrorSet:
+    """一次下载可用的镜像 - 按探测速度排序，出错或停滞的镜像被标记为不可用，剩余范围转到下一个"""
+
+    def __init__(self, mirrors, info):
+        self.info = info            # 参考探测结果（配置顺序中第一个可用镜像）
+        self.mirrors = sorted(mirrors, key=lambda m: m.score)
+        self._lock = threading.Lock()
+
+    def current(self):
+        """最快的可用镜像，全部不可用时返回None"""
+        with self._lock:
+            for mirror in self.mirrors:
+                if mirror.healthy:
+                    return mirror
+        return None
+
+    def fail(self, mirror, error):
+        """标记镜像不可用，返回接手的镜像（没有时为None）"""
+        with self._lock:
+            mirror.healthy = False
+            mirror.error = error
+        return self.current()
+
+    def revive(self):
+        """自动续传前恢复下载中出错的镜像，让它们再试一次（探测失败的镜像除外）"""
+        with self._lock:
+            for mirror in self.mirrors:
+                mirror.healthy = mirror.info is not None
+
+    def record(self, mirror, start, length):
+        """记录镜像提供的字节范围，与上一段相连时合并"""
+        if length <= 0:
+            return
+        with self._lock:
+            end = start + length
+            for served in mirror.served:
+                if served[1] == start:
+                    served[1] = end
+                    return
+            mirror.served.append([start, end])
+
+    def summary(self, format_size, limit=8):
+        """各镜像提供的字节数和范围，每个镜像一行"""
+        lines = []
+        with self._lock:
+            for mirror in self.mirrors:
+                if not mirror.served:
+                    continue
+                ranges = sorted(mirror.served)
+                text = ', '.join(f"{start}-{end - 1}" for start, end in ranges[:limit])
+                if len(ranges) > limit:
+                    text += f" 等 {len(ranges)} 段"
+                lines.append(f"🪞 {mirror.host} 提供 {format_size(mirror.served_bytes())}: {text}")
+        return lines
+
+def clip_for_log(value, limit=LOG_VALUE_LIMIT):
+    """把值转成日志文本，过长时截断并注明原长度"""
+    text = str(value)
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}…（共{len(text)}字符）"
+
+class LogBuffer:
+    """日志环形缓冲 - 任意线程追加，界面线程定时批量取出；可选同时写入按大小轮转的日志文件
+
+    lines只保留最近max_lines行，日志窗口创建时一次性显示；pending是尚未写入窗口的行。
+    日志文件保存完整记录，超过max_bytes时轮转为 .1 … .N。
+    写文件和轮转只持有_file_lock，追加日志的下载线程不会等待磁盘（两把锁都要时先取_file_lock）。
+    """
+
+    def __init__(self, max_lines=LOG_MAX_LINES):
+        self.max_lines = max_lines
+        self.lines = deque(maxlen=max_lines)
+        self._pending = deque(maxlen=max_lines)
+        self._file_pending = []
+        self._lock = threading.Lock()
+        self._file_lock = threading.Lock()
+        self.path = None
+        self.max_bytes = DEFAULT_LOG_FILE_SIZE
+        self.backups = DEFAULT_LOG_FILE_BACKUPS
+        self._file = None
+        self._file_size = 0
+
+    def configure(self, max_lines=None, path=None, max_bytes=None, backups=None):
+        """修改行数上限和日志文件（path为None时不写文件）"""
+        with self._file_lock, self._lock:
+            if max_lines and max_lines != self.max_lines:
+                self.max_lines = max_lines
+                self.lines = deque(self.lines, maxlen=max_lines)
+                self._pending = deque(self._pending, maxlen=max_lines)
+            if max_bytes:
+                self.max_bytes = max_bytes
+            if backups is not None:
+                self.backups = backups
+            if path != self.path:
+                self._close_file()
+                self.path = path
+
+    def append(self, line, display=True):
+        """追加一行（含换行符）；display为False时只写日志文件"""
+        with self._lock:
+            if display:
+                self.lines.append(line)
+                self._pending.append(line)
+            if self.path:
+                self._file_pending.append(line)
+
+    def flush(self):
+        """取出尚未显示的行，同时把积累的行写入日志文件"""
+        with self._lock:
+            pending = list(self._pending)
+            self._pending.clear()
+            file_lines, self._file_pending = self._file_pending, []
+        if file_lines:
+            with self._file_lock:
+                self._write_file(''.join(file_lines))
+        return pending
+
+    def snapshot(self):
+        """日志窗口创建时调用 - 返回保留的全部行，之前积累的待显示行不再单独返回"""
+        with self._lock:
+            self._pending.clear()
+            return list(self.lines)
+
+    def clear(self):
+        with self._lock:
+            self.lines.clear()
+            self._pending.clear()
+
+    def close(self):
+        self.flush()
+        with self._file_lock:
+            self._close_file()
+
+    def _write_file(self, text):
+        """在_file_lock内调用"""
+        if self.path is None:
+            return
+        try:
+            if self._file is None:
+                os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+                self._file = open(self.path, 'a', encoding='utf-8')
+                self._file_size = self._file.tell()
+            data_size = len(text.encode('utf-8'))
+            if self._file_size and self._file_size + data_size > self.max_bytes:
+                self._rotate()
+            self._file.write(text)
+            self._file.flush()
+            self._file_size += data_size
+        except OSError as e:
+            self._close_file()
+            with self._lock:
+                self.path = None
+                self._file_pending = []
+            print(f"⚠️ 写入日志文件失败，停止写入: {e}")
+
+    def _rotate(self):
+        self._close_file()
+        for index in range(self.backups, 0, -1):
+            source = self.path if index == 1 else f"{self.path}.{index - 1}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{index}")
+        if not self.backups:
+            os.remove(self.path)
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self._file_size = 0
+
+    def _close_file(self):
+        if self._file is not None:
+            try:
+                self._file.close()
+            except OSError:
+                pass
+            self._file = None
+
+class SettingsCache:
+    """后台设置的磁盘缓存 - 保存响应和ETag/Last-Modified，过期后用条件请求重新验证
+
+    文件格式(JSON): {地址的哈希: {"data": ..., "etag": ..., "last_modified": ..., "fetched_at": ...}}
+    请求地址中带有API密钥，只保存它的哈希。
+    """
+
+    def __init__(self, path, ttl=DEFAULT_SETTINGS_CACHE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(url):
+        return hashlib.sha256(url.encode('utf-8')).hexdigest()[:32]
+
+    def _load_all(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+            return entries if isinstance(entries, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def _save_all(self, entries):
+        # 先写临时文件再替换，多个下载器同时启动时也不会读到半个文件
+        temp_path = f"{self.path}.{os.getpid()}.new"
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(entries, f, ensure_ascii=False)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            print(f"⚠️ 后台设置缓存保存失败: {e}")
+
+    def get(self, url):
+        """url对应的缓存，没有时返回None"""
+        with self._lock:
+            entry = self._load_all().get(self._key(url))
+        if not isinstance(entry, dict) or not isinstance(entry.get('data'), dict):
+            return None
+        return entry
+
+    def is_fresh(self, entry):
+        return time.time() - entry.get('fetched_at', 0) < self.ttl
+
+    @staticmethod
+    def conditional_headers(entry):
+        """重新验证用的条件请求头"""
+        headers = {}
+        if entry and entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry and entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def store(self, url, data, etag=None, last_modified=None):
+        """保存200响应"""
+        with self._lock:
+            entries = self._load_all()
+            entries[self._key(url)] = {'data': data, 'etag': etag, 'last_modified': last_modified,
+                                       'fetched_at': time.time()}
+            self._save_all(entries)
+
+    def touch(self, url):
+        """304响应 - 缓存仍然有效，重新开始计算有效期"""
+        with self._lock:
+            entries = self._load_all()
+            entry = entries.get(self._key(url))
+            if isinstance(entry, dict):
+                entry['fetched_at'] = time.time()
+                self._save_all(entries)
+
+def clone_or_copy(source, target):
+    """复制文件 - Linux上先尝试reflink克隆（共享数据块，写时复制），不支持时普通复制；返回使用的方式"""
+    if sys.platform.startswith('linux'):
+        try:
+            import fcntl
+            with open(source, 'rb') as src, open(target, 'wb') as dst:
+                fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+            return 'clone'
+        except OSError:
+            pass
+    import shutil
+    shutil.copyfile(source, target)
+    return 'copy'
+
+class DownloadCache:
+    """按内容寻址的下载缓存 - 已完成的下载以SHA-256为文件名保存，超过大小上限时淘汰最久未使用的文件
+
+    index.json: {"entries": {地址的哈希: {"url", "etag", "last_modified", "size", "sha256"}},
+                 "objects": {sha256: {"size", "mtime_ns", "last_used"}}}
+    缓存文件尽量与Downloads中的文件互为硬链接，不额外占用磁盘；不能链接时克隆或复制。
+    缓存文件的大小或修改时间与记录不一致（例如通过硬链接被改写）时视为失效。
+    """
+
+    def __init__(self, directory, max_size=DEFAULT_DOWNLOAD_CACHE_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+        self.index_path = os.path.join(directory, 'index.json')
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(url):
+        return hashlib.sha256(url.encode('utf-8')).hexdigest()[:32]
+
+    def object_path(self, sha256):
+        return os.path.join(self.directory, 'objects', sha256)
+
+    def _load_index(self):
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+            if isinstance(index, dict) and isinstance(index.get('entries'), dict) \
+                    and isinstance(index.get('objects'), dict):
+                return index
+        except (OSError, ValueError):
+            pass
+        return {'entries': {}, 'objects': {}}
+
+    def _save_index(self, index):
+        # 先写临时文件再替换，与SettingsCache相同
+        temp_path = f"{self.index_path}.{os.getpid()}.new"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(index, f, ensure_ascii=False)
+            os.replace(temp_path, self.index_path)
+        except OSError as e:
+            print(f"⚠️ 下载缓存索引保存失败: {e}")
+
+    def _valid(self, sha256, record):
+        try:
+            st = os.stat(self.object_path(sha256))
+        except OSError:
+            return False
+        return st.st_size == record.get('size') and st.st_mtime_ns == record.get('mtime_ns')
+
+    def _drop(self, index, sha256):
+        """删除缓存文件以及引用它的条目"""
+        index['objects'].pop(sha256, None)
+        for key in [key for key, entry in index['entries'].items() if entry.get('sha256') == sha256]:
+            del index['entries'][key]
+        try:
+            os.remove(self.object_path(sha256))
+        except OSError:
+            pass
+
+    def contains(self, sha256):
+        """是否缓存了该内容"""
+        with self._lock:
+            index = self._load_index()
+            record = index['objects'].get(sha256)
+            if record is None:
+                return False
+            if self._valid(sha256, record):
+                return True
+            self._drop(index, sha256)
+            self._save_index(index)
+            return False
+
+    def lookup(self, url):
+        """地址对应的缓存条目，没有或缓存文件已失效时返回None"""
+        with self._lock:
+            index = self._load_index()
+            entry = index['entries'].get(self._key(url))
+            if not isinstance(entry, dict) or entry.get('url') != url:
+                return None
+            record = index['objects'].get(entry.get('sha256'))
+            if record is not None and self._valid(entry['sha256'], record):
+                return entry
+            self._drop(index, entry.get('sha256'))
+            self._save_index(index)
+            return None
+
+    def deliver(self, sha256, target):
+        """把缓存文件交付到target（不能已存在）- 优先硬链接，返回使用的方式"""
+        source = self.object_path(sha256)
+        try:
+            os.link(source, target)
+            method = 'hardlink'
+        except OSError:
+            try:
+                method = clone_or_copy(source, target)
+            except OSError:
+                if os.path.exists(target):
+                    os.remove(target)
+                raise
+        with self._lock:
+            index = self._load_index()
+            if sha256 in index['objects']:
+                index['objects'][sha256]['last_used'] = time.time()
+                self._save_index(index)
+        return method
+
+    def store(self, url, path, sha256, etag=None, last_modified=None):
+        """下载完成后加入缓存，超出大小上限时淘汰最久未使用的文件；文件本身超过上限时不缓存，返回是否已缓存"""
+        size = os.path.getsize(path)
+        if size > self.max_size:
+            return False
+        with self._lock:
+            index = self._load_index()
+            record = index['objects'].get(sha256)
+            if record is None or not self._valid(sha256, record):
+                target = self.object_path(sha256)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                if os.path.exists(target):
+                    os.remove(target)
+                try:
+                    os.link(path, target)
+                except OSError:
+                    clone_or_copy(path, target)
+                record = {'size': size, 'mtime_ns': os.stat(target).st_mtime_ns}
+            record['last_used'] = time.time()
+            index['objects'][sha256] = record
+            index['entries'][self._key(url)] = {'url': url, 'etag': etag, 'last_modified': last_modified,
+                                                'size': size, 'sha256': sha256}
+            self._evict(index, sha256)
+            self._save_index(index)
+        return True
+
+    def _evict(self, index, keep):
+        """按最近使用时间淘汰，直到总大小不超过上限"""
+        objects = index['objects']
+        total = sum(record.get('size', 0) for record in objects.values())
+        for sha256 in sorted(objects, key=lambda sha: objects[sha].get('last_used', 0)):
+            if total <= self.max_size:
+                break
+            if sha256 == keep:
+                continue
+            total -= objects[sha256].get('size', 0)
+            print(f"🧹 下载缓存超出上限，移除 {sha256[:12]}…")
+            self._drop(index, sha256)
+
+def is_nuitka_compiled():
+    """是否为Nuitka编译的程序 - Nuitka不设置sys.frozen，而是在每个编译的模块中定义__compiled__"""
+    return '__compiled__' in globals()
 
 def get_app_directory():
     """获取应用程序目录 - 统一处理exe和Python环境"""
+    if is_nuitka_compiled():
+        # onefile版本解压到缓存目录运行，sys.argv[0]仍是Downloader.exe本身的路径
+        return os.path.dirname(os.path.abspath(sys.argv[0]))
+
     # 检测是否为exe环境的多种方式
     is_exe = (
         getattr(sys, 'frozen', False) or  # 标准检测
@@ -44,10 +1977,27 @@ def get_app_directory():
         # Python环境：使用脚本文件所在目录
         return os.path.dirname(os.path.abspath(__file__))
 
+def get_cache_directory():
+    """用户缓存目录 - 程序目录可能没有写权限（如安装在Program Files），缓存写到用户目录"""
+    if sys.platform == 'win32':
+        base = os.environ.get('LOCALAPPDATA') or os.path.join(os.path.expanduser('~'), 'AppData', 'Local')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'SecureDownloader')
+
 def get_config_path():
     """获取配置文件完整路径"""
     return os.path.join(get_app_directory(), 'config.ini')
 
+def get_local_ip():
+    """获取本机出口IP地址（UDP连接不会真正发送数据）"""
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+            s.connect(("8.8.8.8", 80))
+            return s.getsockname()[0]
+    except OSError:
+        return "127.0.0.1"
+
 class DownloadManager:
     def __init__(self):
         self.config = None
@@ -55,6 +2005,25 @@ class DownloadManager:
         self.download_thread = None
         self.is_downloading = False
         self.cancel_download = False
+        self.buffer_pool = BufferPool()
+        self.read_size = None       # 固定的单次读取大小，None表示自适应
+        self.compression = False    # 是否协商gzip/deflate压缩传输（[network] compression）
+        self.content_encoding = None  # 当前下载实际使用的压缩编码，未压缩时为None
+        self.reporter = None        # 当前下载的进度合并器
+        self.verified_sha256 = ''   # 验证接口返回的文件SHA-256
+        self.last_sha256 = None
+        self.write_stats = None     # 最近一次下载的写盘统计
+        self.limiter = None         # 限速器，未配置限速时为None
+        self.retry = RetryPolicy()  # 所有网络请求共用的重试策略
+        self.profile = NetworkProfile(self.log)  # 网络延迟画像，各类请求的超时由它推算
+        self.trace = NetworkTrace()              # 请求分阶段计时
+        self.download_dir = None    # 保存目录，None表示用户的Downloads目录
+        self.download_cache = None  # 已完成下载的本地缓存，首次下载时按配置打开
+        self.cache_hit = None       # 最近一次下载从缓存交付的方式（hardlink/clone/copy/existing），未命中时为None
+        self.last_failure = None    # 最近一次下载失败的类型: cancelled / checksum / error
+        self.log_callback = None    # 界面日志回调，镜像切换等信息同时显示在日志窗口
+        self._ip_cache = None  # (网络状态, 时间, IP)
+        self._ip_cache_lock = threading.Lock()
         self._init_session()
 
     def _init_session(self):
@@ -65,210 +2034,307 @@ class DownloadManager:
             if proxy_var in os.environ:
                 del os.environ[proxy_var]
 
-        # 创建自定义的opener，禁用SSL验证
+        # 创建连接池，禁用SSL验证
         import ssl
         try:
             # 创建不验证SSL的上下文
             ssl_context = ssl.create_default_context()
             ssl_context.check_hostname = False
             ssl_context.verify_mode = ssl.CERT_NONE
-
-            # 创建HTTPS处理器
-            https_handler = urllib.request.HTTPSHandler(context=ssl_context)
-
-            # 创建opener
-            self.opener = urllib.request.build_opener(https_handler)
-
-            # 设置User-Agent
-            self.opener.addheaders = [('User-Agent', 'SecureDownloader/2.1.0')]
-
         except Exception as e:
             print(f"⚠️ SSL配置失败，使用默认设置: {e}")
-            self.opener = urllib.request.build_opener()
-            self.opener.addheaders = [('User-Agent', 'SecureDownloader/2.1.0')]
+            ssl_context = None
 
-        # 用户代理已在opener中设置，无需额外设置
-        
-    def load_config(self):
-        """加载配置文件 - 基于原版逻辑支持多种配置文件"""
+        # 所有后台接口和文件服务器请求共用同一个持久连接池
+        self.pool = ConnectionPool(ssl_context, profile=self.profile, trace=self.trace)
+
+    def configure_pool(self):
+        """按配置文件调整连接池参数"""
+        if self.config is None:
+            return
+        self.pool.max_per_host = self.config.getint(
+            'network', 'max_connections_per_host', fallback=DEFAULT_MAX_CONNECTIONS_PER_HOST)
+        self.pool.idle_timeout = self.config.getint(
+            'network', 'idle_timeout', fallback=DEFAULT_IDLE_TIMEOUT)
+        read_size = self.config.get('network', 'read_size', fallback='').strip()
+        try:
+            # 0或留空表示自适应
+            self.read_size = (BandwidthLimiter.parse_rate(read_size) if read_size else 0) or None
+        except ValueError as e:
+            print(f"⚠️ 读取大小配置无效，使用自适应大小: {e}")
+            self.read_size = None
+        if self.read_size and self.read_size > self.buffer_pool.buffer_size:
+            self.buffer_pool = BufferPool(self.read_size)
+        try:
+            self.compression = self.config.getboolean('network', 'compression', fallback=False)
+        except ValueError as e:
+            print(f"⚠️ 压缩传输配置无效，不使用压缩: {e}")
+            self.compression = False
+
+    @property
+    def wire_bytes(self):
+        """当前下载本次实际从网络接收的字节数（压缩传输时小于写入文件的字节数）"""
+        reporter = self.reporter
+        return reporter.wire if reporter else 0
+
+    def load_config(self, config_path=None):
+        """加载配置文件 - 基于原版逻辑支持多种配置文件，config_path指定时只加载该文件"""
         app_dir = get_app_directory()
-        config_files = [
-            os.path.join(app_dir, 'config.ini'),
-            os.path.join(app_dir, 'downloader.ini')
-        ]
+        if config_path:
+            config_files = [config_path]
+        else:
+            config_files = [
+                os.path.join(app_dir, 'config.ini'),
+                os.path.join(app_dir, 'downloader.ini')
+            ]
 
-        for config_path in config_files:
-            if os.path.exists(config_path):
+        for candidate in config_files:
+            if os.path.exists(candidate):
                 try:
                     self.config = configparser.ConfigParser()
-                    self.config.read(config_path, encoding='utf-8')
-                    print(f"✅ 配置文件加载成功: {config_path}")
+                    self.config.read(candidate, encoding='utf-8')
+                    self.configure_pool()
+                    self.limiter = BandwidthLimiter.from_config(self.config)
+                    self.retry = RetryPolicy.from_config(self.config)
+                    print(f"✅ 配置文件加载成功: {candidate}")
                     return True
                 except Exception as e:
                     print(f"❌ 配置文件加载失败: {e}")
                     continue
 
-        print(f"❌ 未找到配置文件 (在目录: {app_dir})")
+        if config_path:
+            print(f"❌ 未找到配置文件: {config_path}")
+        else:
+            print(f"❌ 未找到配置文件 (在目录: {app_dir})")
         return False
     
-    def get_current_ip(self):
-        """获取当前IP地址 - 基于原版方法名"""
-        current_ip = None
-        ip_services = [
-            'https://api.ipify.org?format=json',
-            'https://httpbin.org/ip',
-            'https://api.ip.sb/ip'
-        ]
-
-        for service in ip_services:
+    def log(self, message):
+        """输出日志 - 设置了log_callback时同时交给界面"""
+        print(message)
+        if self.log_callback:
             try:
-                req = urllib.request.Request(service)
-                req.add_header('User-Agent', 'SecureDownloader/2.1.0')
-
-                with self.opener.open(req, timeout=10) as response:
-                    data = response.read().decode('utf-8')
-
-                if 'ipify' in service:
-                    import json
-                    current_ip = json.loads(data)['ip']
-                elif 'httpbin' in service:
-                    import json
-                    current_ip = json.loads(data)['origin']
-                else:
-                    current_ip = data.strip()
+                self.log_callback(message)
+            except Exception:
+                pass
 
-                print(f"📍 当前IP地址: {current_ip}")
-                return current_ip
+    def _network_state_key(self):
+        """当前网络接口状态 - 本机出口地址和主机名，变化时IP缓存失效"""
+        return (get_local_ip(), socket.gethostname())
+
+    def _query_ip_service(self, service, parse, timeout):
+        """查询单个IP服务，返回IP字符串，无效时抛出异常"""
+        req = urllib.request.Request(service)
+        req.add_header('User-Agent', 'SecureDownloader/2.1.0')
+        with self.pool.open(req, timeout=timeout, kind='ip') as response:
+            data = response.read().decode('utf-8')
+        return self.parse_ip_response(parse, data)
+
+    @staticmethod
+    def parse_ip_response(parse, data):
+        """用服务对应的解析函数取出IP，并校验格式"""
+        current_ip = parse(data).strip()
+        ipaddress.ip_address(current_ip)  # 校验格式
+        return current_ip
+
+    def _race_ip_services(self, timeout=None):
+        """同时查询所有IP服务，返回最先得到的有效IP，全部失败返回None"""
+        timeout = timeout or self.profile.timeout('ip')
+        results = queue.Queue()
+
+        def worker(service, parse):
+            try:
+                results.put((service, self._query_ip_service(service, parse, timeout), None))
             except Exception as e:
-                print(f"⚠️ IP服务 {service} 失败: {e}")
-                continue
+                results.put((service, None, e))
 
-        # 如果所有外部服务都失败，使用本地IP作为备用
-        import socket
-        try:
-            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
-                s.connect(("8.8.8.8", 80))
-                current_ip = s.getsockname()[0]
-            print(f"📍 使用本地IP地址: {current_ip}")
+        # 守护线程并发查询，拿到第一个有效结果后不再等待其余服务
+        for service, parse in IP_SERVICES:
+            threading.Thread(target=worker, args=(service, parse), daemon=True).start()
+
+        deadline = time.time() + timeout
+        for _ in IP_SERVICES:
+            try:
+                service, current_ip, error = results.get(timeout=max(0, deadline - time.time()))
+            except queue.Empty:
+                break
+            if current_ip:
+                print(f"📍 当前IP地址: {current_ip} ({urlparse(service).netloc})")
+                return current_ip
+            print(f"⚠️ IP服务 {service} 失败: {error}")
+        return None
+
+    def cached_ip(self, network_key):
+        """网络状态未变且未过期时返回缓存的公网IP"""
+        ttl = DEFAULT_IP_CACHE_TTL
+        if self.config is not None:
+            ttl = self.config.getint('network', 'ip_cache_ttl', fallback=DEFAULT_IP_CACHE_TTL)
+        cached = self._ip_cache
+        if cached and cached[0] == network_key and time.time() - cached[1] < ttl:
+            print(f"📍 当前IP地址: {cached[2]} (缓存)")
+            return cached[2]
+        return None
+
+    def remember_ip(self, network_key, current_ip):
+        """缓存查询结果；全部服务失败时返回本地IP作为备用"""
+        if current_ip:
+            self._ip_cache = (network_key, time.time(), current_ip)
             return current_ip
-        except:
-            print(f"📍 使用默认IP地址: 127.0.0.1")
-            return "127.0.0.1"
+        current_ip = network_key[0]
+        print(f"📍 使用本地IP地址: {current_ip}")
+        return current_ip
+
+    def get_current_ip(self):
+        """获取当前IP地址 - 并发查询所有IP服务，结果按网络状态缓存"""
+        network_key = self._network_state_key()
+        with self._ip_cache_lock:
+            current_ip = self.cached_ip(network_key)
+            if current_ip:
+                return current_ip
+            return self.remember_ip(network_key, self._race_ip_services())
 
     def verify_ip_with_backend(self):
         """通过后端验证IP - 基于原版方法名和逻辑"""
         try:
-            verify_url = self.config.get('server', 'verify_url')
-            token = self.config.get('download', 'token')
-
             # 获取当前IP
             current_ip = self.get_current_ip()
             if not current_ip:
                 return False, "❌ 无法获取当前IP地址"
 
-            # 构建验证请求 - 基于数据库表结构分析
-            verify_data = {
-                'action': 'verify',
-                'token': token,
-                'current_ip': current_ip,
-                'original_ip': current_ip,  # 对应 msd_downloads.original_ip
-                'ip_address': current_ip,   # 对应 msd_system_logs.ip_address
-            }
-
-            headers = {
-                'Content-Type': 'application/x-www-form-urlencoded',
-                'User-Agent': 'SecureDownloader/2.0'
-            }
-
-            # 添加API密钥和站点信息
+            verify_url, body, headers = self.build_verify_request(current_ip)
+            req = urllib.request.Request(verify_url, data=body, headers=headers, method='POST')
+
+            def send():
+                try:
+                    timeout = self.profile.timeout('verify', verify_url)
+                    with self.pool.open(req, timeout=timeout, kind='verify') as response:
+                        return response.getcode(), response.read().decode('utf-8', errors='replace')
+                except urllib.error.HTTPError as e:
+                    # 429/5xx交给重试策略，其余错误响应照常解析
+                    if self.retry.classify(e):
+                        raise
+                    return e.code, e.read().decode('utf-8', errors='replace')
+
             try:
-                api_key = self.config.get('server', 'api_key', fallback='')
-                if api_key:
-                    headers['X-API-Key'] = api_key
-                    verify_data['api_key'] = api_key
-
-                site_key = self.config.get('info', 'site_key', fallback='')
-                if site_key:
-                    verify_data['site_key'] = site_key
-
-                site = self.config.get('info', 'site', fallback='')
-                if site:
-                    verify_data['site'] = site
-            except Exception as e:
-                print(f"⚠️ 配置读取警告: {e}")
+                status_code, response_text = self.retry.call(send, '验证请求')
+            except urllib.error.HTTPError as e:
+                # 重试后仍然出错，后端出错时也返回JSON，交给下面统一处理
+                status_code = e.code
+                response_text = e.read().decode('utf-8', errors='replace')
 
-            # 确保verify_url不包含action参数
-            if '?action=verify' in verify_url:
-                verify_url = verify_url.replace('?action=verify', '')
-                print(f"🔧 修正验证URL: {verify_url}")
+            return self.interpret_verify_response(status_code, response_text, current_ip)
 
-            response = self.session.post(verify_url, data=verify_data, headers=headers, timeout=30)
+        except Exception as e:
+            return self.describe_verify_error(e)
+
+    def build_verify_request(self, current_ip):
+        """构建验证请求 - 返回 (verify_url, 表单数据, 请求头)"""
+        verify_url = self.config.get('server', 'verify_url')
+        token = self.config.get('download', 'token')
+
+        # 构建验证请求 - 基于数据库表结构分析
+        verify_data = {
+            'action': 'verify',
+            'token': token,
+            'current_ip': current_ip,
+            'original_ip': current_ip,  # 对应 msd_downloads.original_ip
+            'ip_address': current_ip,   # 对应 msd_system_logs.ip_address
+        }
 
-            # 简化的调试信息（仅在需要时启用）
-            # print(f"🔍 验证请求: {verify_url}")
-            # print(f"🔍 当前IP: {current_ip}")
-            # print(f"🔍 响应: {response.text}")
+        headers = {
+            'Content-Type': 'application/x-www-form-urlencoded',
+            'User-Agent': 'SecureDownloader/2.0'
+        }
 
-            # 处理响应 - 基于原版状态码
-            try:
-                result = response.json()
-                print(f"🔍 解析结果: {result}")
-            except:
-                print(f"🔍 JSON解析失败，原始响应: {response.text}")
-                if response.status_code == 401:
-                    return False, "❌ IP验证失败，程序退出"
-                elif response.status_code == 404:
-                    return False, "❌ 验证失败"
-                else:
-                    return False, f"⚠️ 验证服务器响应错误: {response.status_code}"
-
-            # 基于原版状态码处理 - 修复验证逻辑
-            if result.get('S') == 1 or result.get('success') == True:
-                result_type = result.get('result', '')
-                message = result.get('message', '')
-
-                if result_type == 'IP_MATCH':
-                    return True, f"🎯 IP地址验证通过 (IP: {current_ip})"
-                elif result_type == 'IP_MISMATCH_ALLOWED':
-                    return True, f"⚠️ IP地址不匹配，但允许下载 (当前IP: {current_ip})"
-                elif result_type == 'IP_VERIFICATION_DISABLED':
-                    return True, f"⚠️ 跳过验证，尝试直接下载... (IP: {current_ip})"
-                elif result_type == 'IP_NOT_EXISTS_SKIP_VERIFICATION':
-                    return True, f"⚠️ IP不存在于数据库，跳过验证直接下载 (IP: {current_ip})"
-                elif result_type == 'TOKEN_EXPIRED':
-                    return False, "⏰ 下载令牌已过期，请重新获取下载器"
-                elif result_type == 'MAX_DOWNLOADS_EXCEEDED':
-                    return False, f"❌ IP验证失败，下载终止 (IP: {current_ip})"
-                elif result_type == 'IP_MISMATCH_STRICT':
-                    return False, f"❌ IP地址不匹配，下载被拒绝 (当前IP: {current_ip})"
-                else:
-                    # 如果有result_type但不在已知列表中，记录并返回失败
-                    if result_type:
-                        return False, f"❌ 未知验证结果: {result_type} (IP: {current_ip})"
-                    else:
-                        return True, f"✅ 验证通过 (IP: {current_ip})"
+        # 添加API密钥和站点信息
+        try:
+            api_key = self.config.get('server', 'api_key', fallback='')
+            if api_key:
+                headers['X-API-Key'] = api_key
+                verify_data['api_key'] = api_key
+
+            site_key = self.config.get('info', 'site_key', fallback='')
+            if site_key:
+                verify_data['site_key'] = site_key
+
+            site = self.config.get('info', 'site', fallback='')
+            if site:
+                verify_data['site'] = site
+        except Exception as e:
+            print(f"⚠️ 配置读取警告: {e}")
+
+        # 确保verify_url不包含action参数
+        if '?action=verify' in verify_url:
+            verify_url = verify_url.replace('?action=verify', '')
+            print(f"🔧 修正验证URL: {verify_url}")
+
+        return verify_url, urllib.parse.urlencode(verify_data).encode('utf-8'), headers
+
+    def interpret_verify_response(self, status_code, response_text, current_ip):
+        """解析验证接口的响应 - 返回 (是否通过, 提示信息)，线程版和asyncio版共用"""
+        # 处理响应 - 基于原版状态码
+        try:
+            result = json.loads(response_text)
+            print(f"🔍 解析结果: {result}")
+        except ValueError:
+            print(f"🔍 JSON解析失败，原始响应: {response_text}")
+            if status_code == 401:
+                return False, "❌ IP验证失败，程序退出"
+            elif status_code == 404:
+                return False, "❌ 验证失败"
             else:
-                # 验证失败的情况
-                error_msg = result.get('message', '验证失败')
-                result_type = result.get('result', '')
+                return False, f"⚠️ 验证服务器响应错误: {status_code}"
+
+        # 验证接口可能同时下发文件的SHA-256
+        self.verified_sha256 = str(result.get('sha256') or '').strip().lower()
+
+        # 基于原版状态码处理 - 修复验证逻辑
+        if result.get('S') == 1 or result.get('success') == True:
+            result_type = result.get('result', '')
+            message = result.get('message', '')
+
+            if result_type == 'IP_MATCH':
+                return True, f"🎯 IP地址验证通过 (IP: {current_ip})"
+            elif result_type == 'IP_MISMATCH_ALLOWED':
+                return True, f"⚠️ IP地址不匹配，但允许下载 (当前IP: {current_ip})"
+            elif result_type == 'IP_VERIFICATION_DISABLED':
+                return True, f"⚠️ 跳过验证，尝试直接下载... (IP: {current_ip})"
+            elif result_type == 'IP_NOT_EXISTS_SKIP_VERIFICATION':
+                return True, f"⚠️ IP不存在于数据库，跳过验证直接下载 (IP: {current_ip})"
+            elif result_type == 'TOKEN_EXPIRED':
+                return False, "⏰ 下载令牌已过期，请重新获取下载器"
+            elif result_type == 'MAX_DOWNLOADS_EXCEEDED':
+                return False, f"❌ IP验证失败，下载终止 (IP: {current_ip})"
+            elif result_type == 'IP_MISMATCH_STRICT':
+                return False, f"❌ IP地址不匹配，下载被拒绝 (当前IP: {current_ip})"
+            else:
+                # 如果有result_type但不在已知列表中，记录并返回失败
                 if result_type:
-                    return False, f"❌ {error_msg} - {result_type} (IP: {current_ip})"
+                    return False, f"❌ 未知验证结果: {result_type} (IP: {current_ip})"
                 else:
-                    return False, f"❌ {error_msg} (IP: {current_ip})"
-
-        except Exception as e:
-            error_str = str(e)
-            # 处理常见的网络错误
-            if "Connection aborted" in error_str or "ConnectionResetError" in error_str:
-                return False, "Network connection error, please check your network status and try again"
-            elif "timeout" in error_str.lower():
-                return False, "Network connection timeout, please try again later"
-            elif "Connection refused" in error_str:
-                return False, "Server refused connection, please try again later"
-            elif "Name or service not known" in error_str or "getaddrinfo failed" in error_str:
-                return False, "DNS resolution failed, please check your network connection"
+                    return True, f"✅ 验证通过 (IP: {current_ip})"
+        else:
+            # 验证失败的情况
+            error_msg = result.get('message', '验证失败')
+            result_type = result.get('result', '')
+            if result_type:
+                return False, f"❌ {error_msg} - {result_type} (IP: {current_ip})"
             else:
-                return False, f"Verification process error: {error_str}"
+                return False, f"❌ {error_msg} (IP: {current_ip})"
+
+    def describe_verify_error(self, e):
+        """把验证过程中的异常转换为 (False, 提示信息)"""
+        error_str = str(e)
+        # 处理常见的网络错误
+        if "Connection aborted" in error_str or "ConnectionResetError" in error_str:
+            return False, "Network connection error, please check your network status and try again"
+        elif "timeout" in error_str.lower():
+            return False, "Network connection timeout, please try again later"
+        elif "Connection refused" in error_str:
+            return False, "Server refused connection, please try again later"
+        elif "Name or service not known" in error_str or "getaddrinfo failed" in error_str:
+            return False, "DNS resolution failed, please check your network connection"
+        else:
+            return False, f"Verification process error: {error_str}"
 
     def verify_ip(self):
         """验证IP地址 - 兼容性方法"""
@@ -288,6 +2354,7 @@ class DownloadManager:
     def open_file_location(self, file_path):
         """打开文件所在位置 - 优化版本减少误报"""
         try:
+            import platform
             import webbrowser
             import urllib.parse
 
@@ -381,110 +2448,883 @@ Please check your network connection or contact technical support."""
         except Exception as e:
             # 如果自定义对话框失败，使用最简单的messagebox
             messagebox.showerror("Error", error_message)
-    
-    def download_file(self, progress_callback=None):
-        """下载文件 - 自动保存到Downloads目录"""
-        try:
-            file_url = self.config.get('download', 'file_url')
-            software_name = self.config.get('download', 'software_name')
 
-            # 自动保存到Downloads目录（原始版本的逻辑）
-            downloads_dir = os.path.join(os.path.expanduser("~"), "Downloads")
-            os.makedirs(downloads_dir, exist_ok=True)
+    def _build_download_request(self, file_url, byte_range=None, if_range=None, compressed=False, method=None):
+        """创建下载请求，byte_range为 (start, end) 闭区间，if_range为续传校验值，compressed时接受gzip/deflate"""
+        req = urllib.request.Request(file_url, method=method)
+        req.add_header('User-Agent', 'SecureDownloader/2.1.0')
+        req.add_header('Accept', '*/*')
+        # Range总是针对未压缩的内容，这样断点和.tmp文件中的偏移一致
+        req.add_header('Accept-Encoding', ACCEPT_COMPRESSED if compressed and byte_range is None else 'identity')
+        req.add_header('Connection', 'keep-alive')
+        if byte_range is not None:
+            req.add_header('Range', f"bytes={byte_range[0]}-{byte_range[1]}")
+            if if_range:
+                req.add_header('If-Range', if_range)
+        return req
+
+    def get_expected_sha256(self):
+        """服务器发布的SHA-256 - 优先使用验证接口返回的值，其次是配置文件[download] sha256"""
+        digest = self.verified_sha256 or self.config.get('download', 'sha256', fallback='')
+        return digest.strip().lower()
+
+    def probe_download(self, file_url):
+        """探测远程文件 - 返回 {total_size, accept_ranges, etag, last_modified}"""
+        def probe():
+            req = self._build_download_request(file_url, (0, 0))
+            with self.pool.open(req, timeout=self.profile.timeout('probe', file_url), kind='probe') as response:
+                return self.parse_probe_response(response.getcode(), response.headers)
 
-            # 智能处理文件扩展名，支持所有文件类型
-            if '.' in software_name and len(software_name.split('.')[-1]) <= 10:
-                # 如果软件名包含扩展名（扩展名长度不超过10个字符），保持原有扩展名
-                filename = software_name
-            else:
-                # 如果没有扩展名或扩展名异常长，默认添加.exe
-                filename = f"{software_name}.exe"
-            save_path = os.path.join(downloads_dir, filename)
-
-            # 如果文件已存在，添加数字后缀
-            counter = 1
-            original_save_path = save_path
-            while os.path.exists(save_path):
-                name, ext = os.path.splitext(filename)
-                save_path = os.path.join(downloads_dir, f"{name}_{counter}{ext}")
-                counter += 1
-            
-            # 开始下载 - 优化版本
-            print(f"🌐 开始下载: {file_url}")
+        try:
+            return self.retry.call(probe, '文件探测', lambda: self.cancel_download)
+        except Exception as e:
+            print(f"⚠️ Range探测失败，使用单连接下载: {e}")
+        return {'total_size': 0, 'accept_ranges': False, 'etag': None, 'last_modified': None}
 
-            # 创建下载请求
-            req = urllib.request.Request(file_url)
-            req.add_header('User-Agent', 'SecureDownloader/2.1.0')
-            req.add_header('Accept', '*/*')
-            req.add_header('Accept-Encoding', 'identity')
-            req.add_header('Connection', 'keep-alive')
+    def probe_encoding(self, file_url):
+        """压缩传输探测 - HEAD请求服务器会对完整下载使用的Content-Encoding，不压缩或探测失败时返回None"""
+        try:
+            req = self._build_download_request(file_url, compressed=True, method='HEAD')
+            with self.pool.open(req, timeout=self.profile.timeout('probe', file_url), kind='probe') as response:
+                return DecodingStream.encoding_of(response.headers)
+        except Exception as e:
+            print(f"⚠️ 压缩传输探测失败，不使用压缩: {e}")
+            return None
+
+    def get_mirror_urls(self):
+        """下载地址列表 - [download] file_url 在前，mirrors 中的镜像按配置顺序排在后面（去重）"""
+        urls = [self.config.get('download', 'file_url')]
+        for url in re.split(r'[\s,]+', self.config.get('download', 'mirrors', fallback='')):
+            if url and url not in urls:
+                urls.append(url)
+        return urls
+
+    def _probe_mirror(self, mirror):
+        """探测单个镜像 - 请求开头的一小段样本，记录首字节时间和样本吞吐量"""
+        try:
+            req = self._build_download_request(mirror.url, (0, MIRROR_SAMPLE_SIZE - 1))
+            started = time.perf_counter()
+            with self.pool.open(req, timeout=self.profile.timeout('probe', mirror.url), kind='probe') as response:
+                mirror.ttfb = time.perf_counter() - started
+                mirror.info = self.parse_probe_response(response.getcode(), response.headers)
+                # 服务器忽略Range时也只读样本大小，连接随后被关闭
+                received = 0
+                sample_start = time.perf_counter()
+                while received < MIRROR_SAMPLE_SIZE:
+                    data = response.read(min(MIN_READ_SIZE, MIRROR_SAMPLE_SIZE - received))
+                    if not data:
+                        break
+                    received += len(data)
+                elapsed = time.perf_counter() - sample_start
+            mirror.sample_rate = received / max(elapsed, 1e-6)
+            mirror.healthy = True
+        except Exception as e:
+            mirror.ttfb = None
+            mirror.info = None
+            mirror.error = e
+
+    def probe_mirrors(self):
+        """并发探测所有镜像 - 没有配置镜像时返回None；只保留与参考镜像是同一文件且支持Range的镜像"""
+        urls = self.get_mirror_urls()
+        if len(urls) < 2:
+            return None
+
+        from concurrent.futures import ThreadPoolExecutor
+        mirrors = [Mirror(url) for url in urls]
+        with ThreadPoolExecutor(max_workers=len(mirrors)) as pool:
+            list(pool.map(self._probe_mirror, mirrors))
+
+        # 参考结果取配置顺序中第一个可用的镜像，断点日志以它为准
+        reference = next((m.info for m in mirrors if m.healthy), None)
+        for mirror in mirrors:
+            if mirror.healthy and (mirror.info['total_size'] != reference['total_size']
+                                   or mirror.info['accept_ranges'] != reference['accept_ranges']):
+                mirror.healthy = False
+                mirror.info = None
+                mirror.error = "文件大小或Range支持与其他镜像不一致"
+            self.log(f"🪞 镜像 {mirror.describe_probe()}")
+
+        mirror_set = MirrorSet(mirrors, reference)
+        fastest = mirror_set.current()
+        if fastest:
+            self.log(f"🪞 使用最快的镜像: {fastest.host}")
+        return mirror_set
+
+    @staticmethod
+    def parse_probe_response(status, headers):
+        """解析 Range: bytes=0-0 探测请求的响应"""
+        info = {'total_size': 0, 'accept_ranges': False,
+                'etag': headers.get('ETag'), 'last_modified': headers.get('Last-Modified')}
+        accept_ranges = (headers.get('Accept-Ranges') or '').lower()
+        content_range = headers.get('Content-Range') or ''
+
+        # 206 + Content-Range: bytes 0-0/总大小
+        if status == 206 and '/' in content_range:
+            total = content_range.rsplit('/', 1)[1].strip()
+            if total.isdigit():
+                info['total_size'] = int(total)
+                info['accept_ranges'] = accept_ranges != 'none'
+                return info
+
+        # 服务器忽略了Range，返回完整内容
+        info['total_size'] = int(headers.get('content-length') or 0)
+        return info
+
+    @staticmethod
+    def check_range_response(status, headers, total_size):
+        """分段响应必须是针对同一文件的206，否则说明远程文件已变化"""
+        # If-Range校验失败时服务器会返回200和完整内容
+        if status != 206:
+            raise RemoteFileChanged(f"Server returned HTTP {status} for range request")
+        content_range = headers.get('Content-Range') or ''
+        if not content_range.endswith(f"/{total_size}"):
+            raise RemoteFileChanged(f"Remote file size changed: {content_range}")
+
+    def plan_segments(self, missing_ranges, connections):
+        """把待下载的范围拆分为最多connections个分段 - 返回 [(start, end), ...] 闭区间"""
+        segments = list(missing_ranges)
+        while segments and len(segments) < connections:
+            # 每次对半拆分最大的分段，太小的分段不再拆分
+            largest = max(segments, key=lambda r: r[1] - r[0])
+            size = largest[1] - largest[0] + 1
+            if size < 2 * MIN_SEGMENT_SIZE:
+                break
+            middle = largest[0] + size // 2
+            index = segments.index(largest)
+            segments[index:index + 1] = [(largest[0], middle - 1), (middle, largest[1])]
+        return segments
+
+    def _open_journal(self, journal_path, temp_path, file_url, info):
+        """打开或新建断点日志 - 远程文件已变化时丢弃旧的部分下载"""
+        journal = DownloadJournal.load(journal_path)
+        if journal and os.path.exists(temp_path):
+            if journal.matches(file_url, info['etag'], info['last_modified'], info['total_size']):
+                print(f"⏯️ 发现未完成的下载，从 {self.format_size(journal.completed_bytes())} 处继续")
+                return journal
+            print("♻️ 服务器文件已变化，丢弃旧的部分下载")
+
+        if journal:
+            journal.discard()
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+        journal = DownloadJournal(journal_path, file_url, info['etag'],
+                                  info['last_modified'], info['total_size'])
+        journal.save()
+        return journal
+
+    def _receive_stream(self, response, writer, position, end=None, on_received=None, abort_event=None):
+        """接收循环 - readinto复用缓冲区（memoryview零拷贝），读取大小随吞吐量自适应
+
+        从position开始接收，end为闭区间终点（None表示读到EOF），每次读取后调用 on_received(length)。
+        连续的小读取在同一个缓冲区中拼接，填满或超过WRITE_FLUSH_INTERVAL后整块交给写盘线程，
+        本线程换用新的缓冲区继续接收。配置了限速时各连接从同一个令牌桶取令牌。返回最终接收位置。
+        """
+        # 解压流在读取网络数据时自行限速
+        limiter = None if isinstance(response, DecodingStream) else self.limiter
+        if limiter is not None:
+            should_stop = lambda: self.cancel_download or (abort_event is not None and abort_event.is_set())
+        buffer = self.buffer_pool.acquire()
+        view = memoryview(buffer)
+        filled = 0
+        chunk_start = position
+        flush_deadline = time.perf_counter() + WRITE_FLUSH_INTERVAL
+        sizer = AdaptiveReadSize(self.read_size, self.read_size) if self.read_size else AdaptiveReadSize()
+        # readinto会等到读满才返回，慢速连接上已收到的数据要等很久才计入进度和停滞检测
+        read = getattr(response, 'readinto1', response.readinto)
+        finished = False
+        try:
+            while end is None or position <= end:
+                if self.cancel_download:
+                    raise DownloadCancelled()
+                if abort_event is not None and abort_event.is_set():
+                    break
+
+                requested = min(sizer.size, len(buffer) - filled)
+                if limiter is not None:
+                    requested = min(requested, limiter.read_size())
+                if end is not None:
+                    requested = min(requested, end - position + 1)
+                started = time.perf_counter()
+                received = read(view[filled:filled + requested])
+                now = time.perf_counter()
+                sizer.update(received, requested, now - started)
+
+                if not received:
+                    if end is None:
+                        break
+                    raise StreamInterrupted(f"Stream ended early at byte {position}")
+
+                filled += received
+                position += received
+                if on_received:
+                    on_received(received)
+                if limiter is not None:
+                    limiter.consume(received, should_stop)
+
+                # 缓冲区放不下下一次读取，或数据已等待太久时，整块交给写盘线程
+                if len(buffer) - filled < sizer.size or now >= flush_deadline:
+                    view.release()
+                    full, buffer = buffer, None
+                    writer.write(chunk_start, full, filled)
+                    filled = 0
+                    buffer = self.buffer_pool.acquire()
+                    view = memoryview(buffer)
+                    chunk_start = position
+                    flush_deadline = now + WRITE_FLUSH_INTERVAL
+            finished = True
+        finally:
+            if buffer is not None:
+                view.release()
+                if filled:
+                    # 已接收的数据照常写入，取消或出错后续传时不用重新下载
+                    self._final_write(writer, chunk_start, buffer, filled, finished)
+                else:
+                    self.buffer_pool.release(buffer)
+        return position
 
-            response = self.opener.open(req, timeout=60)
+    def _final_write(self, writer, offset, buffer, length, finished):
+        """接收结束时交出最后一个缓冲区
 
+        写盘线程已出错时只在正常结束时报告，不覆盖正在处理的异常（如取消）。
+        """
+        try:
+            writer.write(offset, buffer, length)
+        except Exception:
+            # DiskWriter.write出错前已归还缓冲区
+            if finished:
+                raise
+
+    def get_fsync_policy(self):
+        """写盘fsync策略 - [download] fsync，可选 none / interval / close"""
+        policy = self.config.get('download', 'fsync', fallback='none') if self.config else 'none'
+        policy = policy.strip().lower()
+        if policy not in FSYNC_POLICIES:
+            print(f"⚠️ 未知的fsync策略: {policy}，使用 none")
+            policy = 'none'
+        return policy
+
+    def _open_writer(self, temp_path, journal=None, hasher=None):
+        self.write_stats = None
+        return DiskWriter(temp_path, self.buffer_pool, journal, hasher, self.get_fsync_policy(), self.trace)
+
+    def _close_writer(self, writer):
+        """等待写盘线程写完并记录统计信息"""
+        try:
+            writer.close()
+        finally:
+            self.write_stats = writer.describe()
+
+    def _download_single(self, file_url, temp_path, progress_callback=None, hasher=None, journal=None,
+                         total_size=0):
+        """单连接下载 - 服务器不支持Range，或使用压缩传输时使用
+
+        开启压缩传输时请求gzip/deflate，边接收边解压，写入文件和计算进度的都是解码后的字节，
+        total_size为探测得到的未压缩大小（响应的Content-Length此时是压缩后的大小）。
+        传入journal时按偏移记录已写入的范围，中断后按未压缩内容的Range续传。
+        """
+        req = self._build_download_request(file_url, compressed=self.compression)
+        response = self.pool.open(req, timeout=self.profile.timeout('download', file_url), kind='download')
+
+        encoding = DecodingStream.encoding_of(response.headers)
+        stream = response
+        if encoding:
+            stream = DecodingStream(response, encoding, self.limiter, lambda: self.cancel_download)
+            self.content_encoding = encoding
+            print(f"🗜️ 压缩传输: {encoding}")
+        else:
             total_size = int(response.headers.get('content-length', 0))
+        reporter = ProgressReporter(progress_callback, total_size)
+        self.reporter = reporter
+
+        if journal is None:
+            # 单连接下载总是从头开始
+            open(temp_path, 'wb').close()
+        writer = self._open_writer(temp_path, journal, hasher)
+        # 没有断点日志时不能续传，停滞时只记录日志
+        watchdog = self._open_watchdog()
+        watch = None
+        if watchdog:
+            watch = watchdog.watch(urlparse(file_url).netloc, response.abort, abortable=journal is not None)
+        wire = 0
+
+        def on_received(length):
+            nonlocal wire
+            if encoding:
+                # 停滞检测和进度中的网络字节数按压缩后的数据计算
+                delta, wire = stream.wire - wire, stream.wire
+            else:
+                delta = length
+            if watch:
+                watch.add(delta)
+            reporter.add(length, delta)
 
-            # 显示文件大小
-            if total_size > 0:
-                size_text = self.format_size(total_size)
-                print(f"📦 文件大小: {size_text}")
-            downloaded_size = 0
-
-            # 安全的文件写入
-            temp_path = save_path + '.tmp'
+        try:
+            writer.preallocate(total_size)
+            with response:
+                received = self._receive_stream(stream, writer, 0, on_received=on_received)
+        finally:
+            if watchdog:
+                watchdog.close()
+            try:
+                self._close_writer(writer)
+            finally:
+                if journal is not None:
+                    journal.save()
+        if total_size and received != total_size:
+            raise IOError(f"Download incomplete: received {received} of {total_size} bytes")
+        reporter.flush()
+        if encoding:
+            print(f"🗜️ 网络传输 {self.format_size(stream.wire)}，解压后 {self.format_size(received)}")
+
+    def _open_watchdog(self):
+        """按配置创建停滞检测，未启用时返回None"""
+        if self.config is None:
+            return None
+        return StallWatchdog.from_config(self.config, self.limiter, self.log)
+
+    def _download_ranges(self, file_url, temp_path, journal, connections, progress_callback=None, hasher=None,
+                         mirrors=None):
+        """按Range下载日志中缺失的部分 - 支持多连接，各分段共用一个写盘线程写入.tmp文件中对应的偏移"""
+        total_size = journal.total_size
+        segments = self.plan_segments(journal.missing_ranges(), connections)
+
+        # 预分配.tmp文件，已下载的部分保持不变
+        writer = self._open_writer(temp_path, journal, hasher)
+        try:
+            writer.preallocate(total_size)
+            if segments:
+                self._fetch_segments(file_url, writer, journal, segments, progress_callback, mirrors)
+        finally:
+            # 写盘线程写完后才保存日志，保证日志包含所有已写入的范围
             try:
-                with open(temp_path, 'wb') as f:
-                    while True:
+                self._close_writer(writer)
+            finally:
+                journal.save()
+
+    def _fetch_segments(self, file_url, writer, journal, segments, progress_callback=None, mirrors=None):
+        """多个连接并发下载各分段，交给同一个写盘线程
+
+        配置了镜像时每个分段从当前最快的可用镜像下载，出错或停滞时把剩余范围转到下一个镜像。
+        """
+        total_size = journal.total_size
+        if len(segments) > 1:
+            print(f"🔀 分段下载: {len(segments)} 个连接")
+
+        abort_event = threading.Event()
+        reporter = ProgressReporter(progress_callback, total_size, journal.completed_bytes())
+        self.reporter = reporter
+        validator = journal.validator()
+        should_stop = lambda: self.cancel_download or abort_event.is_set()
+        # 速度持续过低的连接由停滞检测断开，再按下面的重连逻辑从断点继续
+        watchdog = self._open_watchdog()
+
+        def fetch_segment(start, end):
+            position = start
+            failures = 0    # 没有进展的连续失败次数
+            stalls = 0      # 连续停滞次数
+            watching = watchdog is not None
+            while True:
+                mirror = mirrors.current() if mirrors else None
+                if mirrors and mirror is None:
+                    raise IOError("No mirror available for the remaining ranges")
+                url = mirror.url if mirror else file_url
+                # 各镜像的ETag可能不同，If-Range用该镜像自己的校验值
+                if_range = DownloadJournal.make_validator(mirror.info) if mirror else validator
+                received = 0
+                watch = None
+
+                def on_received(length):
+                    nonlocal received
+                    received += length
+                    if watch:
+                        watch.add(length)
+                    reporter.add(length)
+
+                try:
+                    req = self._build_download_request(url, (position, end), if_range)
+                    timeout = self.profile.timeout('download', url)
+                    if mirrors:
+                        # 有备用镜像时缩短读取超时，停滞的镜像尽快让出
+                        timeout = min(timeout, MIRROR_STALL_TIMEOUT)
+                    with self.pool.open(req, timeout=timeout, kind='download') as response:
+                        self.check_range_response(response.getcode(), response.headers, total_size)
+                        if watching:
+                            watch = watchdog.watch(f"{urlparse(url).netloc} {position}-{end}", response.abort)
+                        try:
+                            self._receive_stream(response, writer, position, end, on_received, abort_event)
+                        except Exception as error:
+                            if watch is not None and watch.stalled:
+                                raise StreamStalled(f"Stream stalled at byte {position + received}") from error
+                            raise
+                        finally:
+                            if watch:
+                                watchdog.unwatch(watch)
+                    if mirror:
+                        mirrors.record(mirror, position, received)
+                    return
+                except DownloadCancelled:
+                    raise
+                except Exception as e:
+                    if abort_event.is_set():
+                        raise
+                    if mirror:
+                        mirrors.record(mirror, position, received)
+                    # 已写入的数据不再重新下载，下次从断点处连接
+                    position += received
+                    if received:
+                        failures = 0
+                    stalls = stalls + 1 if isinstance(e, StreamStalled) else 0
+
+                    if mirror:
+                        successor = mirrors.fail(mirror, e)
+                        if successor is not None:
+                            self.log(f"🔀 镜像 {mirror.host} 出错 ({e})，剩余 {self.format_size(end - position + 1)} "
+                                     f"({position}-{end}) 转到 {successor.host}")
+                            continue
+
+                    if stalls and received:
+                        # 慢但仍有进展：立即重连，不消耗重试预算；反复停滞或已没有其他镜像时不再检测，慢慢下载完
+                        if stalls >= STALL_UNWATCH_AFTER or mirror is not None:
+                            watching = False
+                            self.log(f"🐢 分段 {position}-{end} 连续停滞 {stalls} 次，不再做停滞检测，按当前速度继续下载")
+                        if mirrors:
+                            mirrors.revive()
+                        continue
+
+                    delay = self.retry.next_delay(e, failures)
+                    if delay is None:
+                        raise
+                    failures += 1
+                    self.log(f"🔁 分段中断 ({e})，{delay:.1f}s 后从 {position} 处重连 "
+                             f"({failures}/{self.retry.max_attempts})")
+                    if not self.retry.wait(delay, should_stop):
                         if self.cancel_download:
-                            f.close()
-                            if os.path.exists(temp_path):
-                                os.remove(temp_path)
-                            return False, "Download cancelled"
+                            raise DownloadCancelled()
+                        raise
+                    if mirrors:
+                        # 所有镜像都出错时，退避后让它们再试一次
+                        mirrors.revive()
+
+        from concurrent.futures import ThreadPoolExecutor, as_completed
+        reporter.flush()
+        try:
+            with ThreadPoolExecutor(max_workers=len(segments)) as pool:
+                futures = [pool.submit(fetch_segment, start, end) for start, end in segments]
+                try:
+                    for future in as_completed(futures):
+                        future.result()
+                except BaseException:
+                    # 任一分段失败时通知其余连接尽快停止
+                    abort_event.set()
+                    raise
+                finally:
+                    reporter.flush()
+        finally:
+            if watchdog:
+                watchdog.close()
+            if mirrors:
+                for line in mirrors.summary(self.format_size):
+                    self.log(line)
+
+    def _prepare_download(self):
+        """确定下载链接和保存路径 - 返回 (file_url, save_path)"""
+        file_url = self.config.get('download', 'file_url')
+        return file_url, self._unique_save_path(self._default_save_path())
+
+    def _default_save_path(self):
+        """Downloads目录中的保存路径（不考虑同名文件）"""
+        software_name = self.config.get('download', 'software_name')
+
+        # 默认自动保存到Downloads目录（原始版本的逻辑），无界面模式可指定目录
+        downloads_dir = self.download_dir or os.path.join(os.path.expanduser("~"), "Downloads")
+        os.makedirs(downloads_dir, exist_ok=True)
+
+        # 智能处理文件扩展名，支持所有文件类型
+        if '.' in software_name and len(software_name.split('.')[-1]) <= 10:
+            # 如果软件名包含扩展名（扩展名长度不超过10个字符），保持原有扩展名
+            filename = software_name
+        else:
+            # 如果没有扩展名或扩展名异常长，默认添加.exe
+            filename = f"{software_name}.exe"
+        return os.path.join(downloads_dir, filename)
+
+    @staticmethod
+    def _unique_save_path(save_path):
+        """如果文件已存在，添加数字后缀"""
+        downloads_dir, filename = os.path.split(save_path)
+        name, ext = os.path.splitext(filename)
+        counter = 1
+        while os.path.exists(save_path):
+            save_path = os.path.join(downloads_dir, f"{name}_{counter}{ext}")
+            counter += 1
+        return save_path
+
+    def _begin_download(self, file_url, save_path, info):
+        """根据探测结果准备.tmp文件 - 返回 (temp_path, journal, hasher)"""
+        total_size = info['total_size']
+
+        # 显示文件大小
+        if total_size > 0:
+            size_text = self.format_size(total_size)
+            print(f"📦 文件大小: {size_text}")
+
+        # 安全的文件写入 - 支持Range时使用断点日志，失败后保留部分下载
+        temp_path = save_path + '.tmp'
+        journal = None
+        if info['accept_ranges'] and total_size > 0:
+            journal = self._open_journal(temp_path + '.journal', temp_path, file_url, info)
+
+        # 边下载边计算SHA-256，续传时已有的部分由哈希线程从文件读取
+        hasher = StreamingHasher(temp_path, self.buffer_pool, journal.completed if journal else None)
+        return temp_path, journal, hasher
+
+    def _complete_download(self, temp_path, save_path, journal, hasher, total_size):
+        """校验完整性，通过后才重命名为正式文件"""
+        if self.write_stats:
+            print(f"💾 写盘: {self.write_stats}")
+        self.report_retries()
+
+        expected_sha256 = self.get_expected_sha256()
+        self.last_sha256 = hasher.finish(total_size or None)
+        print(f"🔐 SHA-256: {self.last_sha256}")
+        if expected_sha256:
+            if self.last_sha256 != expected_sha256:
+                raise ChecksumMismatch(f"expected {expected_sha256}, got {self.last_sha256}")
+            print("✅ 文件完整性校验通过")
+
+        # 下载完成后重命名文件
+        if os.path.exists(temp_path):
+            os.rename(temp_path, save_path)
+        if journal:
+            journal.discard()
+
+        # 保存路径信息供后续使用
+        self.last_save_path = save_path
+        return True, f"Download completed: {os.path.basename(save_path)}"
+
+    def open_download_cache(self):
+        """按 [download] cache_size 打开下载缓存，关闭或配置无效时返回None"""
+        if self.download_cache is None:
+            text = self.config.get('download', 'cache_size', fallback='').strip()
+            try:
+                max_size = BandwidthLimiter.parse_rate(text) if text else DEFAULT_DOWNLOAD_CACHE_SIZE
+            except ValueError as e:
+                print(f"⚠️ 下载缓存大小配置无效，不使用缓存: {e}")
+                max_size = 0
+            self.download_cache = DownloadCache(os.path.join(get_cache_directory(), 'downloads'), max_size)
+        return self.download_cache if self.download_cache.max_size > 0 else None
+
+    def revalidate_cached(self, file_url, entry):
+        """条件请求确认服务器上的文件没有变化（304），没有ETag/Last-Modified或请求失败时返回False"""
+        headers = SettingsCache.conditional_headers(entry)
+        if not headers:
+            return False
+        # 带上Range，服务器忽略条件时也只返回1个字节
+        req = self._build_download_request(file_url, (0, 0))
+        for name, value in headers.items():
+            req.add_header(name, value)
+        try:
+            with self.pool.open(req, timeout=self.profile.timeout('probe', file_url), kind='probe') as response:
+                response.read()
+                return response.getcode() == 304
+        except Exception as e:
+            print(f"⚠️ 缓存重新验证失败: {e}")
+            return False
 
-                        chunk = response.read(16384)  # 读取16KB块
-                        if not chunk:
-                            break
+    def _deliver_from_cache(self, cache, sha256, progress_callback=None):
+        """把缓存的文件交付到Downloads目录 - 返回download_file的结果，交付失败时返回None"""
+        save_path = self._default_save_path()
+        object_path = cache.object_path(sha256)
+        try:
+            if not (os.path.exists(save_path) and os.path.samefile(save_path, object_path)):
+                # 同一个文件已经在Downloads中时直接使用，否则按原规则加数字后缀
+                save_path = self._unique_save_path(save_path)
+                method = cache.deliver(sha256, save_path)
+            else:
+                method = 'existing'
+            size = os.path.getsize(save_path)
+        except OSError as e:
+            print(f"⚠️ 缓存交付失败，重新下载: {e}")
+            return None
+
+        self.cache_hit = method
+        self.reporter = None
+        self.content_encoding = None
+        self.log(f"📦 本地缓存命中 ({method}): {self.format_size(size)}，未重新下载")
+        if progress_callback:
+            progress_callback(100, size, size)
+        self.last_sha256 = sha256
+        self.last_save_path = save_path
+        return True, f"Download completed: {os.path.basename(save_path)}"
+
+    def try_download_cache(self, file_url, progress_callback=None):
+        """重复下载时从本地缓存交付 - 已知SHA-256且已缓存时不发请求，否则用条件请求确认文件未变化
+
+        返回download_file的结果，缓存未命中时返回None
+        """
+        self.cache_hit = None
+        cache = self.open_download_cache()
+        if cache is None:
+            return None
+        expected_sha256 = self.get_expected_sha256()
+        if expected_sha256 and cache.contains(expected_sha256):
+            return self._deliver_from_cache(cache, expected_sha256, progress_callback)
+
+        entry = cache.lookup(file_url)
+        if entry is None or (expected_sha256 and entry['sha256'] != expected_sha256):
+            return None
+        if not self.revalidate_cached(file_url, entry):
+            return None
+        return self._deliver_from_cache(cache, entry['sha256'], progress_callback)
+
+    def store_in_cache(self, file_url, info):
+        """下载完成后把文件加入本地缓存，失败只记录日志"""
+        cache = self.open_download_cache()
+        if cache is None or not self.last_sha256:
+            return
+        try:
+            cache.store(file_url, self.last_save_path, self.last_sha256, info.get('etag'), info.get('last_modified'))
+        except OSError as e:
+            print(f"⚠️ 下载缓存保存失败: {e}")
+
+    def report_trace(self):
+        """输出各类请求的分阶段耗时；[debug] trace = true 时在程序目录写出Chrome trace JSON，返回其路径"""
+        for line in self.trace.summary():
+            self.log(f"📶 {line}")
+        try:
+            enabled = self.config is not None and self.config.getboolean('debug', 'trace', fallback=False)
+        except ValueError:
+            enabled = False
+        if not enabled:
+            return None
+        path = os.path.join(get_app_directory(), f"trace_{datetime.now():%Y%m%d_%H%M%S}_{os.getpid()}.json")
+        try:
+            self.trace.export(path)
+        except OSError as e:
+            self.log(f"⚠️ 计时文件写入失败: {e}")
+            return None
+        self.log(f"📶 计时文件: {path}")
+        return path
+
+    def report_retries(self):
+        """输出重试次数和退避等待时间"""
+        retries = self.retry.describe()
+        if retries:
+            self.log(f"🔁 重试: {retries}")
+
+    def _download_failed(self, error, temp_path, journal):
+        """下载失败后的清理 - 可续传时保留部分下载，返回 (False, 提示信息)"""
+        self.report_retries()
+        if isinstance(error, DownloadCancelled):
+            self.last_failure = 'cancelled'
+            if journal:
+                print("💾 已保留部分下载，下次启动将继续")
+            elif os.path.exists(temp_path):
+                os.remove(temp_path)
+            return False, "Download cancelled"
+
+        if isinstance(error, RemoteFileChanged):
+            # 文件已变化，部分下载的数据不能再用
+            print(f"♻️ {error}，丢弃部分下载")
+            journal.discard()
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            error = IOError("Remote file changed during download, please try again")
+        elif isinstance(error, ChecksumMismatch):
+            # 内容已损坏，不能保留也不能续传
+            print(f"❌ SHA-256校验失败: {error}")
+            self.last_failure = 'checksum'
+            if journal:
+                journal.discard()
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return False, "Integrity check failed: the downloaded file is corrupted and was discarded, please try again"
+        elif journal is None and os.path.exists(temp_path):
+            # 不可续传时清理临时文件
+            os.remove(temp_path)
+
+        self.last_failure = 'error'
+        return False, self.describe_download_error(error)
+
+    def describe_download_error(self, error):
+        """把下载异常转换为给用户看的提示"""
+        error_str = str(error)
+        # 处理常见的网络错误
+        if "Connection aborted" in error_str or "ConnectionResetError" in error_str:
+            return "Network connection error, please check your network status and try again"
+        elif "timeout" in error_str.lower():
+            return "Download timeout, please try again later"
+        elif "Connection refused" in error_str:
+            return "Server refused connection, please try again later"
+        elif "Name or service not known" in error_str or "getaddrinfo failed" in error_str:
+            return "DNS resolution failed, please check your network connection"
+        elif "HTTP" in error_str and ("404" in error_str or "403" in error_str):
+            return "File not found or access denied"
+        else:
+            return f"Download failed: {error_str}"
 
-                        f.write(chunk)
-                        downloaded_size += len(chunk)
+    def download_file(self, progress_callback=None):
+        """下载文件 - 自动保存到Downloads目录"""
+        self.last_failure = None
+        try:
+            file_url = self.config.get('download', 'file_url')
+            cached = self.try_download_cache(file_url, progress_callback)
+            if cached:
+                return cached
+            file_url, save_path = self._prepare_download()
 
-                        if progress_callback and total_size > 0:
-                            progress = (downloaded_size / total_size) * 100
-                            progress_callback(progress, downloaded_size, total_size)
+            # 开始下载 - 优化版本
+            print(f"🌐 开始下载: {file_url}")
 
-                # 下载完成后重命名文件
-                if os.path.exists(temp_path):
-                    os.rename(temp_path, save_path)
+            # 探测文件大小、Range支持和校验信息，配置了镜像时并发探测所有镜像
+            mirrors = self.probe_mirrors()
+            if mirrors and mirrors.info:
+                info = mirrors.info
+            else:
+                mirrors = None
+                info = self.probe_download(file_url)
+            temp_path, journal, hasher = self._begin_download(file_url, save_path, info)
+
+            connections = self.config.getint('download', 'connections', fallback=DEFAULT_CONNECTIONS)
+            resume_retries = self.config.getint('download', 'resume_retries', fallback=3)
+            self.content_encoding = None
+            self.reporter = None
+            # 压缩传输只用于从头开始的单源下载：压缩数据不能分段，续传时改用未压缩内容的Range
+            encoding = None
+            if self.compression and not mirrors and (journal is None or not journal.completed_bytes()):
+                encoding = self.probe_encoding(file_url)
 
+            try:
+                attempt = 0
+                while True:
+                    try:
+                        if mirrors and attempt:
+                            mirrors.revive()
+                        if encoding and journal and not journal.completed_bytes():
+                            self._download_single(file_url, temp_path, progress_callback, hasher, journal,
+                                                  info['total_size'])
+                        elif journal:
+                            self._download_ranges(file_url, temp_path, journal, connections, progress_callback,
+                                                  hasher, mirrors)
+                        else:
+                            print("ℹ️ 服务器不支持Range请求，使用单连接下载")
+                            url = mirrors.current().url if mirrors else file_url
+                            self._download_single(url, temp_path, progress_callback, hasher,
+                                                  total_size=info['total_size'])
+                        break
+                    except (DownloadCancelled, RemoteFileChanged):
+                        raise
+                    except Exception as e:
+                        # 可续传时按重试策略等待后从断点继续（分段内的重连已用完时）
+                        if journal is None or attempt >= resume_retries:
+                            raise
+                        delay = self.retry.next_delay(e, attempt)
+                        if delay is None:
+                            raise
+                        attempt += 1
+                        print(f"🔁 下载中断，{delay:.1f}s 后自动续传 ({attempt}/{resume_retries}): {e}")
+                        if not self.retry.wait(delay, lambda: self.cancel_download):
+                            raise DownloadCancelled()
+
+                result = self._complete_download(temp_path, save_path, journal, hasher, info['total_size'])
+                self.store_in_cache(file_url, info)
+                return result
             except Exception as e:
-                # 清理临时文件
-                if os.path.exists(temp_path):
-                    os.remove(temp_path)
-                raise e
-            
-            # 保存路径信息供后续使用
-            self.last_save_path = save_path
-            return True, f"Download completed: {os.path.basename(save_path)}"
-            
+                return self._download_failed(e, temp_path, journal)
+            finally:
+                hasher.abort()
+
         except Exception as e:
-            error_str = str(e)
-            # 处理常见的网络错误
-            if "Connection aborted" in error_str or "ConnectionResetError" in error_str:
-                return False, "Network connection error, please check your network status and try again"
-            elif "timeout" in error_str.lower():
-                return False, "Download timeout, please try again later"
-            elif "Connection refused" in error_str:
-                return False, "Server refused connection, please try again later"
-            elif "Name or service not known" in error_str or "getaddrinfo failed" in error_str:
-                return False, "DNS resolution failed, please check your network connection"
-            elif "HTTP" in error_str and ("404" in error_str or "403" in error_str):
-                return False, "File not found or access denied"
-            else:
-                return False, f"Download failed: {error_str}"
+            self.last_failure = 'error'
+            return False, self.describe_download_error(e)
+
+class TransferRate:
+    """下载速度和剩余时间估计 - 对各次采样的速度做指数加权平均，间隔不足min_interval的采样不参与计算"""
+
+    def __init__(self, smoothing=0.3, min_interval=0.5):
+        self.smoothing = smoothing
+        self.min_interval = min_interval
+        self.reset()
+
+    def reset(self):
+        self.speed = 0.0
+        self._sample = None   # (时间, 已下载字节数)
+
+    def update(self, downloaded, total, now=None):
+        """记录一次进度，返回 (速度 字节/秒, 剩余秒数或None)"""
+        now = time.perf_counter() if now is None else now
+        if self._sample is None or downloaded < self._sample[1]:
+            # 第一次采样，或开始了新的下载
+            self.reset()
+            self._sample = (now, downloaded)
+        elapsed = now - self._sample[0]
+        if elapsed >= self.min_interval:
+            rate = (downloaded - self._sample[1]) / elapsed
+            self.speed = rate if not self.speed else self.speed + self.smoothing * (rate - self.speed)
+            self._sample = (now, downloaded)
+        if self.speed <= 0 or total <= 0:
+            return self.speed, None
+        return self.speed, max(total - downloaded, 0) / self.speed
+
+    @staticmethod
+    def describe(speed, eta):
+        """进度条上的叠加文字，如 "12.3 MB/s · 0:42"，还没有速度时为空"""
+        if speed <= 0:
+            return ''
+        if speed >= 1024 ** 2:
+            text = f"{speed / 1024 ** 2:.1f} MB/s"
+        else:
+            text = f"{speed / 1024:.0f} KB/s"
+        if eta:
+            minutes, seconds = divmod(int(eta + 0.5), 60)
+            hours, minutes = divmod(minutes, 60)
+            text += f" · {hours}:{minutes:02d}:{seconds:02d}" if hours else f" · {minutes}:{seconds:02d}"
+        return text
+
+class ProgressBar:
+    """保留模式的进度条 - 画布上的矩形和文字只创建一次，之后通过coords/itemconfigure修改
+
+    画布尺寸在<Configure>事件中记录，不在每次更新时查询；像素宽度和叠加文字都没有变化时不做任何Tk调用。
+    """
+
+    def __init__(self, canvas, fill='#0078d4', text_color='#ffffff', font=('Segoe UI', 9)):
+        self.canvas = canvas
+        self.width = 0
+        self.height = 0
+        self.progress = 0.0
+        self.redraws = 0      # 实际执行的Tk绘制调用次数（基准测试用）
+        self._pixels = -1
+        self._overlay = ''
+        self._fill = canvas.create_rectangle(0, 0, 0, 0, fill=fill, outline='')
+        self._text = canvas.create_text(0, 0, anchor='e', text='', fill=text_color, font=font)
+        canvas.bind('<Configure>', self._on_configure)
+
+    def _on_configure(self, event):
+        self.width, self.height = event.width, event.height
+        self.canvas.coords(self._text, self.width - 8, self.height / 2)
+        self._pixels = -1
+        self.set(self.progress)
+
+    def set(self, progress, overlay=None):
+        """设置进度（0-100）；overlay为None时保留原来的叠加文字"""
+        self.progress = progress
+        pixels = int(min(max(progress, 0), 100) / 100 * self.width)
+        if pixels != self._pixels:
+            self._pixels = pixels
+            self.canvas.coords(self._fill, 0, 0, pixels, self.height)
+            self.redraws += 1
+        if overlay is not None and overlay != self._overlay:
+            self._overlay = overlay
+            self.canvas.itemconfigure(self._text, text=overlay)
+            self.redraws += 1
 
 class IPDownloaderGUI:
     def set_dark_title_bar(self):
         """设置暗色标题栏（Windows 10/11）- 强化版"""
         try:
+            # 首帧显示之后才会调用，ctypes在这里导入
+            import ctypes.wintypes
             # 确保窗口已经完全创建
             self.root.update_idletasks()
             self.root.update()
@@ -557,6 +3397,7 @@ class IPDownloaderGUI:
 
     def set_dark_title_bar_for_window(self, window):
         """为指定窗口设置暗色标题栏"""
+        import ctypes.wintypes
         try:
             # 确保窗口已经完全创建
             window.update_idletasks()
@@ -616,108 +3457,147 @@ class IPDownloaderGUI:
             # 如果设置失败，忽略错误（可能是旧版本Windows）
             pass
 
-    def get_log_setting_from_backend(self):
-        """通过现有的download_api.php获取配置 - 完全模仿IP验证逻辑"""
-        debug_messages = []
+    def _settings_request_url(self, debug_messages):
+        """后台设置的请求地址 - 配置缺失时返回None"""
+        # 获取正确的配置文件路径 - 支持exe和Python环境
+        debug_messages.append(f"🔧 sys.frozen: {getattr(sys, 'frozen', False)}")
+        debug_messages.append(f"🔧 Nuitka编译: {is_nuitka_compiled()}")
+        debug_messages.append(f"🔧 sys.executable: {sys.executable}")
+        debug_messages.append(f"🔧 __file__: {__file__}")
+        debug_messages.append(f"🔧 当前工作目录: {os.getcwd()}")
+
+        # 使用统一的路径获取函数
+        app_dir = get_app_directory()
+        config_file = get_config_path()
+
+        if getattr(sys, 'frozen', False) or is_nuitka_compiled():
+            debug_messages.append(f"🔧 exe环境，应用目录: {app_dir}")
+        else:
+            debug_messages.append(f"🔧 Python环境，应用目录: {app_dir}")
 
+        # 列出应用目录中的文件
         try:
-            # 获取正确的配置文件路径 - 支持exe和Python环境
-            debug_messages.append(f"🔧 sys.frozen: {getattr(sys, 'frozen', False)}")
-            debug_messages.append(f"🔧 sys.executable: {sys.executable}")
-            debug_messages.append(f"🔧 __file__: {__file__}")
-            debug_messages.append(f"🔧 当前工作目录: {os.getcwd()}")
-
-            # 使用统一的路径获取函数
-            app_dir = get_app_directory()
-            config_file = get_config_path()
-
-            if getattr(sys, 'frozen', False):
-                debug_messages.append(f"🔧 exe环境，应用目录: {app_dir}")
-            else:
-                debug_messages.append(f"🔧 Python环境，应用目录: {app_dir}")
+            files_in_app_dir = os.listdir(app_dir)
+            debug_messages.append(f"🔧 应用目录中的文件: {files_in_app_dir}")
+        except:
+            debug_messages.append("🔧 无法列出应用目录中的文件")
 
-            # 列出应用目录中的文件
-            try:
-                files_in_app_dir = os.listdir(app_dir)
-                debug_messages.append(f"🔧 应用目录中的文件: {files_in_app_dir}")
-            except:
-                debug_messages.append("🔧 无法列出应用目录中的文件")
+        debug_messages.append(f"🔧 配置文件路径: {config_file}")
+        debug_messages.append(f"🔧 配置文件是否存在: {os.path.exists(config_file)}")
 
-            debug_messages.append(f"🔧 配置文件路径: {config_file}")
-            debug_messages.append(f"🔧 配置文件是否存在: {os.path.exists(config_file)}")
+        if not os.path.exists(config_file):
+            debug_messages.append("❌ config.ini文件不存在，使用默认值: True")
+            return None
 
-            if not os.path.exists(config_file):
-                debug_messages.append("❌ config.ini文件不存在，使用默认值: True")
-                self.log_debug_messages(debug_messages)
-                return True
+        import configparser
+        config = configparser.ConfigParser()
+        config.read(config_file, encoding='utf-8')
+
+        server_url = config.get('server', 'verify_url', fallback=None)
+        api_key = config.get('server', 'api_key', fallback=None)
+
+        debug_messages.append(f"🔧 原始服务器地址: {server_url}")
+        debug_messages.append(f"🔧 API密钥: {api_key[:20]}..." if api_key else "🔧 API密钥: 未找到")
+
+        if not server_url or not api_key:
+            debug_messages.append("❌ 缺少服务器配置，使用默认值: True")
+            return None
+
+        self.settings_cache.ttl = config.getint('server', 'settings_cache_ttl', fallback=DEFAULT_SETTINGS_CACHE_TTL)
+
+        # 清理URL，移除已有的参数
+        if '?' in server_url:
+            base_url = server_url.split('?')[0]
+            debug_messages.append(f"🔧 清理后的基础URL: {base_url}")
+        else:
+            base_url = server_url
+            debug_messages.append(f"🔧 基础URL: {base_url}")
+
+        # 构建请求参数 - 使用统计接口获取配置，scope=settings时后台只读配置、不执行统计查询
+        params = {
+            'action': 'stats',  # 修正：API支持的是'stats'，不是'get_stats'
+            'scope': 'settings',
+            'api_key': api_key
+        }
 
-            import configparser
-            config = configparser.ConfigParser()
-            config.read(config_file, encoding='utf-8')
+        debug_messages.append(f"🌐 请求URL: {base_url}")
+        debug_messages.append(f"🌐 请求参数: {params}")
 
-            server_url = config.get('server', 'verify_url', fallback=None)
-            api_key = config.get('server', 'api_key', fallback=None)
+        # 发送HTTP请求到现有的download_api.php - 优化版本
+        # 构建完整URL
+        if params:
+            query_string = urllib.parse.urlencode(params)
+            full_url = f"{base_url}?{query_string}"
+        else:
+            full_url = base_url
+        return full_url
 
-            debug_messages.append(f"🔧 原始服务器地址: {server_url}")
-            debug_messages.append(f"🔧 API密钥: {api_key[:20]}..." if api_key else "🔧 API密钥: 未找到")
+    def cached_log_setting(self):
+        """启动时立即可用的缓存设置 - 返回 (show_log, 是否仍在有效期内)，没有缓存时返回None"""
+        debug_messages = []
+        try:
+            full_url = self._settings_request_url(debug_messages)
+        except Exception:
+            return None
+        entry = self.settings_cache.get(full_url) if full_url else None
+        if entry is None:
+            return None
+        return entry['data'].get('downloader_show_log', True), self.settings_cache.is_fresh(entry)
 
-            if not server_url or not api_key:
-                debug_messages.append("❌ 缺少服务器配置，使用默认值: True")
+    def get_log_setting_from_backend(self):
+        """通过现有的download_api.php获取配置 - 完全模仿IP验证逻辑，有缓存时用条件请求重新验证"""
+        debug_messages = []
+        cache_entry = None
+
+        try:
+            full_url = self._settings_request_url(debug_messages)
+            if full_url is None:
                 self.log_debug_messages(debug_messages)
                 return True
-
-            # 清理URL，移除已有的参数
-            if '?' in server_url:
-                base_url = server_url.split('?')[0]
-                debug_messages.append(f"🔧 清理后的基础URL: {base_url}")
-            else:
-                base_url = server_url
-                debug_messages.append(f"🔧 基础URL: {base_url}")
-
-            # 构建请求参数 - 使用统计接口获取配置
-            params = {
-                'action': 'stats',  # 修正：API支持的是'stats'，不是'get_stats'
-                'api_key': api_key
-            }
-
-            debug_messages.append(f"🌐 请求URL: {base_url}")
-            debug_messages.append(f"🌐 请求参数: {params}")
-
-            # 发送HTTP请求到现有的download_api.php - 优化版本
-            # 构建完整URL
-            if params:
-                query_string = urllib.parse.urlencode(params)
-                full_url = f"{base_url}?{query_string}"
-            else:
-                full_url = base_url
+            cache_entry = self.settings_cache.get(full_url)
 
             # 创建请求
             req = urllib.request.Request(full_url)
             req.add_header('User-Agent', 'SecureDownloader/2.1.0 (Windows NT 10.0; Win64; x64)')
             req.add_header('Accept', 'application/json, text/plain, */*')
             req.add_header('Accept-Language', 'en-US,en;q=0.9')
-            req.add_header('Accept-Encoding', 'identity')
+            req.add_header('Accept-Encoding', ACCEPT_COMPRESSED if self.manager.compression else 'identity')
             req.add_header('Connection', 'keep-alive')
             req.add_header('Cache-Control', 'no-cache')
+            for name, value in SettingsCache.conditional_headers(cache_entry).items():
+                req.add_header(name, value)
+
+            timeout = self.manager.profile.timeout('settings', full_url)
+            with self.manager.pool.open(req, timeout=timeout, kind='settings') as response:
+                status_code = response.getcode()
+                response_data = DecodingStream.decode(response.read(), response.headers.get('Content-Encoding'))
+                response_data = response_data.decode('utf-8', errors='replace')
+                etag = response.headers.get('ETag')
+                last_modified = response.headers.get('Last-Modified')
+
+            debug_messages.append(f"📡 HTTP状态: {status_code}")
+
+            if status_code == 304 and cache_entry is not None:
+                # 后台设置未变化，沿用缓存
+                self.settings_cache.touch(full_url)
+                show_log = cache_entry['data'].get('downloader_show_log', True)
+                debug_messages.append(f"📦 后台设置未变化，使用缓存: downloader_show_log = {show_log}")
+                self.log_debug_messages(debug_messages)
+                return show_log
 
-            response = self.manager.opener.open(req, timeout=15)
-
-            debug_messages.append(f"📡 HTTP状态: {response.getcode()}")
-
-            if response.getcode() == 200:
+            if status_code == 200:
                 try:
-                    response_data = response.read().decode('utf-8')
                     data = json.loads(response_data)
-                    debug_messages.append(f"📡 API响应: {data}")
+                    debug_messages.append(f"📡 API响应: {clip_for_log(data)}")
 
                     if data.get('success'):
+                        self.settings_cache.store(full_url, data, etag, last_modified)
                         # API直接返回数据，不是包装在data字段中
                         show_log = data.get('downloader_show_log', True)
                         ip_enabled = data.get('ip_verification_enabled', True)
                         strict_mode = data.get('strict_mode', False)
 
                         debug_messages.append(f"✅ API请求成功")
-                        debug_messages.append(f"📊 完整响应数据: {data}")
                         debug_messages.append(f"")
                         debug_messages.append(f"🔍 === 配置对比分析 ===")
                         debug_messages.append(f"🎛️ IP验证开关: ip_verification_enabled = {ip_enabled}")
@@ -744,11 +3624,16 @@ class IPDownloaderGUI:
 
                 except Exception as json_error:
                     debug_messages.append(f"❌ JSON解析失败: {json_error}")
-                    debug_messages.append(f"📡 响应内容: {response.text[:200]}...")
+                    debug_messages.append(f"📡 响应内容: {response_data[:200]}...")
             else:
-                debug_messages.append(f"❌ HTTP请求失败: {response.status_code}")
-                debug_messages.append(f"📡 响应内容: {response.text[:200]}...")
+                debug_messages.append(f"❌ HTTP请求失败: {status_code}")
+                debug_messages.append(f"📡 响应内容: {response_data[:200]}...")
 
+            if cache_entry is not None:
+                show_log = cache_entry['data'].get('downloader_show_log', True)
+                debug_messages.append(f"📦 API请求失败，使用缓存: {show_log}")
+                self.log_debug_messages(debug_messages)
+                return show_log
             debug_messages.append("❌ API请求失败，使用默认值: True")
             self.log_debug_messages(debug_messages)
             return True
@@ -765,6 +3650,11 @@ class IPDownloaderGUI:
             if "SSL" in str(e) or "ssl" in str(e).lower():
                 debug_messages.append("💡 检测到SSL问题，可能是证书或网络配置问题")
 
+            if cache_entry is not None:
+                show_log = cache_entry['data'].get('downloader_show_log', True)
+                debug_messages.append(f"📦 由于网络问题，使用缓存: {show_log}")
+                self.log_debug_messages(debug_messages)
+                return show_log
             debug_messages.append("❌ 由于网络问题，使用默认值: True (显示日志)")
             self.log_debug_messages(debug_messages)
             return True
@@ -830,13 +3720,7 @@ class IPDownloaderGUI:
 
     def get_local_ip(self):
         """获取本地IP地址"""
-        try:
-            # 连接到外部地址获取本地IP
-            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
-                s.connect(("8.8.8.8", 80))
-                return s.getsockname()[0]
-        except:
-            return "127.0.0.1"
+        return get_local_ip()
 
 
 
@@ -846,7 +3730,19 @@ class IPDownloaderGUI:
         self.log_window = None
         self.log_text = None
 
+        # 界面更新管道 - 工作线程只入队，Tk主线程按帧合并处理
+        self._ui_thread = threading.current_thread()
+        self._ui_queue = queue.Queue()
+        self._ui_lock = threading.Lock()
+        self._pending_progress = None
+        self._pending_status = None
+
+        # 日志先写入环形缓冲，由界面线程定时批量写入窗口（窗口创建前的日志也保留在缓冲中）
+        self.log_buffer = LogBuffer()
+        self._first_paint_ms = 0.0
+
         self.root = tk.Tk()
+        startup_mark('tk_root')
         self.root.title("Secure Downloader")
 
         # 设置窗口大小 - 确保按钮可见
@@ -875,8 +3771,17 @@ class IPDownloaderGUI:
             pass
 
         self.manager = DownloadManager()
+        self.manager.log_callback = self.log_message
+        self.settings_cache = SettingsCache(os.path.join(get_cache_directory(), 'settings_cache.json'))
         self.progress_canvas = None  # 初始化进度条画布
+        startup_mark('manager')
         self.setup_ui()
+        startup_mark('widgets')
+
+        # 启动界面更新循环，然后在后台并行执行启动任务
+        self.root.after(UI_FRAME_INTERVAL, self._drain_ui_queue)
+        self.root.after(LOG_FLUSH_INTERVAL, self._flush_log)
+        self.start_startup_pipeline()
 
         # 在窗口显示后设置暗色标题栏 - 适度尝试避免闪动
         for delay in [100, 500, 1000, 2000]:
@@ -1023,9 +3928,9 @@ class IPDownloaderGUI:
         progress_canvas = tk.Canvas(progress_inner, height=25, bg='#404040', highlightthickness=0)
         progress_canvas.pack(fill=tk.X, pady=(0, 15))
         self.progress_canvas = progress_canvas
-
-        # 绘制初始进度条
-        self.update_progress_bar(0)
+        self.progress_bar = ProgressBar(progress_canvas)
+        self.transfer_rate = TransferRate()
+        self._progress_text = None
 
         # 进度文本
         self.progress_label = tk.Label(progress_inner,
@@ -1097,12 +4002,60 @@ class IPDownloaderGUI:
         self.root.rowconfigure(0, weight=1)
         main_frame.columnconfigure(1, weight=1)
 
-        # 先获取后台配置，决定是否需要日志窗口
+    def start_startup_pipeline(self):
+        """启动流水线 - 窗口先显示，配置解析、后台设置、文件大小探测和IP发现在后台并行执行"""
+        self.update_status("Loading configuration...", "loading")
+        self._startup_pending = 3
+        self._startup_lock = threading.Lock()
+
+        def run_task(name, func):
+            started = time.perf_counter()
+            try:
+                func()
+            except Exception as e:
+                print(f"⚠️ 启动任务 {name} 失败: {e}")
+            finally:
+                print(f"⏱️ 启动任务 {name}: {(time.perf_counter() - started) * 1000:.0f} ms")
+                with self._startup_lock:
+                    self._startup_pending -= 1
+                    finished = self._startup_pending == 0
+                if finished:
+                    self._post_ui(self._on_startup_ready)
+
+        tasks = [
+            ("backend settings", self._startup_backend_settings),
+            ("config + file size", self._startup_config),
+            ("ip discovery", self.manager.get_current_ip),
+        ]
+        for name, func in tasks:
+            threading.Thread(target=run_task, args=(name, func), daemon=True).start()
+
+    def _startup_backend_settings(self):
+        """后台线程：获取日志开关，决定是否需要日志窗口 - 有缓存时立即使用，过期的缓存另开线程重新验证"""
         print("🚀 下载器启动，开始获取后台配置...")
-        self.show_log = self.get_log_setting_from_backend()
-        print(f"🎛️ 最终配置结果: show_log = {self.show_log}")
+        cached = self.cached_log_setting()
+        if cached is not None:
+            show_log, fresh = cached
+            print(f"📦 使用缓存的后台配置: show_log = {show_log}{'' if fresh else '（已过期，后台重新验证）'}")
+            self._post_ui(self._apply_log_setting, show_log)
+            if not fresh:
+                threading.Thread(target=self._revalidate_backend_settings, args=(show_log,), daemon=True).start()
+            return
+
+        show_log = self.get_log_setting_from_backend()
+        print(f"🎛️ 最终配置结果: show_log = {show_log}")
+        self._post_ui(self._apply_log_setting, show_log)
 
-        # 根据配置决定是否创建日志窗口
+    def _revalidate_backend_settings(self, cached_show_log):
+        """后台线程：用条件请求重新验证缓存的后台配置，变化时更新日志窗口"""
+        show_log = self.get_log_setting_from_backend()
+        if show_log != cached_show_log:
+            print(f"🎛️ 后台配置已变化: show_log = {show_log}")
+            self._post_ui(self._apply_log_setting, show_log)
+
+    def _apply_log_setting(self, show_log):
+        """界面线程：根据后台配置创建日志窗口"""
+        self.show_log = show_log
         if self.show_log:
             print("📝 配置显示：日志功能已启用，创建日志窗口")
             self.create_log_window()
@@ -1110,15 +4063,39 @@ class IPDownloaderGUI:
 
             # 显示详细的启动和配置信息
             self.show_startup_details()
-
-            # 重新获取并显示后台配置的详细过程
-            self.show_backend_config_details()
         else:
             print("📝 配置显示：日志功能已禁用，不创建日志窗口")
-            # 不创建日志窗口，保持静默运行
-
-        # 加载配置
-        self.load_config()
+            # 不创建日志窗口，保持静默运行（重新验证后才关闭的情况下关闭已有窗口）
+            self.log_buffer.clear()
+            if self.log_window is not None:
+                self.close_log_window()
+
+    def _startup_config(self):
+        """后台线程：解析配置文件，然后探测文件大小"""
+        file_url = self.load_config()
+        if file_url:
+            file_size = self.get_file_size(file_url)
+            self._post_ui(lambda: self.size_label.config(text=file_size))
+            self.log_message(f"📏 文件大小: {file_size}")
+
+    def _on_startup_ready(self):
+        """界面线程：所有启动任务完成"""
+        elapsed = (time.perf_counter() - APP_START_TIME) * 1000
+        print(f"⏱️ 启动就绪耗时: {elapsed:.0f} ms")
+        self.log_message(f"⏱️ 首帧 {self._first_paint_ms:.0f} ms，就绪 {elapsed:.0f} ms")
+        if STARTUP_PROFILER is not None:
+            # --startup-profile: 输出分析结果后直接退出
+            startup_mark('ready')
+            try:
+                print(STARTUP_PROFILER.report())
+                profile_path = os.path.join(get_app_directory(), 'startup_profile.json')
+                with open(profile_path, 'w', encoding='utf-8') as f:
+                    json.dump(STARTUP_PROFILER.as_dict(), f, indent=2, ensure_ascii=False)
+                print(f"📄 启动分析已保存: {profile_path}")
+            finally:
+                # 之后的导入不再经过计时包装
+                STARTUP_PROFILER.uninstall()
+            self.root.after(0, self.root.destroy)
 
     def create_log_window(self):
         """创建独立的日志窗口"""
@@ -1239,6 +4216,12 @@ class IPDownloaderGUI:
         # 将窗口置于主窗口旁边
         self.log_window.transient(self.root)
 
+        # 写入缓冲中保留的日志
+        lines = self.log_buffer.snapshot()
+        if lines:
+            self.log_text.insert(tk.END, "".join(lines))
+            self.log_text.see(tk.END)
+
         # 初始日志消息
         self.log_message("📋 Log window opened")
 
@@ -1253,26 +4236,73 @@ class IPDownloaderGUI:
         """清空日志"""
         if self.log_text:
             self.log_text.delete(1.0, tk.END)
+            self.log_buffer.clear()
             self.log_message("📋 Debug log cleared")
 
-    def update_progress_bar(self, progress):
-        """更新自定义进度条"""
+    def update_progress_bar(self, progress, overlay=None):
+        """更新自定义进度条 - 只移动已有的画布元素，像素宽度不变时不重绘"""
         if self.progress_canvas:
-            self.progress_canvas.delete("all")
-            width = self.progress_canvas.winfo_width()
-            height = self.progress_canvas.winfo_height()
+            self.progress_bar.set(progress, overlay)
+
+    def _on_ui_thread(self):
+        return threading.current_thread() is self._ui_thread
+
+    def _post_ui(self, func, *args):
+        """在Tk主线程执行界面操作 - 工作线程调用时放入队列，由主循环在下一帧执行"""
+        if self._on_ui_thread():
+            func(*args)
+        else:
+            self._ui_queue.put((func, args))
+
+    def _run_on_ui_and_wait(self, func, *args):
+        """在Tk主线程执行并等待完成（用于工作线程中弹出对话框）"""
+        if self._on_ui_thread():
+            func(*args)
+            return
+        done = threading.Event()
+
+        def run():
+            try:
+                func(*args)
+            finally:
+                done.set()
 
-            if width > 1:  # 确保画布已经渲染
-                # 绘制背景
-                self.progress_canvas.create_rectangle(0, 0, width, height, fill='#404040', outline='')
+        self._ui_queue.put((run, ()))
+        done.wait()
 
-                # 绘制进度
-                if progress > 0:
-                    progress_width = int((progress / 100) * width)
-                    self.progress_canvas.create_rectangle(0, 0, progress_width, height, fill='#0078d4', outline='')
+    def _drain_ui_queue(self):
+        """按固定帧率处理界面更新 - 队列中的操作按顺序执行，进度和状态只应用最新一次"""
+        try:
+            while True:
+                try:
+                    func, args = self._ui_queue.get_nowait()
+                except queue.Empty:
+                    break
+                try:
+                    func(*args)
+                except Exception as e:
+                    print(f"⚠️ 界面更新失败: {e}")
+
+            with self._ui_lock:
+                status, self._pending_status = self._pending_status, None
+                progress, self._pending_progress = self._pending_progress, None
+            if status:
+                self._apply_status(*status)
+            if progress:
+                self._apply_progress(*progress)
+        finally:
+            self.root.after(UI_FRAME_INTERVAL, self._drain_ui_queue)
 
     def update_status(self, message, status_type="info"):
-        """更新用户状态显示"""
+        """更新用户状态显示 - 可在任意线程调用，工作线程的更新在下一帧合并显示"""
+        if self._on_ui_thread():
+            self._apply_status(message, status_type)
+        else:
+            with self._ui_lock:
+                self._pending_status = (message, status_type)
+
+    def _apply_status(self, message, status_type):
+        """在Tk主线程刷新状态标签"""
         # 根据状态类型选择颜色和图标
         status_styles = {
             "success": ("#00d084", "🟢"),
@@ -1286,46 +4316,63 @@ class IPDownloaderGUI:
         formatted_message = f"{icon} {message}"
 
         self.status_label.config(text=formatted_message, fg=color)
-        self.root.update()
 
     def log_message(self, message):
-        """添加日志消息"""
-        # 只有在日志功能启用时才处理日志消息
-        if not self.show_log:
+        """添加日志消息 - 可在任意线程调用，只写入环形缓冲，由_flush_log定时批量写入窗口"""
+        # 日志功能禁用时只写日志文件（如果配置了）
+        display = self.show_log
+        if not display and not self.log_buffer.path:
             return
 
+        self.log_buffer.append(f"[{time.strftime('%H:%M:%S')}] {message}\n", display)
+
         # 如果日志窗口不存在，输出到控制台
-        if self.log_text is None:
+        if display and self.log_text is None:
             print(f"[LOG] {message}")
-            return
 
-        timestamp = time.strftime("%H:%M:%S")
+    def _flush_log(self):
+        """界面线程：把缓冲中的新日志一次性写入窗口，超出行数上限时删除最早的行"""
         try:
-            self.log_text.insert(tk.END, f"[{timestamp}] {message}\n")
-            self.log_text.see(tk.END)
-            if self.log_window and self.log_window.winfo_exists():
-                self.log_window.update()
-        except tk.TclError:
-            # 日志窗口可能已被关闭，输出到控制台
-            print(f"[LOG] {message}")
+            lines = self.log_buffer.flush()
+            if lines and self.log_text is not None:
+                try:
+                    self.log_text.insert(tk.END, "".join(lines))
+                    line_count = int(self.log_text.index('end-1c').split('.')[0]) - 1
+                    excess = line_count - self.log_buffer.max_lines
+                    if excess > 0:
+                        self.log_text.delete('1.0', f'{excess + 1}.0')
+                    self.log_text.see(tk.END)
+                except tk.TclError:
+                    # 日志窗口可能已被关闭
+                    pass
+        finally:
+            self.root.after(LOG_FLUSH_INTERVAL, self._flush_log)
+
+    def configure_log(self, config):
+        """按[debug]段设置日志行数上限和日志文件（log_file留空表示不写文件，相对路径基于程序目录）"""
+        try:
+            max_lines = config.getint('debug', 'log_max_lines', fallback=LOG_MAX_LINES)
+            log_file = config.get('debug', 'log_file', fallback='').strip()
+            max_bytes = BandwidthLimiter.parse_rate(config.get('debug', 'log_file_size', fallback='1M'))
+            backups = config.getint('debug', 'log_file_backups', fallback=DEFAULT_LOG_FILE_BACKUPS)
+        except ValueError as e:
+            print(f"⚠️ 日志配置无效，使用默认设置: {e}")
+            return
+        path = os.path.join(get_app_directory(), log_file) if log_file else None
+        self.log_buffer.configure(max(max_lines, 100), path, max_bytes, max(backups, 0))
     
     def load_config(self):
-        """加载配置文件"""
+        """加载配置文件 - 在启动线程执行，成功时返回下载链接"""
         if self.manager.load_config():
+            self.configure_log(self.manager.config)
             try:
                 software_name = self.manager.config.get('download', 'software_name')
                 file_url = self.manager.config.get('download', 'file_url')
                 token = self.manager.config.get('download', 'token')
 
-                # 日志开关已在初始化时读取，这里不再重复读取
-
-                self.software_label.config(text=software_name)
-
-                # 获取文件大小
-                file_size = self.get_file_size(file_url)
-                self.size_label.config(text=file_size)
+                # 日志开关由后台配置决定，这里不再重复读取
 
-                self.token_label.config(text=token[:20] + "...")
+                self._post_ui(self._show_config_info, software_name, token)
 
                 # 记录详细的配置加载信息
                 self.log_message("=" * 50)
@@ -1334,22 +4381,26 @@ class IPDownloaderGUI:
                 self.log_message(f"📦 软件名称: {software_name}")
                 self.log_message(f"🔗 下载链接: {file_url}")
                 self.log_message(f"🎫 访问令牌: {token[:20]}...")
-                self.log_message(f"📏 文件大小: {file_size}")
                 self.log_message("✅ Configuration loaded successfully")
                 self.log_message("=" * 50)
 
                 # 更新用户状态
                 self.update_status("Ready to download", "success")
+                return file_url
 
             except Exception as e:
                 self.update_status("Configuration error", "error")
-                if self.show_log and self.log_text:
-                    self.log_message(f"❌ Configuration parsing failed: {e}")
+                self.log_message(f"❌ Configuration parsing failed: {e}")
         else:
             self.update_status("Configuration file not found", "error")
-            if self.show_log and self.log_text:
-                self.log_message("❌ Configuration loading failed")
-            messagebox.showerror("Error", "Configuration file not found or format error!\n\nPlease ensure config.ini file exists.")
+            self.log_message("❌ Configuration loading failed")
+            self._post_ui(messagebox.showerror, "Error", "Configuration file not found or format error!\n\nPlease ensure config.ini file exists.")
+        return None
+
+    def _show_config_info(self, software_name, token):
+        """界面线程：显示配置信息"""
+        self.software_label.config(text=software_name)
+        self.token_label.config(text=token[:20] + "...")
 
     def get_file_size(self, url):
         """获取文件大小"""
@@ -1358,8 +4409,9 @@ class IPDownloaderGUI:
             req = urllib.request.Request(url, method='HEAD')
             req.add_header('User-Agent', 'SecureDownloader/2.1.0')
 
-            response = self.manager.opener.open(req, timeout=10)
-            content_length = response.headers.get('content-length')
+            timeout = self.manager.profile.timeout('probe', url)
+            with self.manager.pool.open(req, timeout=timeout, kind='probe') as response:
+                content_length = response.headers.get('content-length')
             if content_length:
                 size_bytes = int(content_length)
                 return self.format_file_size(size_bytes)
@@ -1382,6 +4434,9 @@ class IPDownloaderGUI:
     def auto_verify_and_download(self):
         """自动执行验证和下载流程"""
         def auto_process():
+            # 每次点击下载重新计算重试预算
+            self.manager.retry.reset()
+
             # 步骤1: IP验证
             self.update_status("Verifying permissions...", "loading")
             self.log_message("🔐 Step 1/2: IP Address Verification")
@@ -1401,7 +4456,7 @@ class IPDownloaderGUI:
 
                 # 在IP匹配成功或IP验证被禁用时运行额外验证逻辑（后台静默处理）
                 if "IP address verification passed" in message or "Skip verification" in message:
-                    self.show_verification_notification(message)
+                    self._run_on_ui_and_wait(self.show_verification_notification, message)
 
             else:
                 # API调用失败，检查是否为严重错误
@@ -1414,7 +4469,7 @@ class IPDownloaderGUI:
                     self.log_message("🚫 Download terminated due to network error")
                     # 显示网络错误对话框
                     error_msg = f"网络连接错误，请检查您的网络连接后重试。\n\n详细信息: {message}"
-                    self.root.after(500, lambda: self.manager.show_error_dialog(error_msg, "网络错误"))
+                    self._post_ui(self.root.after, 500, lambda: self.manager.show_error_dialog(error_msg, "网络错误"))
                 elif "Token expired" in message or "Download terminated" in message or "Access denied" in message:
                     # 严重错误，不继续下载
                     should_download = False
@@ -1423,10 +4478,10 @@ class IPDownloaderGUI:
                     # 显示令牌/权限错误对话框
                     if "Token expired" in message or "过期" in message:
                         error_msg = f"下载令牌已过期，请重新获取下载器。\n\n详细信息: {message}"
-                        self.root.after(500, lambda: self.manager.show_error_dialog(error_msg, "令牌过期"))
+                        self._post_ui(self.root.after, 500, lambda: self.manager.show_error_dialog(error_msg, "令牌过期"))
                     else:
                         error_msg = f"访问被拒绝，请检查您的权限或联系管理员。\n\n详细信息: {message}"
-                        self.root.after(500, lambda: self.manager.show_error_dialog(error_msg, "访问拒绝"))
+                        self._post_ui(self.root.after, 500, lambda: self.manager.show_error_dialog(error_msg, "访问拒绝"))
                 else:
                     # 其他API错误，仍然尝试下载
                     should_download = True
@@ -1439,19 +4494,24 @@ class IPDownloaderGUI:
                 self.log_message("📥 Step 2/2: File Download")
             else:
                 # 验证失败，不进行下载
+                self.manager.report_trace()
                 self.manager.is_downloading = False
-                self.download_btn.config(state="normal")
-                self.update_progress_bar(0)
-                self.progress_label.config(text="Verification failed")
+                self._post_ui(lambda: self.download_btn.config(state="normal"))
+                self.set_progress(0, "Verification failed")
                 return
 
             # 开始下载
             self.manager.is_downloading = True
             self.manager.cancel_download = False
 
-            self.download_btn.config(state="disabled")
+            self._post_ui(lambda: self.download_btn.config(state="disabled"))
 
             download_success, download_message = self.manager.download_file(self.update_progress)
+            self.log_message(f"🔌 连接池: {self.manager.pool.describe()}")
+            self.log_message(f"⏱️ 延迟: {self.manager.profile.describe()}")
+            if self.manager.write_stats:
+                self.log_message(f"💾 写盘: {self.manager.write_stats}")
+            self.manager.report_trace()
 
             if download_success:
                 self.update_status("Download completed successfully!", "success")
@@ -1465,26 +4525,25 @@ class IPDownloaderGUI:
                     if save_path and os.path.exists(save_path):
                         self.log_message(f"📁 File location: {save_path}")
                         # 显示下载完成对话框
-                        self.root.after(500, lambda: self.manager.show_download_complete_dialog(save_path))
+                        self._post_ui(self.root.after, 500, lambda: self.manager.show_download_complete_dialog(save_path))
                     else:
                         self.log_message("📁 File saved to Downloads folder")
                         # 如果没有具体路径，显示简单提示
-                        self.root.after(500, lambda: messagebox.showinfo("Download Complete", "File successfully downloaded to Downloads folder!"))
+                        self._post_ui(self.root.after, 500, lambda: messagebox.showinfo("Download Complete", "File successfully downloaded to Downloads folder!"))
                 except Exception as e:
                     self.log_message("📁 File saved to selected location")
-                    self.root.after(500, lambda: messagebox.showinfo("Download Complete", "File download completed!"))
+                    self._post_ui(self.root.after, 500, lambda: messagebox.showinfo("Download Complete", "File download completed!"))
             else:
                 self.update_status("Download failed, please try again", "error")
                 self.log_message(f"❌ {download_message}")
 
                 # 显示错误对话框
-                self.root.after(500, lambda: self.manager.show_error_dialog(download_message, "下载失败"))
+                self._post_ui(self.root.after, 500, lambda: self.manager.show_error_dialog(download_message, "下载失败"))
 
             self.manager.is_downloading = False
-            self.download_btn.config(state="normal")
+            self._post_ui(lambda: self.download_btn.config(state="normal"))
 
-            self.update_progress_bar(0)
-            self.progress_label.config(text="Download completed" if download_success else "Download failed")
+            self.set_progress(0, "Download completed" if download_success else "Download failed")
 
         threading.Thread(target=auto_process, daemon=True).start()
 
@@ -1492,6 +4551,10 @@ class IPDownloaderGUI:
     
     def start_download(self):
         """开始下载流程"""
+        if self.manager.config is None:
+            # 启动流水线还没有加载完配置
+            self.update_status("Loading configuration...", "loading")
+            return
         if not self.manager.is_downloading:
             self.auto_verify_and_download()
     
@@ -1503,9 +4566,28 @@ class IPDownloaderGUI:
             self.log_message("⏹️ Cancelling download...")
     
     def update_progress(self, progress, downloaded, total):
-        """更新进度"""
-        # 更新自定义进度条
-        self.update_progress_bar(progress)
+        """更新进度 - 下载线程的回调只记录最新值，由界面循环按帧绘制"""
+        self.set_progress(progress, downloaded=downloaded, total=total)
+
+    def set_progress(self, progress, text=None, downloaded=0, total=0):
+        """设置进度条和进度文字 - 可在任意线程调用"""
+        if self._on_ui_thread():
+            self._apply_progress(progress, text, downloaded, total)
+        else:
+            with self._ui_lock:
+                self._pending_progress = (progress, text, downloaded, total)
+
+    def _apply_progress(self, progress, text, downloaded, total):
+        """在Tk主线程刷新进度条和进度文字"""
+        if text is not None:
+            # 状态文字（验证失败、下载完成等）不显示速度
+            self.transfer_rate.reset()
+            self.update_progress_bar(progress, '')
+            self._set_progress_text(text)
+            return
+
+        speed, eta = self.transfer_rate.update(downloaded, total)
+        self.update_progress_bar(progress, TransferRate.describe(speed, eta))
 
         downloaded_mb = downloaded / (1024 * 1024)
         total_mb = total / (1024 * 1024)
@@ -1517,7 +4599,16 @@ class IPDownloaderGUI:
             total_gb = total_mb / 1024
             progress_text = f"{downloaded_gb:.1f} GB / {total_gb:.1f} GB ({progress:.1f}%)"
 
-        self.progress_label.config(text=progress_text)
+        if self.manager.content_encoding:
+            # 压缩传输时另外显示实际的网络传输量
+            progress_text += f" · {self.manager.content_encoding} {self.format_file_size(self.manager.wire_bytes)}"
+        self._set_progress_text(progress_text)
+
+    def _set_progress_text(self, text):
+        """进度文字有变化时才更新标签"""
+        if text != self._progress_text:
+            self._progress_text = text
+            self.progress_label.config(text=text)
     
     def show_verification_notification(self, verification_message):
         """显示额外验证逻辑提示弹窗 - 仅在IP匹配成功或IP验证被禁用时触发"""
@@ -1549,6 +4640,10 @@ class IPDownloaderGUI:
         self.root.update()
         self.root.focus_force()
 
+        self._first_paint_ms = (time.perf_counter() - APP_START_TIME) * 1000
+        startup_mark('first_paint')
+        print(f"⏱️ 首帧显示耗时: {self._first_paint_ms:.0f} ms")
+
         # 立即尝试设置标题栏
         self.set_dark_title_bar()
 
@@ -1556,10 +4651,122 @@ class IPDownloaderGUI:
         for delay in [200, 800, 2000]:
             self.root.after(delay, self.set_dark_title_bar)
 
-        self.root.mainloop()
+        try:
+            self.root.mainloop()
+        finally:
+            self.log_buffer.close()
+
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description='多站点IP验证下载器')
+    parser.add_argument('--headless', action='store_true',
+                        help='无界面模式：不加载tkinter，进度以JSON行输出到stdout，日志输出到stderr')
+    parser.add_argument('--config', help='配置文件路径（默认为程序目录下的config.ini或downloader.ini）')
+    parser.add_argument('--output-dir', help='保存目录（默认为用户的Downloads目录）')
+    parser.add_argument('--progress-interval', type=float, default=1.0,
+                        help='无界面模式下进度事件的最短间隔（秒）')
+    parser.add_argument('--engine', choices=('threaded', 'async'), default='threaded',
+                        help='无界面模式的下载引擎：threaded（默认）或 async（asyncio单线程事件循环）')
+    parser.add_argument('--startup-profile', action='store_true',
+                        help='记录模块导入和各初始化阶段的耗时，启动就绪后输出并退出（无界面模式下只加载配置）')
+    return parser.parse_args(argv)
+
+def emit_event(stream, event, **fields):
+    """无界面模式输出一行JSON事件"""
+    stream.write(json.dumps({'event': event, 'time': round(time.time(), 3), **fields}) + '\n')
+    stream.flush()
+
+def run_headless(args):
+    """无界面模式 - 依次加载配置、IP验证、下载，返回退出码
+
+    stdout只输出JSON事件（config / verify / progress / done / error），其余日志都写到stderr。
+    """
+    events = sys.stdout
+    sys.stdout = sys.stderr
+    started = time.perf_counter()
+
+    def emit(event, **fields):
+        emit_event(events, event, **fields)
+
+    try:
+        manager = DownloadManager()
+        if args.output_dir:
+            manager.download_dir = os.path.abspath(args.output_dir)
+
+        if not manager.load_config(args.config):
+            emit('error', stage='config', code=EXIT_CONFIG, message='Configuration file not found or invalid')
+            return EXIT_CONFIG
+        try:
+            file_url = manager.config.get('download', 'file_url')
+            software_name = manager.config.get('download', 'software_name')
+        except configparser.Error as e:
+            emit('error', stage='config', code=EXIT_CONFIG, message=str(e))
+            return EXIT_CONFIG
+        emit('config', software_name=software_name, file_url=file_url)
+        if STARTUP_PROFILER is not None:
+            startup_mark('config')
+            STARTUP_PROFILER.uninstall()
+            emit('startup', **STARTUP_PROFILER.as_dict())
+            return EXIT_OK
+
+        last_emit = {'time': 0.0, 'downloaded': -1}
+
+        def on_progress(progress, downloaded, total):
+            now = time.perf_counter()
+            if downloaded == last_emit['downloaded']:
+                return
+            if now - last_emit['time'] >= args.progress_interval or downloaded >= total:
+                last_emit.update(time=now, downloaded=downloaded)
+                emit('progress', percent=round(progress, 2), downloaded=downloaded, total=total,
+                     wire=manager.wire_bytes)
+
+        def on_verified(verified, message):
+            emit('verify', ok=verified, message=message)
+
+        manager.is_downloading = True
+        if args.engine == 'async':
+            from async_engine import run_engine
+            verified, message, result = run_engine(manager, on_progress, on_verified)
+        else:
+            verified, message = manager.verify_ip_with_backend()
+            on_verified(verified, message)
+            result = manager.download_file(on_progress) if verified else None
+        manager.is_downloading = False
+        manager.report_trace()
+
+        if not verified:
+            emit('error', stage='verify', code=EXIT_VERIFY, message=message)
+            return EXIT_VERIFY
+        success, message = result
+        if not success:
+            code = {'checksum': EXIT_CHECKSUM, 'cancelled': EXIT_CANCELLED}.get(manager.last_failure, EXIT_DOWNLOAD)
+            emit('error', stage='download', code=code, message=message, retries=manager.retry.stats())
+            return code
+
+        save_path = manager.last_save_path
+        emit('done', path=save_path, size=os.path.getsize(save_path), sha256=manager.last_sha256,
+             elapsed=round(time.perf_counter() - started, 3), retries=manager.retry.stats(),
+             wire=manager.wire_bytes, content_encoding=manager.content_encoding, cached=manager.cache_hit)
+        return EXIT_OK
+
+    except KeyboardInterrupt:
+        emit('error', stage='interrupted', code=EXIT_CANCELLED, message='Interrupted')
+        return EXIT_CANCELLED
+    except Exception as e:
+        emit('error', stage='internal', code=EXIT_ERROR, message=str(e))
+        return EXIT_ERROR
+    finally:
+        sys.stdout = events
 
-def main():
+def main(argv=None):
     """Main function with enhanced error handling"""
+    startup_mark('imports')
+    args = parse_args(argv)
+    if args.headless:
+        sys.exit(run_headless(args))
+
+    load_gui_modules()
+    startup_mark('gui_modules')
     try:
         print("🚀 IP验证下载器启动中...")
         print(f"Python版本: {sys.version}")
@@ -1578,21 +4785,14 @@ def main():
                 input("Press Enter to exit...")
                 return
 
-        # 检查tkinter是否可用
+        # Start GUI - 直接创建主窗口，失败即说明GUI组件不可用
+        print("🎨 启动图形界面...")
         try:
-            import tkinter as tk
-            test_root = tk.Tk()
-            test_root.withdraw()
-            test_root.destroy()
-            print("✅ GUI组件检查通过")
-        except Exception as e:
+            app = IPDownloaderGUI()
+        except tk.TclError as e:
             print(f"❌ GUI组件不可用: {e}")
             input("Press Enter to exit...")
             return
-
-        # Start GUI
-        print("🎨 启动图形界面...")
-        app = IPDownloaderGUI()
         app.run()
 
     except Exception as e:
@@ -1623,4 +4823,6 @@ theme = default
         f.write(default_config)
 
 if __name__ == "__main__":
+    # 作为脚本运行时让 async_engine 等模块的 import downloader 得到同一个模块
+    sys.modules.setdefault('downloader', sys.modules[__name__])
     main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+启动分析 - downloader.py --startup-profile 时记录每个模块的导入耗时和各初始化阶段的时间点
+
+必须在downloader.py导入其余模块之前安装，所以本模块只依赖标准库中已经加载的内置模块。
+导入耗时通过包装 builtins.__import__ 统计：只计首次导入，"自身"耗时扣除了其中嵌套导入的子模块。
+"""
+
+import _thread
+import builtins
+import sys
+import time
+
+class StartupProfiler:
+    """记录模块导入耗时和初始化阶段，report()输出表格，as_dict()供JSON输出"""
+
+    _installed = None
+
+    def __init__(self, started):
+        self.started = started   # 计时起点（perf_counter）
+        self.modules = []        # (模块名, 累计耗时, 自身耗时, 嵌套深度)
+        self.phases = []         # (阶段名, 距起点的时间)
+        self._stacks = {}        # 线程ident -> 各层已累计的子模块耗时
+        self._original_import = builtins.__import__
+
+    @classmethod
+    def install(cls, started=None):
+        """开始记录导入耗时；重复调用时返回已安装的实例"""
+        if cls._installed is None:
+            profiler = cls(started if started is not None else time.perf_counter())
+            builtins.__import__ = profiler._import
+            cls._installed = profiler
+        return cls._installed
+
+    def uninstall(self):
+        """恢复原来的__import__（绑定方法每次取值都是新对象，要用==比较）"""
+        if builtins.__import__ == self._import:
+            builtins.__import__ = self._original_import
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        # 已加载的模块和相对导入直接交给原函数，不计入统计
+        if level or name in sys.modules:
+            return self._original_import(name, globals, locals, fromlist, level)
+        stack = self._stacks.setdefault(_thread.get_ident(), [])
+        depth = len(stack)
+        stack.append(0.0)
+        started = time.perf_counter()
+        try:
+            return self._original_import(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - started
+            children = stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            self.modules.append((name, elapsed, elapsed - children, depth))
+
+    def mark(self, phase):
+        """记录一个初始化阶段完成的时间点"""
+        self.phases.append((phase, time.perf_counter() - self.started))
+
+    def import_total(self):
+        """顶层导入的总耗时（秒）"""
+        return sum(total for _, total, _, depth in self.modules if depth == 0)
+
+    def as_dict(self, top=30):
+        previous = 0.0
+        phases = []
+        for phase, at in self.phases:
+            phases.append({'phase': phase, 'at_ms': round(at * 1000, 1), 'delta_ms': round((at - previous) * 1000, 1)})
+            previous = at
+        slowest = sorted(self.modules, key=lambda module: module[2], reverse=True)[:top]
+        return {
+            'import_total_ms': round(self.import_total() * 1000, 1),
+            'module_count': len(self.modules),
+            'phases': phases,
+            'modules': [{'module': name, 'self_ms': round(own * 1000, 2), 'total_ms': round(total * 1000, 2),
+                         'depth': depth} for name, total, own, depth in slowest],
+        }
+
+    def report(self, top=30):
+        """启动分析表格 - 各阶段时间点，以及自身耗时最多的模块"""
+        data = self.as_dict(top)
+        lines = ["⏱️ 启动分析（从程序开始执行算起）", "阶段:"]
+        for phase in data['phases']:
+            lines.append(f"  {phase['phase']:<16} {phase['at_ms']:>8.1f} ms  (+{phase['delta_ms']:.1f})")
+        lines.append(f"模块导入: {data['module_count']} 个，顶层合计 {data['import_total_ms']:.1f} ms；"
+                     f"自身耗时最多的 {len(data['modules'])} 个:")
+        lines.append(f"  {'自身ms':>8} {'累计ms':>8}  模块")
+        for module in data['modules']:
+            lines.append(f"  {module['self_ms']:>8.2f} {module['total_ms']:>8.2f}  {module['module']}")
+        return '\n'.join(lines)